@@ -0,0 +1,211 @@
+from typing import Dict, List, Optional
+import numpy as np
+
+# Compact, vectorized ledger for large-group balance math. People are mapped
+# to dense integer codes and every amount is held as int64 cents, so
+# accumulating millions of shares is a handful of exact NumPy passes instead
+# of a Python loop over floats.
+#
+# Share splitting follows settlement_engine.share_cents: exact shares take
+# their value, percentage shares split what remains after the exact shares,
+# floored to the cent with the leftover cents handed to the largest
+# remainders (ties go to the later share). Percentages are resolved to
+# 1/10000 of a percent, which covers any value the API accepts in practice.
+
+PERCENT_SCALE = 10_000  # percentage units per percent
+FULL_PERCENT = 100 * PERCENT_SCALE
+
+class CentsLedger:
+    """Expenses and shares as parallel int arrays indexed by dense person code"""
+
+    def __init__(
+        self,
+        names: List[str],
+        payer: np.ndarray,
+        amount_cents: np.ndarray,
+        share_expense: np.ndarray,
+        share_person: np.ndarray,
+        share_cents: np.ndarray
+    ):
+        self.names = names
+        self.payer = payer
+        self.amount_cents = amount_cents
+        self.share_expense = share_expense
+        self.share_person = share_person
+        self.share_cents = share_cents
+
+    @classmethod
+    def from_arrays(
+        cls,
+        names: List[str],
+        payer,
+        amount,
+        share_expense,
+        share_person,
+        share_is_exact,
+        share_value
+    ) -> "CentsLedger":
+        """Build a ledger from raw columns, splitting shares into cents
+
+        ``amount`` and ``share_value`` are money/percentage values as stored;
+        ``share_expense`` indexes into the expense arrays and ``payer`` and
+        ``share_person`` index into ``names``.
+        """
+        payer = np.asarray(payer, dtype=np.int32)
+        amount_cents = np.rint(np.asarray(amount, dtype=np.float64) * 100).astype(np.int64)
+        share_expense = np.asarray(share_expense, dtype=np.int64)
+        share_person = np.asarray(share_person, dtype=np.int32)
+        share_is_exact = np.asarray(share_is_exact, dtype=bool)
+        share_value = np.asarray(share_value, dtype=np.float64)
+        expense_count = len(amount_cents)
+
+        cents = np.zeros(len(share_expense), dtype=np.int64)
+        cents[share_is_exact] = np.rint(share_value[share_is_exact] * 100).astype(np.int64)
+        exact_total = np.zeros(expense_count, dtype=np.int64)
+        np.add.at(exact_total, share_expense[share_is_exact], cents[share_is_exact])
+        remaining = amount_cents - exact_total
+
+        percentage = ~share_is_exact
+        pct_expense = share_expense[percentage]
+        pct_units = np.rint(share_value[percentage] * PERCENT_SCALE).astype(np.int64)
+        scaled = remaining[pct_expense] * pct_units
+        floored = scaled // FULL_PERCENT
+        remainder = scaled - floored * FULL_PERCENT
+
+        # Hand out leftover cents to the largest remainders of each expense
+        # whose percentages add up to exactly 100
+        pct_total = np.zeros(expense_count, dtype=np.int64)
+        np.add.at(pct_total, pct_expense, pct_units)
+        allocated = np.zeros(expense_count, dtype=np.int64)
+        np.add.at(allocated, pct_expense, floored)
+        leftover = np.where(pct_total == FULL_PERCENT, remaining - allocated, 0)
+
+        position = np.arange(len(pct_expense))
+        order = np.lexsort((-position, -remainder, pct_expense))
+        sorted_expense = pct_expense[order]
+        group_start = np.searchsorted(sorted_expense, sorted_expense, side="left")
+        rank = np.arange(len(order)) - group_start
+        bonus = np.zeros(len(order), dtype=np.int64)
+        bonus[order] = (rank < leftover[sorted_expense]).astype(np.int64)
+
+        cents[percentage] = floored + bonus
+        return cls(names, payer, amount_cents, share_expense, share_person, cents)
+
+    def paid_cents(self) -> np.ndarray:
+        """Total paid per person code"""
+        paid = np.zeros(len(self.names), dtype=np.int64)
+        np.add.at(paid, self.payer, self.amount_cents)
+        return paid
+
+    def owed_cents(self) -> np.ndarray:
+        """Total owed per person code"""
+        owed = np.zeros(len(self.names), dtype=np.int64)
+        np.add.at(owed, self.share_person, self.share_cents)
+        return owed
+
+    def balances(self) -> np.ndarray:
+        """Net balance per person code (positive means they owe)"""
+        return self.owed_cents() - self.paid_cents()
+
+    def balance_map(self) -> Dict[str, int]:
+        """Net balance in cents keyed by person name"""
+        return dict(zip(self.names, self.balances().tolist()))
+
+    def totals(self) -> Dict[str, dict]:
+        """Paid and owed cents keyed by person name"""
+        return {
+            name: {"paid_cents": paid, "owed_cents": owed}
+            for name, paid, owed in zip(self.names, self.paid_cents().tolist(), self.owed_cents().tolist())
+        }
+
+class _Columns:
+    # Accumulates raw columns while a loader walks its rows
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+        self.payer = []
+        self.amount = []
+        self.share_expense = []
+        self.share_person = []
+        self.share_is_exact = []
+        self.share_value = []
+
+    def code(self, key, name: Optional[str] = None) -> int:
+        # A key the people scan missed (created since) gets its name later
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def unnamed(self) -> list:
+        return [key for key, code in self.codes.items() if self.names[code] is None]
+
+    def name(self, key, name: str):
+        self.names[self.codes[key]] = name
+
+    def ledger(self) -> CentsLedger:
+        return CentsLedger.from_arrays(
+            [name or "Unknown" for name in self.names],
+            self.payer,
+            self.amount,
+            self.share_expense,
+            self.share_person,
+            self.share_is_exact,
+            self.share_value
+        )
+
+def load_sql(db) -> CentsLedger:
+    """Load every expense and share from the SQL backend"""
+    from . import models
+    columns = _Columns()
+    for person_id, name in db.query(models.Person.id, models.Person.name).order_by(models.Person.name):
+        columns.code(person_id, name)
+    # Expenses and their shares in one statement, so both come from the same
+    # snapshot even while expenses are being written
+    last_expense = None
+    for expense_id, paid_by, amount, person_id, share_type, value in db.query(
+        models.Expense.id,
+        models.Expense.paid_by,
+        models.Expense.amount,
+        models.ExpenseShare.person_id,
+        models.ExpenseShare.share_type,
+        models.ExpenseShare.value
+    ).outerjoin(
+        models.ExpenseShare, models.ExpenseShare.expense_id == models.Expense.id
+    ).order_by(models.Expense.id).yield_per(10000):
+        if expense_id != last_expense:
+            last_expense = expense_id
+            columns.payer.append(columns.code(paid_by))
+            columns.amount.append(float(amount))
+        if person_id is not None:
+            columns.share_expense.append(len(columns.amount) - 1)
+            columns.share_person.append(columns.code(person_id))
+            columns.share_is_exact.append(share_type == "exact")
+            columns.share_value.append(float(value))
+    unnamed = columns.unnamed()
+    if unnamed:
+        for person_id, name in db.query(models.Person.id, models.Person.name).filter(models.Person.id.in_(unnamed)):
+            columns.name(person_id, name)
+    return columns.ledger()
+
+async def load_mongo(db, batch_size: int = 10000) -> CentsLedger:
+    """Load every expense from the MongoDB backend"""
+    columns = _Columns()
+    async for person in db.people.find({}, {"name": 1}).sort("name", 1):
+        columns.code(person["_id"], person["name"])
+    cursor = db.expenses.find({}, {"paid_by": 1, "amount": 1, "shares": 1}).batch_size(batch_size)
+    async for expense in cursor:
+        index = len(columns.amount)
+        columns.payer.append(columns.code(expense["paid_by"]))
+        columns.amount.append(expense["amount"])
+        for share in expense["shares"]:
+            columns.share_expense.append(index)
+            columns.share_person.append(columns.code(share["person_id"]))
+            columns.share_is_exact.append(share["type"] == "exact")
+            columns.share_value.append(share["value"])
+    unnamed = columns.unnamed()
+    if unnamed:
+        async for person in db.people.find({"_id": {"$in": unnamed}}, {"name": 1}):
+            columns.name(person["_id"], person["name"])
+    return columns.ledger()
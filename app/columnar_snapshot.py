@@ -0,0 +1,539 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from .cents_ledger import CentsLedger
+from .config import settings
+
+# Column-per-file snapshot of the expense ledger for offline analytics.
+# Every column is a raw little-endian array in its own file, so
+# load_snapshot memory-maps them as NumPy arrays without copying or parsing:
+#
+#   expenses.created_at   int64  microseconds since the Unix epoch (UTC)
+#   expenses.amount_cents int64
+#   expenses.payer        int32  person code
+#   expenses.category     int32  category code, -1 for none
+#   shares.expense        int64  row in the expense columns
+#   shares.person         int32  person code
+#   shares.cents          int64  the share already split to the cent
+#
+# dictionary.json maps codes back to source ids and names, and
+# manifest.json holds the row counts, the watermark (the (created_at, id) of
+# the last expense written in keyset order) and a fingerprint of everything
+# written. Each run rewrites the dictionary so renames show up and then:
+#
+#  1. re-reads the SNAPSHOT_OVERLAP_SECONDS before the watermark and appends
+#     expenses missing from the snapshot: a transaction that commits after
+#     a later one becomes visible behind the watermark, and the manifest
+#     keeps the ids written in that window to tell them apart;
+#  2. compares the fingerprint (counts and sums of ids, amounts, payers,
+#     categories and share values) with the same totals over the source up
+#     to the watermark, in one aggregate query. A mismatch means an expense
+#     was deleted or changed, or committed later than the overlap allows,
+#     and the snapshot is written from scratch instead;
+#  3. appends the expenses after the watermark.
+#
+# Column order is append order, which analytics never depend on. The
+# manifest is replaced atomically after the columns are flushed, so rows
+# past its counts (from an interrupted run) are ignored and truncated by
+# the next one. An edit whose changes cancel out in every fingerprint total
+# goes unnoticed; --full starts over.
+
+SNAPSHOT_FORMAT = 2
+EPOCH = datetime(1970, 1, 1)
+
+COLUMNS = {
+    "expenses": {"created_at": "<i8", "amount_cents": "<i8", "payer": "<i4", "category": "<i4"},
+    "shares": {"expense": "<i8", "person": "<i4", "cents": "<i8"},
+}
+
+def to_micros(moment: datetime) -> int:
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+def _column_path(directory: str, table: str, column: str) -> str:
+    return os.path.join(directory, f"{table}.{column}")
+
+def _write_json(path: str, data: dict):
+    # Write-then-rename so readers never see a half-written file
+    partial = f"{path}.partial"
+    with open(partial, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+class _Dictionary:
+    # Dense codes for source ids, in first-seen order
+    def __init__(self, keys: Optional[list] = None, names: Optional[list] = None):
+        self.keys = keys or []
+        self.names = names or []
+        self.codes = {key: code for code, key in enumerate(self.keys)}
+
+    def code(self, key, name: str) -> int:
+        key = str(key)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.keys)
+            self.keys.append(key)
+            self.names.append(name)
+        return code
+
+    def rename(self, key, name: str):
+        code = self.code(key, name)
+        self.names[code] = name
+
+    def to_dict(self) -> dict:
+        return {"keys": self.keys, "names": self.names}
+
+class SnapshotWriter:
+    """Appends expense batches to a snapshot directory"""
+
+    def __init__(self, directory: str, backend: str, full: bool = False, overlap_seconds: float = 0.0):
+        self.directory = directory
+        self.overlap_seconds = overlap_seconds
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, "manifest.json")
+        manifest = None
+        if not full and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest["format"] != SNAPSHOT_FORMAT or manifest["backend"] != backend:
+                raise ValueError(f"Snapshot in {directory} is not a format {SNAPSHOT_FORMAT} {backend} snapshot; use --full")
+        self.manifest = manifest or {
+            "format": SNAPSHOT_FORMAT,
+            "backend": backend,
+            "expenses": 0,
+            "shares": 0,
+            "watermark": None,
+            "fingerprint": {},
+            "recent": []
+        }
+        self.recent = {key for _, key in self.manifest["recent"]}
+        dictionary = {}
+        if manifest:
+            with open(os.path.join(directory, "dictionary.json")) as f:
+                dictionary = json.load(f)
+        self.people = _Dictionary(**dictionary.get("people", {}))
+        self.categories = _Dictionary(**dictionary.get("categories", {}))
+
+        # Drop rows an interrupted run wrote past the manifest's counts
+        for table, columns in COLUMNS.items():
+            rows = self.manifest[table]
+            for column, dtype in columns.items():
+                with open(_column_path(directory, table, column), "ab") as f:
+                    f.truncate(rows * np.dtype(dtype).itemsize)
+
+    @property
+    def watermark(self) -> Optional[Tuple[datetime, str]]:
+        watermark = self.manifest["watermark"]
+        if not watermark:
+            return None
+        return EPOCH + timedelta(microseconds=watermark["created_at"]), watermark["id"]
+
+    def append(self, expenses: List[tuple], shares: List[tuple], fingerprint: Dict[str, int], advance: bool = True):
+        """Append one batch
+
+        ``expenses`` holds (id, created_at, payer code, category code,
+        amount) tuples and ``shares`` (expense position in the batch, person
+        code, is_exact, value) tuples; share cents are split here with the
+        same rules as every other balance path. ``fingerprint`` holds the
+        batch's source totals. A batch in keyset order after the watermark
+        moves it; one of late rows behind it passes ``advance=False``.
+        """
+        if not expenses:
+            return
+        split = CentsLedger.from_arrays(
+            self.people.names,
+            [expense[2] for expense in expenses],
+            [expense[4] for expense in expenses],
+            [share[0] for share in shares],
+            [share[1] for share in shares],
+            [share[2] for share in shares],
+            [share[3] for share in shares]
+        )
+        offset = self.manifest["expenses"]
+        columns = {
+            ("expenses", "created_at"): [to_micros(expense[1]) for expense in expenses],
+            ("expenses", "amount_cents"): split.amount_cents,
+            ("expenses", "payer"): split.payer,
+            ("expenses", "category"): [expense[3] for expense in expenses],
+            ("shares", "expense"): split.share_expense + offset,
+            ("shares", "person"): split.share_person,
+            ("shares", "cents"): split.share_cents,
+        }
+        for (table, column), values in columns.items():
+            with open(_column_path(self.directory, table, column), "ab") as f:
+                np.asarray(values, dtype=COLUMNS[table][column]).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        self.manifest["expenses"] += len(expenses)
+        self.manifest["shares"] += len(shares)
+        totals = self.manifest["fingerprint"]
+        for key, value in fingerprint.items():
+            totals[key] = totals.get(key, 0) + value
+        for expense in expenses:
+            self.recent.add(str(expense[0]))
+            self.manifest["recent"].append([to_micros(expense[1]), str(expense[0])])
+        if advance:
+            last_id, last_created_at = expenses[-1][0], expenses[-1][1]
+            self.manifest["watermark"] = {"created_at": to_micros(last_created_at), "id": str(last_id)}
+        self.commit()
+
+    def overlap_start(self) -> Optional[datetime]:
+        """Start of the window behind the watermark that is re-read for late commits"""
+        watermark = self.watermark
+        if not watermark:
+            return None
+        return watermark[0] - timedelta(seconds=self.overlap_seconds)
+
+    def matches(self, counts: Dict[str, int], fingerprint: Dict[str, int]) -> bool:
+        """Whether source totals up to the watermark match what was written"""
+        return (
+            counts == {"expenses": self.manifest["expenses"], "shares": self.manifest["shares"]}
+            and all(self.manifest["fingerprint"].get(key, 0) == value for key, value in fingerprint.items())
+        )
+
+    def commit(self):
+        # Only ids inside the overlap window can turn up again
+        start = self.overlap_start()
+        if start is not None:
+            start = to_micros(start)
+            self.manifest["recent"] = [entry for entry in self.manifest["recent"] if entry[0] >= start]
+        _write_json(os.path.join(self.directory, "dictionary.json"), {
+            "people": self.people.to_dict(),
+            "categories": self.categories.to_dict()
+        })
+        self.manifest["written_at"] = datetime.utcnow().isoformat()
+        _write_json(os.path.join(self.directory, "manifest.json"), self.manifest)
+
+def _scaled(total, scale: int) -> int:
+    # Exact for NUMERIC sums; SQLite's floating point ones round back
+    return int((Decimal(str(total or 0)) * scale).to_integral_value())
+
+def _sql_fingerprint(rows, shares) -> Dict[str, int]:
+    return {
+        "ids": sum(row.id for row in rows),
+        "amount_cents": sum(_scaled(row.amount, 100) for row in rows),
+        "payers": sum(row.paid_by for row in rows),
+        "categories": sum(row.category_id or 0 for row in rows),
+        "share_people": sum(person_id for _, person_id, _, _ in shares),
+        "share_values": sum(_scaled(value, 10000) for _, _, _, value in shares),
+    }
+
+def _open_sql(db, directory: str, full: bool) -> SnapshotWriter:
+    from sqlalchemy import select
+    from . import models
+    writer = SnapshotWriter(directory, "sql", full, settings.SNAPSHOT_OVERLAP_SECONDS)
+    for person_id, name in db.execute(select(models.Person.id, models.Person.name)):
+        writer.people.rename(person_id, name)
+    for category_id, name in db.execute(select(models.Category.id, models.Category.name)):
+        writer.categories.rename(category_id, name)
+    return writer
+
+def _append_sql(db, writer: SnapshotWriter, rows, advance: bool):
+    from sqlalchemy import select
+    from . import models
+    position = {row.id: index for index, row in enumerate(rows)}
+    source_shares = db.execute(
+        select(
+            models.ExpenseShare.expense_id,
+            models.ExpenseShare.person_id,
+            models.ExpenseShare.share_type,
+            models.ExpenseShare.value
+        ).where(models.ExpenseShare.expense_id.in_(list(position)))
+    ).all() if rows else []
+    writer.append([
+        (
+            row.id,
+            row.created_at,
+            writer.people.code(row.paid_by, "Unknown"),
+            -1 if row.category_id is None else writer.categories.code(row.category_id, "Unknown"),
+            float(row.amount)
+        )
+        for row in rows
+    ], [
+        (position[expense_id], writer.people.code(person_id, "Unknown"), share_type == "exact", float(value))
+        for expense_id, person_id, share_type, value in source_shares
+    ], _sql_fingerprint(rows, source_shares), advance)
+
+def snapshot_sql(db, directory: str, full: bool = False, batch_size: int = 10000) -> dict:
+    """Bring the snapshot up to date with the SQL expenses"""
+    from sqlalchemy import and_, func, or_, select
+    from . import models
+    expense = models.Expense
+    share = models.ExpenseShare
+    columns = (expense.id, expense.created_at, expense.paid_by, expense.category_id, expense.amount)
+    writer = _open_sql(db, directory, full)
+    added = 0
+    rewritten = False
+    if writer.watermark:
+        created_at, last_id = writer.watermark
+        behind = or_(expense.created_at < created_at, and_(expense.created_at == created_at, expense.id <= int(last_id)))
+        late = [
+            row for row in db.execute(
+                select(*columns).where(behind, expense.created_at >= writer.overlap_start()).order_by(expense.created_at, expense.id)
+            )
+            if str(row.id) not in writer.recent
+        ]
+        for start in range(0, len(late), batch_size):
+            _append_sql(db, writer, late[start:start + batch_size], advance=False)
+        added += len(late)
+
+        totals = db.execute(select(
+            func.count(expense.id),
+            func.sum(expense.id),
+            func.sum(expense.amount),
+            func.sum(expense.paid_by),
+            func.sum(func.coalesce(expense.category_id, 0))
+        ).where(behind)).one()
+        share_totals = db.execute(
+            select(func.count(share.id), func.sum(share.person_id), func.sum(share.value))
+            .join(expense, expense.id == share.expense_id).where(behind)
+        ).one()
+        counts = {"expenses": totals[0], "shares": share_totals[0]}
+        fingerprint = {
+            "ids": totals[1] or 0,
+            "amount_cents": _scaled(totals[2], 100),
+            "payers": totals[3] or 0,
+            "categories": totals[4] or 0,
+            "share_people": share_totals[1] or 0,
+            "share_values": _scaled(share_totals[2], 10000),
+        }
+        if not writer.matches(counts, fingerprint):
+            writer = _open_sql(db, directory, full=True)
+            added, rewritten = 0, True
+
+    while True:
+        query = select(*columns)
+        if writer.watermark:
+            created_at, last_id = writer.watermark
+            query = query.where(or_(
+                expense.created_at > created_at,
+                and_(expense.created_at == created_at, expense.id > int(last_id))
+            ))
+        rows = db.execute(query.order_by(expense.created_at, expense.id).limit(batch_size)).all()
+        if not rows:
+            break
+        _append_sql(db, writer, rows, advance=True)
+        added += len(rows)
+    writer.commit()
+    return {"added": added, "rewritten": rewritten, "expenses": writer.manifest["expenses"], "shares": writer.manifest["shares"]}
+
+def _mongo_fingerprint(expenses: List[dict]) -> Dict[str, int]:
+    # Ids as their ObjectId timestamps in milliseconds, like $toDate does
+    return {
+        "ids": sum(int(expense["_id"].generation_time.timestamp()) * 1000 for expense in expenses),
+        "amount_cents": sum(round(expense["amount"] * 100) for expense in expenses),
+        "share_values": sum(round(share["value"] * 10000) for expense in expenses for share in expense["shares"]),
+    }
+
+# The same totals over the source, server-side
+def _mongo_fingerprint_pipeline(match: dict) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "expenses": {"$sum": 1},
+            "shares": {"$sum": {"$size": "$shares"}},
+            "ids": {"$sum": {"$toLong": {"$toDate": "$_id"}}},
+            "amount_cents": {"$sum": {"$round": [{"$multiply": ["$amount", 100]}, 0]}},
+            "share_values": {"$sum": {"$sum": {"$map": {
+                "input": "$shares", "in": {"$round": [{"$multiply": ["$$this.value", 10000]}, 0]}
+            }}}}
+        }}
+    ]
+
+async def _open_mongo(db, directory: str, full: bool) -> SnapshotWriter:
+    writer = SnapshotWriter(directory, "mongo", full, settings.SNAPSHOT_OVERLAP_SECONDS)
+    async for person in db.people.find({}, {"name": 1}):
+        writer.people.rename(person["_id"], person["name"])
+    async for category in db.categories.find({}, {"name": 1}):
+        writer.categories.rename(category["_id"], category["name"])
+    return writer
+
+async def _append_mongo(writer: SnapshotWriter, cursor, batch_size: int, advance: bool) -> int:
+    added = 0
+    batch, expenses, shares = [], [], []
+    async for expense in cursor:
+        if not advance and str(expense["_id"]) in writer.recent:
+            continue
+        index = len(expenses)
+        category_id = expense.get("category_id")
+        batch.append(expense)
+        expenses.append((
+            expense["_id"],
+            expense["created_at"],
+            writer.people.code(expense["paid_by"], expense.get("paid_by_name", "Unknown")),
+            -1 if category_id is None else writer.categories.code(category_id, "Unknown"),
+            expense["amount"]
+        ))
+        for share in expense["shares"]:
+            shares.append((
+                index,
+                writer.people.code(share["person_id"], share.get("person_name", "Unknown")),
+                share["type"] == "exact",
+                share["value"]
+            ))
+        if len(expenses) >= batch_size:
+            writer.append(expenses, shares, _mongo_fingerprint(batch), advance)
+            added += len(expenses)
+            batch, expenses, shares = [], [], []
+    writer.append(expenses, shares, _mongo_fingerprint(batch), advance)
+    return added + len(expenses)
+
+async def snapshot_mongo(db, directory: str, full: bool = False, batch_size: int = 10000) -> dict:
+    """Bring the snapshot up to date with the MongoDB expenses"""
+    from bson import ObjectId
+    projection = {"created_at": 1, "paid_by": 1, "paid_by_name": 1, "category_id": 1, "amount": 1, "shares": 1}
+    order = [("created_at", 1), ("_id", 1)]
+    writer = await _open_mongo(db, directory, full)
+    added = 0
+    rewritten = False
+    if writer.watermark:
+        created_at, last_id = writer.watermark
+        behind = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lte": ObjectId(last_id)}}
+        ]}
+        added += await _append_mongo(writer, db.expenses.find(
+            {"$and": [behind, {"created_at": {"$gte": writer.overlap_start()}}]}, projection
+        ).sort(order).batch_size(batch_size), batch_size, advance=False)
+
+        totals = await db.expenses.aggregate(_mongo_fingerprint_pipeline(behind)).to_list(length=1)
+        totals = totals[0] if totals else {}
+        counts = {"expenses": totals.get("expenses", 0), "shares": totals.get("shares", 0)}
+        fingerprint = {key: int(totals.get(key, 0)) for key in ("ids", "amount_cents", "share_values")}
+        if not writer.matches(counts, fingerprint):
+            writer = await _open_mongo(db, directory, full=True)
+            added, rewritten = 0, True
+
+    query = {}
+    if writer.watermark:
+        created_at, last_id = writer.watermark
+        query = {"$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": ObjectId(last_id)}}
+        ]}
+    added += await _append_mongo(writer, db.expenses.find(query, projection).sort(order).batch_size(batch_size), batch_size, advance=True)
+    writer.commit()
+    return {"added": added, "rewritten": rewritten, "expenses": writer.manifest["expenses"], "shares": writer.manifest["shares"]}
+
+def _map(path: str, dtype: str, rows: int) -> np.ndarray:
+    # mmap cannot map an empty file
+    if not rows:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+class LedgerSnapshot:
+    """A snapshot's columns, memory-mapped read-only"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(directory, "dictionary.json")) as f:
+            dictionary = json.load(f)
+        self.people = dictionary["people"]["names"]
+        self.categories = dictionary["categories"]["names"]
+        for table, columns in COLUMNS.items():
+            for column, dtype in columns.items():
+                setattr(self, f"{table[:-1]}_{column}", _map(
+                    _column_path(directory, table, column), dtype, self.manifest[table]
+                ))
+
+    def ledger(self) -> CentsLedger:
+        """The snapshot as a CentsLedger for balance and settlement math"""
+        return CentsLedger(
+            self.people,
+            self.expense_payer,
+            self.expense_amount_cents,
+            self.share_expense,
+            self.share_person,
+            self.share_cents
+        )
+
+    def spend(self, dimension: str, bucket: str) -> Dict[Tuple[date, str], int]:
+        """Spend in cents per (bucket start, name), like the rollup tables
+
+        ``dimension`` is category, payer or person (share owed) and
+        ``bucket`` day, week (Monday) or month.
+        """
+        if dimension == "person":
+            moments, codes, cents, names = (
+                self.expense_created_at[self.share_expense], self.share_person, self.share_cents, self.people
+            )
+        elif dimension == "payer":
+            moments, codes, cents, names = self.expense_created_at, self.expense_payer, self.expense_amount_cents, self.people
+        elif dimension == "category":
+            known = self.expense_category >= 0
+            moments, codes, cents, names = (
+                self.expense_created_at[known], self.expense_category[known], self.expense_amount_cents[known], self.categories
+            )
+        else:
+            raise ValueError(f"Unknown dimension {dimension}")
+
+        days = np.asarray(moments).astype("datetime64[us]").astype("datetime64[D]")
+        if bucket == "day":
+            starts = days
+        elif bucket == "week":
+            # Day 0 of datetime64 is a Thursday
+            numbers = days.astype(np.int64)
+            starts = (numbers - (numbers + 3) % 7).astype("datetime64[D]")
+        elif bucket == "month":
+            starts = days.astype("datetime64[M]").astype("datetime64[D]")
+        else:
+            raise ValueError(f"Unknown bucket {bucket}")
+
+        keys = starts.astype(np.int64) * max(len(names), 1) + np.asarray(codes, dtype=np.int64)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        totals = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(totals, inverse, cents)
+        day_numbers, name_codes = np.divmod(unique, max(len(names), 1))
+        return {
+            (EPOCH.date() + timedelta(days=int(day)), names[int(code)]): int(total)
+            for day, code, total in zip(day_numbers, name_codes, totals)
+        }
+
+def load_snapshot(directory: str) -> LedgerSnapshot:
+    return LedgerSnapshot(directory)
+
+async def _snapshot_mongo(directory: str, full: bool, batch_size: int) -> dict:
+    from .mongodb import get_db
+    return await snapshot_mongo(get_db(), directory, full, batch_size)
+
+def _info(directory: str) -> dict:
+    started = time.perf_counter()
+    snapshot = load_snapshot(directory)
+    balances = snapshot.ledger().balances()
+    return {
+        **{key: snapshot.manifest[key] for key in ("backend", "expenses", "shares", "watermark", "written_at")},
+        "people": len(snapshot.people),
+        "categories": len(snapshot.categories),
+        "balances_sum_cents": int(balances.sum()),
+        "load_and_balance_seconds": round(time.perf_counter() - started, 3)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write or inspect the columnar expense ledger snapshot")
+    parser.add_argument("command", choices=["write", "info"])
+    parser.add_argument("--dir", default=settings.SNAPSHOT_DIR)
+    parser.add_argument("--backend", choices=["mongo", "sql"], default="mongo")
+    parser.add_argument("--full", action="store_true", help="discard the snapshot and write it from scratch")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+    if args.command == "info":
+        result = _info(args.dir)
+    elif args.backend == "sql":
+        from .database import SessionLocal
+        db = SessionLocal()
+        try:
+            result = snapshot_sql(db, args.dir, args.full, args.batch_size)
+        finally:
+            db.close()
+    else:
+        result = asyncio.run(_snapshot_mongo(args.dir, args.full, args.batch_size))
+    print(json.dumps(result, indent=2))
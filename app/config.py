@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     # API settings
@@ -7,9 +8,76 @@ class Settings(BaseSettings):
     
     # Error handling
     MAX_ERROR_MESSAGE_LENGTH: int = 500
+
+    # MongoDB connection, created lazily on first use
+    MONGODB_URI: Optional[str] = None
+    MONGODB_DATABASE: str = "expense_splitter"
+    MONGODB_TLS: bool = True
+    MONGODB_TLS_ALLOW_INVALID_CERTIFICATES: bool = False
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGODB_CONNECT_TIMEOUT_MS: int = 10000
+    MONGODB_SOCKET_TIMEOUT_MS: Optional[int] = None
+
+    # Create the MongoDB indexes from mongo_indexes.INDEX_SPEC at startup
+    APPLY_INDEXES_ON_STARTUP: bool = True
+
+    # Background sweep that rewrites names embedded in expenses (0 disables)
+    RECONCILE_INTERVAL_SECONDS: float = 3600.0
+
+    # ?mode=optimal settlement solver: the largest group it attempts (after
+    # pairing exact opposites), which alone decides optimal vs greedy and so
+    # bounds its CPU time. 16 people take about 0.1s; each extra person
+    # roughly doubles that.
+    SETTLEMENT_MAX_OPTIMAL_PEOPLE: int = 16
+
+    # Balance/settlement result cache: "memory" keeps the ledger version in
+    # this process (single worker only), "database" shares it across workers
+    RESULT_CACHE_BACKEND: str = "memory"
+
+    # How balance/settlement endpoints get per-person totals: "database" uses
+    # the running ledger and server-side aggregation, "vectorized" loads every
+    # expense into cents_ledger.CentsLedger for exact int64 math in-process
+    BALANCE_ENGINE: str = "database"
+
+    # Name <-> ID cache for people and categories
+    NAME_CACHE_SIZE: int = 10000
+    NAME_CACHE_TTL_SECONDS: float = 300.0
+
+    # Bulk NDJSON import
+    BULK_IMPORT_BATCH_SIZE: int = 500
+
+    # Streaming export cursor batch size
+    EXPORT_BATCH_SIZE: int = 1000
+
+    # Recurring expense materializer for the SQL backend (0 disables): how
+    # often it looks for due rows, rows per transaction, occurrences one row
+    # may emit per transaction while catching up, and how long a worker's
+    # lease on the job lasts
+    RECURRING_INTERVAL_SECONDS: float = 0.0
+    RECURRING_BATCH_SIZE: int = 100
+    RECURRING_MAX_CATCH_UP: int = 50
+    RECURRING_LEASE_SECONDS: float = 120.0
+
+    # How often pending sketch samples are folded into the category-month
+    # sketches (0 disables): MongoDB, and a sweep of the SQL backend like the
+    # recurring materializer above. SQL workers also compact a category-month
+    # in the background once they have committed this many samples for it
+    # (0 disables), which bounds what reads fold without a sweep running.
+    SKETCH_COMPACT_INTERVAL_SECONDS: float = 60.0
+    SQL_SKETCH_COMPACT_INTERVAL_SECONDS: float = 0.0
+    SQL_SKETCH_COMPACT_THRESHOLD: int = 100
+
+    # Where app.columnar_snapshot writes and reads the offline ledger snapshot
+    SNAPSHOT_DIR: str = "snapshots"
+    # How far behind its watermark a snapshot run looks for expenses that
+    # committed late; ones later still make it rewrite the snapshot
+    SNAPSHOT_OVERLAP_SECONDS: float = 300.0
     
     class Config:
         case_sensitive = True
         env_file = ".env"
+        extra = "ignore"
 
 settings = Settings()
@@ -1,17 +1,54 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+from . import statement_counter
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///expense_splitter.db")
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+# Async drivers for the URL schemes the sync engine accepts
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+# Backends whose INSERT supports the ON CONFLICT upserts the ledger, rollups,
+# sketches, search index and name lookups are written with
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def check_backend(url: str, setting: str = "DATABASE_URL"):
+    """Raise a configuration error unless ``url`` is a backend with upsert support"""
+    backend = make_url(url).get_backend_name()
+    if backend not in UPSERT_INSERTS:
+        raise ValueError(
+            f"{setting} uses unsupported database {backend!r}; "
+            f"use one of: {', '.join(sorted(UPSERT_INSERTS))}"
+        )
+
+def async_url(url: str):
+    """Return ``url`` with its driver swapped for the asyncio equivalent"""
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+
+# Fail at startup rather than on the first write
+check_backend(DATABASE_URL)
+check_backend(os.getenv("ASYNC_DATABASE_URL", DATABASE_URL), "ASYNC_DATABASE_URL")
 
-# Create PostgreSQL engine
+# Create PostgreSQL engine. Statement logging is opt-in via SQL_ECHO since
+# it costs a log line per query on every request.
 engine = create_engine(
-    os.getenv("DATABASE_URL", "sqlite:///expense_splitter.db"),
-    echo=True,
+    DATABASE_URL,
+    echo=SQL_ECHO,
     poolclass=QueuePool,
     pool_size=5,
     max_overflow=10
@@ -19,11 +56,37 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the SQL routers (asyncpg / aiosqlite). A request that
+# waits on the database yields the event loop instead of holding one of the
+# threadpool's workers. The sync engine stays for the CLIs and alembic.
+async_engine = create_async_engine(
+    async_url(os.getenv("ASYNC_DATABASE_URL", DATABASE_URL)),
+    echo=SQL_ECHO,
+    pool_size=5,
+    max_overflow=10
+)
+
+# expire_on_commit=False: attribute access after commit would otherwise
+# trigger an implicit (and under asyncio, illegal) lazy load
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+statement_counter.listen(engine)
+statement_counter.listen(async_engine.sync_engine)
+
 Base = declarative_base()
 
+def dialect_insert(db, model):
+    """Return an INSERT for ``model`` that supports ON CONFLICT clauses"""
+    # check_backend has already rejected every other dialect
+    return UPSERT_INSERTS[db.get_bind().dialect.name](model)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,149 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from typing import Dict, Tuple
+import argparse
+import json
+from . import models
+from .database import dialect_insert
+from .settlement_engine import expense_deltas, diff_balances
+from .result_cache import sql_version, shared_versions
+
+# Persistent per-person running paid, owed and balance totals for the SQL
+# backend, stored in the person_balances table. Every expense write applies
+# the (paid, owed) deltas of the expenses it adds or removes in the same
+# transaction, so balance reads cost O(people) instead of a walk over every
+# expense and share. rebuild_sql recomputes the ledger from the raw
+# expenses and check_sql reports any person whose stored totals disagree
+# with them.
+
+def sql_expense_deltas(expense: models.Expense, sign: int = 1) -> Dict[int, Tuple[int, int]]:
+    """Deltas for a stored expense, read from its current shares"""
+    return expense_deltas(
+        expense.paid_by,
+        expense.amount,
+        [(share.person_id, share.share_type, share.value) for share in expense.shares],
+        sign
+    )
+
+def bump_sql_version(db: Session):
+    """Advance the ledger version within the caller's transaction"""
+    # The in-process counter moves only once the transaction commits, so a
+    # concurrent read can never cache pre-commit data under the new version
+    db.info["ledger_changed"] = True
+    if shared_versions():
+        stmt = dialect_insert(db, models.LedgerVersion).values(id=1, version=1)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"version": models.LedgerVersion.version + 1}
+        ))
+
+def current_sql_version(db: Session) -> int:
+    """Return the ledger version that cached results are checked against"""
+    if not shared_versions():
+        return sql_version.value
+    version = db.query(models.LedgerVersion.version).filter(models.LedgerVersion.id == 1).scalar()
+    return version or 0
+
+@event.listens_for(Session, "after_commit")
+def _bump_local_version(session):
+    if session.info.pop("ledger_changed", False):
+        sql_version.bump()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_local_version(session):
+    session.info.pop("ledger_changed", None)
+
+def _ledger_row(person_id: int, paid: int, owed: int) -> dict:
+    return {"person_id": person_id, "paid_cents": paid, "owed_cents": owed, "balance_cents": owed - paid}
+
+def apply_sql_deltas(db: Session, deltas: Dict[int, Tuple[int, int]]):
+    """Add (paid, owed) deltas to person_balances within the caller's transaction"""
+    bump_sql_version(db)
+    if not deltas:
+        return
+    stmt = dialect_insert(db, models.PersonBalance).values([
+        _ledger_row(person_id, paid, owed)
+        for person_id, (paid, owed) in deltas.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["person_id"],
+        set_={
+            column: getattr(models.PersonBalance, column) + getattr(stmt.excluded, column)
+            for column in ("paid_cents", "owed_cents", "balance_cents")
+        }
+    ))
+
+def compute_sql_balances(db: Session) -> Dict[int, Tuple[int, int]]:
+    """Recompute every person's (paid, owed) totals from the raw expenses"""
+    totals = {person_id: (0, 0) for (person_id,) in db.query(models.Person.id).all()}
+    expenses = db.query(models.Expense).options(joinedload(models.Expense.shares)).all()
+    for expense in expenses:
+        for person_id, (paid, owed) in sql_expense_deltas(expense).items():
+            total_paid, total_owed = totals.get(person_id, (0, 0))
+            totals[person_id] = (total_paid + paid, total_owed + owed)
+    return totals
+
+def aggregate_sql_balances(db: Session) -> Dict[str, dict]:
+    """Return name -> paid and owed cents for every person in one query
+
+    The totals are read from the person_balances ledger, the same source as
+    the settlements, so shares are split by settlement_engine.share_cents
+    per expense and the balances sum to zero.
+    """
+    rows = db.query(
+        models.Person.name, models.PersonBalance.paid_cents, models.PersonBalance.owed_cents
+    ).outerjoin(
+        models.PersonBalance, models.PersonBalance.person_id == models.Person.id
+    ).order_by(models.Person.name).all()
+    return {name: {"paid_cents": paid or 0, "owed_cents": owed or 0} for name, paid, owed in rows}
+
+def read_sql_balances(db: Session) -> Dict[str, int]:
+    """Return name -> balance cents for every person from the ledger"""
+    rows = db.query(models.Person.name, models.PersonBalance.balance_cents).outerjoin(
+        models.PersonBalance, models.PersonBalance.person_id == models.Person.id
+    ).all()
+    return {name: cents or 0 for name, cents in rows}
+
+def rebuild_sql(db: Session) -> int:
+    """Replace the ledger with totals recomputed from scratch"""
+    totals = compute_sql_balances(db)
+    db.query(models.PersonBalance).delete()
+    bump_sql_version(db)
+    if totals:
+        db.bulk_insert_mappings(models.PersonBalance, [
+            _ledger_row(person_id, paid, owed)
+            for person_id, (paid, owed) in totals.items()
+        ])
+    db.commit()
+    return len(totals)
+
+def check_sql(db: Session) -> dict:
+    """Compare the ledger with totals recomputed from scratch"""
+    expected = compute_sql_balances(db)
+    stored = {
+        person_id: (paid, owed, balance)
+        for person_id, paid, owed, balance in db.query(
+            models.PersonBalance.person_id,
+            models.PersonBalance.paid_cents,
+            models.PersonBalance.owed_cents,
+            models.PersonBalance.balance_cents
+        ).all()
+    }
+    return diff_balances(expected, stored)
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    parser = argparse.ArgumentParser(description="Rebuild or verify the SQL balance ledger")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            result = {"rebuilt_people": rebuild_sql(db)}
+        else:
+            result = check_sql(db)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    if args.command == "check" and not result["consistent"]:
+        raise SystemExit(1)
@@ -1,13 +1,60 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import mongo_expenses
-from . import schemas
-from .mongodb import client
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+from .routes import mongo_expenses, mongo_settlements, mongo_analytics
+from . import schemas, mongo_sketches
+from .mongodb import get_client, close_client, ping, get_db
+from .mongo_indexes import apply_indexes
+from .mongo_reconcile import reconcile_periodically
+from .config import settings
+from .mongo_cache import people_cache, categories_cache
+from .result_cache import mongo_results
+
+logger = logging.getLogger(__name__)
+
+async def _apply_indexes_in_background():
+    try:
+        await apply_indexes(get_db())
+    except Exception as e:
+        logger.error(f"Error applying MongoDB indexes: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the client without waiting on the network; readiness is reported
+    # by /ready instead of blocking worker boot on a handshake.
+    get_client()
+    tasks = []
+    if settings.APPLY_INDEXES_ON_STARTUP:
+        tasks.append(asyncio.create_task(_apply_indexes_in_background()))
+    if settings.RECONCILE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(
+            reconcile_periodically(get_db(), settings.RECONCILE_INTERVAL_SECONDS)
+        ))
+    if settings.SKETCH_COMPACT_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(
+            mongo_sketches.compact_periodically(get_db(), settings.SKETCH_COMPACT_INTERVAL_SECONDS)
+        ))
+    if settings.SQL_SKETCH_COMPACT_INTERVAL_SECONDS > 0:
+        # Imported here so deployments without the SQL backend never load it
+        from . import sketches
+        tasks.append(asyncio.create_task(sketches.compact_periodically(settings.SQL_SKETCH_COMPACT_INTERVAL_SECONDS)))
+    if settings.RECURRING_INTERVAL_SECONDS > 0:
+        # Imported here so deployments without the SQL backend never load it
+        from .recurring_scheduler import run_scheduler
+        tasks.append(asyncio.create_task(run_scheduler(settings.RECURRING_INTERVAL_SECONDS)))
+    yield
+    for task in tasks:
+        task.cancel()
+    close_client()
 
 app = FastAPI(
     title="Expense Splitter API",
     description="API for splitting expenses between people",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -24,14 +71,34 @@ app.include_router(
     mongo_expenses.router,
     prefix="/api/v1"
 )
+app.include_router(
+    mongo_settlements.router,
+    prefix="/api/v1"
+)
+app.include_router(
+    mongo_analytics.router,
+    prefix="/api/v1"
+)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Expense Splitter API"}
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    client.close()
+@app.get("/ready")
+async def ready():
+    if not await ping():
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "name_cache": {
+            "people": people_cache.stats(),
+            "categories": categories_cache.stats()
+        },
+        "result_cache": mongo_results.stats()
+    }
 
 # Error handlers
 @app.exception_handler(404)
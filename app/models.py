@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Float, ForeignKey, Integer, String, DateTime
+from sqlalchemy import BigInteger, Boolean, Column, Date, ForeignKey, Index, Integer, JSON, Numeric, String, DateTime
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -26,7 +26,7 @@ class Expense(Base):
     __tablename__ = "expenses"
 
     id = Column(Integer, primary_key=True, index=True)
-    amount = Column(Float, nullable=False)
+    amount = Column(Numeric(12, 2), nullable=False)
     description = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     paid_by = Column(Integer, ForeignKey("people.id"))
@@ -39,6 +39,13 @@ class Expense(Base):
     shares = relationship("ExpenseShare", back_populates="expense")
     recurring = relationship("RecurringExpense", back_populates="expense", uselist=False)
 
+    __table_args__ = (
+        # Backs keyset pagination on (created_at, id)
+        Index("ix_expenses_created_at_id", "created_at", "id"),
+        # Per-payer totals and lookups
+        Index("ix_expenses_paid_by", "paid_by"),
+    )
+
     def __init__(self, amount, **kwargs):
         super().__init__(**kwargs)
         self.amount = Decimal(str(amount))  # Convert float to Decimal
@@ -50,11 +57,20 @@ class ExpenseShare(Base):
     expense_id = Column(Integer, ForeignKey("expenses.id"))
     person_id = Column(Integer, ForeignKey("people.id"))
     share_type = Column(String, nullable=False)  # percentage or exact
-    value = Column(Float, nullable=False)
+    # Money for exact shares, a percentage for percentage shares; the extra
+    # places keep fractional percentages like 33.3333 exact
+    value = Column(Numeric(12, 4), nullable=False)
     
     expense = relationship("Expense", back_populates="shares")
     person = relationship("Person", back_populates="expenses_shared")
 
+    __table_args__ = (
+        # Shares of an expense (loading, replacing, joining to expenses)
+        Index("ix_expense_shares_expense_id_person_id", "expense_id", "person_id"),
+        # Shares owed by a person
+        Index("ix_expense_shares_person_id", "person_id"),
+    )
+
 class RecurringExpense(Base):
     __tablename__ = "recurring_expenses"
 
@@ -63,6 +79,92 @@ class RecurringExpense(Base):
     frequency = Column(String, nullable=False)  # daily, weekly, monthly, yearly
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=True)
-    next_occurrence = Column(DateTime, nullable=False)
+    next_occurrence = Column(DateTime, nullable=False, index=True)  # due-row scans
     
     expense = relationship("Expense", back_populates="recurring")
+
+class PersonBalance(Base):
+    __tablename__ = "person_balances"
+
+    # Running paid, owed and net balance (owed - paid, positive means the
+    # person owes money) totals in cents, maintained by app.ledger in the
+    # same transaction as each expense write
+    person_id = Column(Integer, ForeignKey("people.id"), primary_key=True)
+    balance_cents = Column(BigInteger, nullable=False, default=0)
+    paid_cents = Column(BigInteger, nullable=False, default=0)
+    owed_cents = Column(BigInteger, nullable=False, default=0)
+
+    person = relationship("Person")
+
+class LedgerVersion(Base):
+    __tablename__ = "ledger_version"
+
+    # Single row bumped by every expense write; cached balance and
+    # settlement results are valid only while it is unchanged
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    # One row per background job; the worker whose lease has not expired
+    # is the only one that runs it
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class SpendRollup(Base):
+    __tablename__ = "spend_rollups"
+
+    # Spend per category, payer or person (entity_id) and day/week/month
+    # bucket, maintained by app.rollups alongside every expense write. The
+    # primary key order serves range reads for one dimension and bucket size.
+    dimension = Column(String, primary_key=True)  # category, person or payer
+    bucket = Column(String, primary_key=True)  # day, week or month
+    bucket_start = Column(Date, primary_key=True)
+    entity_id = Column(Integer, primary_key=True)
+    amount_cents = Column(BigInteger, nullable=False, default=0)
+    expense_count = Column(Integer, nullable=False, default=0)
+
+class CategorySketch(Base):
+    __tablename__ = "category_sketches"
+
+    # Amount quantile and top-payer sketches for one category and month
+    # (app.streaming_sketches). Only app.sketches' compaction job writes
+    # them, folding in the pending sketch_samples rows. category_id is 0 for
+    # uncategorized expenses.
+    month = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    sketch = Column(JSON, nullable=True)
+
+class SketchSample(Base):
+    __tablename__ = "sketch_samples"
+
+    # Append-only sketch updates: expense inserts add a (paid_by, amount)
+    # sample and updates and deletes a rebuild marker for each category-month
+    # they touch, so concurrent writers never contend on a sketch row
+    id = Column(Integer, primary_key=True)
+    month = Column(Date, nullable=False)
+    category_id = Column(Integer, nullable=False)
+    paid_by = Column(Integer, nullable=True)
+    amount_cents = Column(BigInteger, nullable=True)
+    rebuild = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        # Range reads and per category-month compaction
+        Index("ix_sketch_samples_month_category", "month", "category_id"),
+    )
+
+class ExpenseTerm(Base):
+    __tablename__ = "expense_terms"
+
+    # Inverted index over expense descriptions (app.search_index): one row
+    # per distinct term of each expense. The primary key serves prefix
+    # range scans.
+    term = Column(String, primary_key=True)
+    expense_id = Column(Integer, ForeignKey("expenses.id"), primary_key=True)
+
+    __table_args__ = (
+        # Reindexing an expense on update and delete
+        Index("ix_expense_terms_expense_id", "expense_id"),
+    )
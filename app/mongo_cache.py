@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from typing import Optional
+import time
+from bson import ObjectId
+from .config import settings
+
+class NameCache:
+    """Bounded two-way name <-> ObjectId cache with LRU eviction and a TTL.
+
+    Entries are stored once per (name, id) pair and indexed both ways, so a
+    lookup in either direction refreshes the same LRU slot. The cache lives
+    in-process and is only touched from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._by_name = OrderedDict()  # name -> (id, expires_at)
+        self._by_id = {}  # id -> name
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, name: str) -> Optional[ObjectId]:
+        entry = self._by_name.get(name)
+        if entry is None:
+            return None
+        entry_id, expires_at = entry
+        if expires_at < time.monotonic():
+            self.invalidate(name=name)
+            return None
+        self._by_name.move_to_end(name)
+        return entry_id
+
+    def get_id(self, name: str) -> Optional[ObjectId]:
+        """Return the cached ObjectId for ``name``, or None on a miss"""
+        entry_id = self._lookup(name)
+        if entry_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry_id
+
+    def get_name(self, entry_id: ObjectId) -> Optional[str]:
+        """Return the cached name for ``entry_id``, or None on a miss"""
+        name = self._by_id.get(entry_id)
+        if name is None or self._lookup(name) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return name
+
+    def put(self, name: str, entry_id: ObjectId):
+        """Cache a name <-> id pair, evicting the least recently used entry"""
+        self.invalidate(name=name, entry_id=entry_id)
+        self._by_name[name] = (entry_id, time.monotonic() + self.ttl_seconds)
+        self._by_id[entry_id] = name
+        while len(self._by_name) > self.max_size:
+            _, (evicted_id, _) = self._by_name.popitem(last=False)
+            self._by_id.pop(evicted_id, None)
+
+    def invalidate(self, name: Optional[str] = None, entry_id: Optional[ObjectId] = None):
+        """Drop any entry matching ``name`` or ``entry_id``"""
+        if entry_id is not None:
+            old_name = self._by_id.pop(entry_id, None)
+            if old_name is not None:
+                self._by_name.pop(old_name, None)
+        if name is not None:
+            entry = self._by_name.pop(name, None)
+            if entry is not None:
+                self._by_id.pop(entry[0], None)
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        self._by_name.clear()
+        self._by_id.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._by_name),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+# Shared caches for the people and categories collections
+people_cache = NameCache(settings.NAME_CACHE_SIZE, settings.NAME_CACHE_TTL_SECONDS)
+categories_cache = NameCache(settings.NAME_CACHE_SIZE, settings.NAME_CACHE_TTL_SECONDS)
@@ -0,0 +1,483 @@
+from typing import AsyncIterator, List, Optional
+from datetime import datetime
+import time
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
+from . import schemas
+from .config import settings
+from .mongo_cache import people_cache, categories_cache, NameCache
+from .mongodb import convert_str_to_id
+from .pagination import encode_cursor, decode_cursor
+from .mongo_ledger import apply_mongo_deltas, mongo_expense_deltas, mark_committed
+from .mongo_rollups import apply_mongo_rollups, mongo_expense_rollups
+from .rollup_buckets import bucket_range, merge_rollups
+from .mongo_sketches import apply_mongo_sketches, mark_mongo_stale, read_mongo_sketch, sketch_key
+from .streaming_sketches import ExpenseSketch
+from .settlement_engine import merge_deltas
+
+# Async data-access layer for the MongoDB backend. Every function takes the
+# Motor database returned by ``mongodb.get_db`` so the routes never touch the
+# collections directly and never block the event loop.
+
+async def _upsert_names(collection, cache: NameCache, names) -> dict:
+    # Resolve names to ObjectIds, creating missing documents. Cache misses are
+    # upserted with a single unordered bulk_write and then fetched back with
+    # one $in query; the unique index on "name" makes concurrent upserts of
+    # the same name converge on one document.
+    ids = {}
+    missing = []
+    for name in names:
+        entry_id = cache.get_id(name)
+        if entry_id is None:
+            missing.append(name)
+        else:
+            ids[name] = entry_id
+    if not missing:
+        return ids
+
+    operations = [
+        UpdateOne({"name": name}, {"$setOnInsert": {"name": name}}, upsert=True)
+        for name in missing
+    ]
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Losing an upsert race raises a duplicate key error; the winner's
+        # document is what we want, so anything else is a real failure.
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+
+    async for doc in collection.find({"name": {"$in": missing}}, {"name": 1}):
+        ids[doc["name"]] = doc["_id"]
+        cache.put(doc["name"], doc["_id"])
+    return ids
+
+async def resolve_person_ids(db, names) -> dict:
+    """Map person names to ObjectIds, creating missing people"""
+    return await _upsert_names(db.people, people_cache, set(names))
+
+async def resolve_category_id(db, name: str) -> ObjectId:
+    """Map a category name to its ObjectId, creating it if needed"""
+    return (await _upsert_names(db.categories, categories_cache, [name]))[name]
+
+async def _resolve_names(collection, cache: NameCache, ids) -> dict:
+    # Serve what we can from the cache and fetch the rest with one $in query
+    names = {}
+    missing = []
+    for entry_id in ids:
+        name = cache.get_name(entry_id)
+        if name is None:
+            missing.append(entry_id)
+        else:
+            names[entry_id] = name
+    if missing:
+        async for doc in collection.find({"_id": {"$in": missing}}, {"name": 1}):
+            names[doc["_id"]] = doc["name"]
+            cache.put(doc["name"], doc["_id"])
+    return names
+
+def _expense_document(expense: schemas.ExpenseCreate, person_ids: dict, category_id: ObjectId) -> dict:
+    # Names are stored next to their ids so reads never join back to people
+    # or categories; mongo_reconcile rewrites them when a name changes.
+    return {
+        "amount": float(expense.amount),
+        "description": expense.description,
+        "paid_by": person_ids[expense.paid_by],
+        "paid_by_name": expense.paid_by,
+        "category_id": category_id,
+        "category_name": expense.category.value,
+        "created_at": datetime.utcnow(),
+        "shares": [
+            {
+                "person_id": person_ids[share.person],
+                "person_name": share.person,
+                "type": share.type.value,
+                "value": float(share.value)
+            }
+            for share in expense.shares
+        ]
+    }
+
+async def insert_expense(db, expense: schemas.ExpenseCreate) -> dict:
+    """Store a new expense and return it in the API response shape"""
+    # Get or create people and category, served from the name cache when hot
+    person_names = set([expense.paid_by] + [share.person for share in expense.shares])
+    person_ids = await resolve_person_ids(db, person_names)
+    category_id = await resolve_category_id(db, expense.category.value)
+
+    # Create expense document
+    expense_doc = _expense_document(expense, person_ids, category_id)
+
+    # Insert expense and apply its balance, rollup and sketch updates in one transaction
+    async def write(session):
+        await db.expenses.insert_one(expense_doc, session=session)
+        await apply_mongo_deltas(db, mongo_expense_deltas(expense_doc), session=session)
+        await apply_mongo_rollups(db, mongo_expense_rollups(expense_doc), session=session)
+        await apply_mongo_sketches(db, [expense_doc], session=session)
+
+    async with await db.client.start_session() as session:
+        await session.with_transaction(write)
+    mark_committed()
+
+    return {
+        "id": str(expense_doc["_id"]),
+        "amount": expense_doc["amount"],
+        "description": expense_doc["description"],
+        "category": expense.category.value,
+        "paid_by": expense.paid_by,
+        "created_at": expense_doc["created_at"],
+        "shares": [
+            {
+                "person": share.person,
+                "type": share.type.value,
+                "value": float(share.value)
+            }
+            for share in expense.shares
+        ]
+    }
+
+async def _import_batch(db, batch: List[tuple], errors: List[dict]) -> int:
+    # Resolve every person and category referenced by the batch in one pass,
+    # then write all expenses with a single unordered insert_many so one bad
+    # document does not stop the rest of the batch.
+    person_names = set()
+    category_names = set()
+    for _, expense in batch:
+        person_names.add(expense.paid_by)
+        person_names.update(share.person for share in expense.shares)
+        category_names.add(expense.category.value)
+    person_ids = await _upsert_names(db.people, people_cache, person_names)
+    category_ids = await _upsert_names(db.categories, categories_cache, category_names)
+
+    documents = [
+        _expense_document(expense, person_ids, category_ids[expense.category.value])
+        for _, expense in batch
+    ]
+    # Count only this batch's failures; ``errors`` spans the whole import
+    batch_errors = [
+        {"line": batch[error["index"]][0], "error": error["errmsg"]}
+        for error in await _insert_with_ledger(db, documents)
+    ]
+    errors.extend(batch_errors)
+    return len(documents) - len(batch_errors)
+
+async def _insert_with_ledger(db, documents: List[dict]) -> List[dict]:
+    # Insert the documents and apply their balance, rollup and sketch updates
+    # in one transaction. A write error aborts the whole transaction, so the failed
+    # documents are reported and the rest retried without them. Returns the
+    # write errors with "index" pointing into ``documents``.
+    pending = list(range(len(documents)))
+    errors = []
+    while pending:
+        docs = [documents[index] for index in pending]
+
+        async def write(session):
+            await db.expenses.insert_many(docs, ordered=False, session=session)
+            deltas = merge_deltas(*(mongo_expense_deltas(doc) for doc in docs))
+            await apply_mongo_deltas(db, deltas, session=session)
+            rollups = merge_rollups(*(mongo_expense_rollups(doc) for doc in docs))
+            await apply_mongo_rollups(db, rollups, session=session)
+            await apply_mongo_sketches(db, docs, session=session)
+
+        try:
+            async with await db.client.start_session() as session:
+                await session.with_transaction(write)
+            mark_committed()
+            break
+        except BulkWriteError as e:
+            write_errors = e.details["writeErrors"]
+            if not write_errors:
+                raise
+            failed = set()
+            for error in write_errors:
+                failed.add(pending[error["index"]])
+                errors.append({"index": pending[error["index"]], "errmsg": error["errmsg"]})
+            pending = [index for index in pending if index not in failed]
+    return errors
+
+async def import_expenses(db, lines: AsyncIterator[bytes], batch_size: int) -> dict:
+    """Validate and insert newline-delimited expenses in batches of ``batch_size``
+
+    Lines are consumed incrementally, so only one batch is held in memory.
+    Invalid lines are reported by line number instead of failing the import.
+    """
+    started = time.perf_counter()
+    received = 0
+    inserted = 0
+    errors = []
+    batch = []
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        received += 1
+        try:
+            batch.append((line_number, schemas.ExpenseCreate.model_validate_json(line)))
+        except ValidationError as e:
+            errors.append({"line": line_number, "error": str(e)[:settings.MAX_ERROR_MESSAGE_LENGTH]})
+            continue
+        if len(batch) >= batch_size:
+            inserted += await _import_batch(db, batch, errors)
+            batch = []
+    if batch:
+        inserted += await _import_batch(db, batch, errors)
+
+    elapsed = time.perf_counter() - started
+    errors.sort(key=lambda error: error["line"])
+    return {
+        "received": received,
+        "inserted": inserted,
+        "failed": received - inserted,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 4),
+        "expenses_per_second": round(inserted / elapsed, 1) if elapsed else 0.0
+    }
+
+def _has_embedded_names(expense: dict) -> bool:
+    return "paid_by_name" in expense and "category_name" in expense and all(
+        "person_name" in share for share in expense["shares"]
+    )
+
+async def _embed_names(db, expenses: List[dict]):
+    # Fill in names for documents written before names were embedded, using
+    # the name cache and one batched $in query per collection. The
+    # reconciliation job backfills these documents so this path dies out.
+    person_ids = set()
+    category_ids = set()
+    for expense in expenses:
+        person_ids.add(expense["paid_by"])
+        category_ids.add(expense["category_id"])
+        person_ids.update(share["person_id"] for share in expense["shares"])
+
+    person_names = await _resolve_names(db.people, people_cache, person_ids)
+    category_names = await _resolve_names(db.categories, categories_cache, category_ids)
+
+    for expense in expenses:
+        expense["paid_by_name"] = person_names[expense["paid_by"]]
+        expense["category_name"] = category_names[expense["category_id"]]
+        for share in expense["shares"]:
+            share["person_name"] = person_names[share["person_id"]]
+
+async def _to_responses(db, expenses: List[dict]) -> List[dict]:
+    # Expense documents carry their payer, category and share-person names,
+    # so a page renders from the expenses collection alone with no joins.
+    legacy = [expense for expense in expenses if not _has_embedded_names(expense)]
+    if legacy:
+        await _embed_names(db, legacy)
+
+    return [
+        {
+            "id": str(expense["_id"]),
+            "amount": expense["amount"],
+            "description": expense["description"],
+            "category": expense["category_name"],
+            "paid_by": expense["paid_by_name"],
+            "created_at": expense["created_at"],
+            "shares": [
+                {
+                    "person": share["person_name"],
+                    "type": share["type"],
+                    "value": share["value"]
+                }
+                for share in expense["shares"]
+            ]
+        }
+        for expense in expenses
+    ]
+
+# Listings and exports walk expenses in (created_at, _id) order
+KEYSET_ORDER = [("created_at", 1), ("_id", 1)]
+
+def _after(created_at: datetime, last_id: ObjectId) -> dict:
+    # Everything past (created_at, last_id) in KEYSET_ORDER
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "_id": {"$gt": last_id}}
+    ]}
+
+def _cursor_id(value: str) -> ObjectId:
+    # InvalidId is not a ValueError; make it one so the cursor is rejected with a 400
+    try:
+        return convert_str_to_id(value)
+    except InvalidId as e:
+        raise ValueError(str(e))
+
+async def list_expenses(db, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> tuple:
+    """Return a page of expenses in the API response shape and the next cursor
+
+    Pages are ordered by (created_at, _id). When ``cursor`` is given the page
+    starts right after it with an index seek on that compound key and
+    ``skip`` is ignored; otherwise ``skip``/``limit`` behave as before.
+    """
+    query = {}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, _cursor_id)
+        query = _after(created_at, last_id)
+        skip = 0
+    expenses = await db.expenses.find(query).sort(KEYSET_ORDER) \
+        .skip(skip).limit(limit).to_list(length=limit)
+    next_cursor = None
+    if limit and len(expenses) == limit:
+        next_cursor = encode_cursor(expenses[-1]["created_at"], expenses[-1]["_id"])
+    return await _to_responses(db, expenses), next_cursor
+
+async def get_expense(db, expense_id: ObjectId) -> Optional[dict]:
+    """Return a single expense in the API response shape, or None"""
+    expense = await db.expenses.find_one({"_id": expense_id})
+    if not expense:
+        return None
+    return (await _to_responses(db, [expense]))[0]
+
+async def search_expenses(db, query: str, skip: int = 0, limit: int = 20) -> List[dict]:
+    """Return a page of expenses matching ``query`` in the API response shape, best first
+
+    Served by the text index on description: words are stemmed, so
+    "pizzas" finds "pizza", and results are ranked by textScore.
+    """
+    expenses = await db.expenses.find(
+        {"$text": {"$search": query}},
+        {"score": {"$meta": "textScore"}}
+    ).sort([("score", {"$meta": "textScore"}), ("_id", -1)]).skip(skip).limit(limit).to_list(length=limit)
+    responses = await _to_responses(db, expenses)
+    for response, expense in zip(responses, expenses):
+        response["score"] = expense["score"]
+    return responses
+
+async def find_category_id(db, name: str) -> Optional[ObjectId]:
+    """Map a category name to its ObjectId without creating it"""
+    category_id = categories_cache.get_id(name)
+    if category_id is None:
+        category = await db.categories.find_one({"name": name}, {"name": 1})
+        if category:
+            category_id = category["_id"]
+            categories_cache.put(name, category_id)
+    return category_id
+
+async def stream_expenses(
+    db,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[str] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[dict]:
+    """Yield every matching expense in the API response shape
+
+    Filters are pushed down into the query and expenses are read in
+    ``batch_size`` chunks in (created_at, _id) order, each chunk a fresh
+    query resuming after the last key of the one before and resolved with
+    one batched name lookup. Memory stays flat however many expenses are
+    exported, and no server cursor has to outlive a slow client.
+    """
+    query = {}
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = start
+        if end:
+            query["created_at"]["$lt"] = end
+    if category:
+        category_id = await find_category_id(db, category)
+        if category_id is None:
+            return
+        query["category_id"] = category_id
+
+    page = query
+    while True:
+        batch = await db.expenses.find(page).sort(KEYSET_ORDER).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            return
+        for response in await _to_responses(db, batch):
+            yield response
+        if len(batch) < batch_size:
+            return
+        page = {"$and": [query, _after(batch[-1]["created_at"], batch[-1]["_id"])]}
+
+# Every person with their paid and owed totals from the "balances" ledger,
+# the source the settlements use, so shares are split by
+# settlement_engine.share_cents per expense and the balances sum to zero.
+# One round trip returns O(people) rows; no expense is read.
+LEDGER_PIPELINE = [
+    {"$lookup": {"from": "balances", "localField": "_id", "foreignField": "_id", "as": "ledger"}},
+    {"$project": {
+        "name": 1,
+        "paid_cents": {"$ifNull": [{"$first": "$ledger.paid_cents"}, 0]},
+        "owed_cents": {"$ifNull": [{"$first": "$ledger.owed_cents"}, 0]}
+    }},
+    {"$sort": {"name": 1}}
+]
+
+async def aggregate_balances(db) -> List[dict]:
+    """Return name, paid_cents and owed_cents for every person from the ledger"""
+    return [
+        {"name": row["name"], "paid_cents": int(row["paid_cents"]), "owed_cents": int(row["owed_cents"])}
+        async for row in db.people.aggregate(LEDGER_PIPELINE)
+    ]
+
+async def delete_expense(db, expense_id: ObjectId) -> bool:
+    """Delete an expense, returning whether it existed"""
+    # Delete the expense, reverse its balance and rollup deltas and mark its
+    # sketch for a rebuild in one transaction
+    async def write(session):
+        expense = await db.expenses.find_one_and_delete({"_id": expense_id}, session=session)
+        if expense:
+            await apply_mongo_deltas(db, mongo_expense_deltas(expense, sign=-1), session=session)
+            await apply_mongo_rollups(db, mongo_expense_rollups(expense, sign=-1), session=session)
+            await mark_mongo_stale(db, [sketch_key(expense["created_at"], expense.get("category_id"))], session=session)
+        return expense is not None
+
+    async with await db.client.start_session() as session:
+        deleted = await session.with_transaction(write)
+    if deleted:
+        mark_committed()
+    return deleted
+
+ROLLUP_NAMES = {"category": ("categories", categories_cache), "person": ("people", people_cache), "payer": ("people", people_cache)}
+
+async def spend_rollups(db, dimension: str, bucket: str, start=None, end=None) -> List[dict]:
+    """Return spend per entity and bucket from the rollup collection"""
+    start, end = bucket_range(bucket, start, end)
+    query = {"dimension": dimension, "bucket": bucket, "expense_count": {"$ne": 0}}
+    bounds = {}
+    if start:
+        bounds["$gte"] = datetime.combine(start, datetime.min.time())
+    if end:
+        bounds["$lte"] = datetime.combine(end, datetime.min.time())
+    if bounds:
+        query["bucket_start"] = bounds
+    rows = await db.spend_rollups.find(query).sort("bucket_start", 1).to_list(length=None)
+
+    collection_name, cache = ROLLUP_NAMES[dimension]
+    names = await _resolve_names(db[collection_name], cache, {row["entity_id"] for row in rows})
+    result = [
+        {
+            "period": row["bucket_start"].date(),
+            "name": names.get(row["entity_id"], "Unknown"),
+            "amount_cents": row["amount_cents"],
+            "expenses": row["expense_count"]
+        }
+        for row in rows
+    ]
+    result.sort(key=lambda row: (row["period"], row["name"]))
+    return result
+
+async def expense_sketch(db, start=None, end=None, category: Optional[str] = None) -> ExpenseSketch:
+    """Merged quantile and top-payer sketch for a date range and optional category"""
+    category_id = None
+    if category:
+        category_id = await find_category_id(db, category)
+        if category_id is None:
+            return ExpenseSketch()
+    return await read_mongo_sketch(db, start, end, category_id)
+
+async def top_payers(db, sketch: ExpenseSketch, limit: int) -> List[dict]:
+    """Top payers of a sketch with their names"""
+    top = sketch.payers.top(limit)
+    names = await _resolve_names(db.people, people_cache, {person_id for person_id, _, _ in top})
+    return [
+        {"name": names.get(person_id, "Unknown"), "amount_cents": total, "error_cents": error}
+        for person_id, total, error in top
+    ]
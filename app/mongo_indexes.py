@@ -0,0 +1,123 @@
+from datetime import datetime
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+import argparse
+import asyncio
+import json
+
+# Declarative index spec for the MongoDB collections. Bump INDEX_SPEC_VERSION
+# whenever the spec changes; apply_indexes records the applied version so a
+# deployment can tell whether its indexes are current.
+INDEX_SPEC_VERSION = 6
+
+INDEX_SPEC = {
+    "people": [
+        IndexModel([("name", ASCENDING)], unique=True),
+    ],
+    "categories": [
+        IndexModel([("name", ASCENDING)], unique=True),
+    ],
+    "expenses": [
+        # Keyset pagination and date-range filters; also serves created_at alone
+        IndexModel([("created_at", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("paid_by", ASCENDING)]),
+        # Multikey index over the embedded shares array
+        IndexModel([("shares.person_id", ASCENDING)]),
+        # Category-filtered exports over a date range, in keyset order
+        IndexModel([("category_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)]),
+        # Full-text search over descriptions (stemmed, ranked by textScore)
+        IndexModel([("description", TEXT)], default_language="english"),
+    ],
+    "spend_rollups": [
+        # One document per rollup key; also serves date-range report reads
+        IndexModel(
+            [("dimension", ASCENDING), ("bucket", ASCENDING), ("bucket_start", ASCENDING), ("entity_id", ASCENDING)],
+            unique=True
+        ),
+    ],
+    "expense_sketches": [
+        # One document per category-month; also serves month-range reads
+        IndexModel([("month", ASCENDING), ("category_id", ASCENDING)], unique=True),
+    ],
+    "sketch_samples": [
+        # Pending sketch updates; month-range reads and per category-month compaction
+        IndexModel([("month", ASCENDING), ("category_id", ASCENDING)]),
+    ],
+}
+
+# Error codes for an existing index whose name or options differ from the spec
+INDEX_CONFLICT_CODES = (85, 86)
+
+async def apply_indexes(db) -> dict:
+    """Create every index in the spec; safe to run any number of times"""
+    created = {}
+    for collection_name, indexes in INDEX_SPEC.items():
+        collection = db[collection_name]
+        try:
+            created[collection_name] = await collection.create_indexes(indexes)
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_CODES:
+                raise
+            # An index with the same name but outdated options: rebuild it
+            for index in indexes:
+                try:
+                    await collection.create_indexes([index])
+                except OperationFailure as conflict:
+                    if conflict.code not in INDEX_CONFLICT_CODES:
+                        raise
+                    await collection.drop_index(index.document["name"])
+                    await collection.create_indexes([index])
+            created[collection_name] = [index.document["name"] for index in indexes]
+    await db.schema_meta.update_one(
+        {"_id": "indexes"},
+        {"$set": {"version": INDEX_SPEC_VERSION, "applied_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return created
+
+async def check_indexes(db) -> dict:
+    """Report indexes that are missing from, or unused by, each collection
+
+    Usage counts come from $indexStats and reset when the server restarts,
+    so an index is only reported unused if it has had no accesses since then.
+    """
+    meta = await db.schema_meta.find_one({"_id": "indexes"})
+    report = {
+        "spec_version": INDEX_SPEC_VERSION,
+        "applied_version": meta["version"] if meta else None,
+        "collections": {}
+    }
+    for collection_name, indexes in INDEX_SPEC.items():
+        collection = db[collection_name]
+        expected = {index.document["name"] for index in indexes}
+        existing = set((await collection.index_information()).keys()) - {"_id_"}
+        unused = []
+        async for stats in collection.aggregate([{"$indexStats": {}}]):
+            if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                unused.append(stats["name"])
+        report["collections"][collection_name] = {
+            "missing": sorted(expected - existing),
+            "unexpected": sorted(existing - expected),
+            "unused": sorted(unused)
+        }
+    report["ok"] = report["applied_version"] == INDEX_SPEC_VERSION and not any(
+        entry["missing"] for entry in report["collections"].values()
+    )
+    return report
+
+async def _main(command: str):
+    from .mongodb import get_db
+    if command == "apply":
+        result = await apply_indexes(get_db())
+    else:
+        result = await check_indexes(get_db())
+    print(json.dumps(result, indent=2, default=str))
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["apply", "check"])
+    args = parser.parse_args()
+    result = asyncio.run(_main(args.command))
+    if args.command == "check" and not result["ok"]:
+        raise SystemExit(1)
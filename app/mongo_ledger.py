@@ -0,0 +1,104 @@
+from typing import Dict, Tuple
+from pymongo import UpdateOne
+import argparse
+import asyncio
+import json
+from .settlement_engine import expense_deltas, diff_balances
+from .result_cache import mongo_version, shared_versions
+
+# Persistent per-person running paid, owed and balance totals for the
+# MongoDB backend, stored in the "balances" collection keyed by person
+# ObjectId. Expense writes apply their (paid, owed) deltas inside the same
+# transaction as the expense insert or delete. rebuild_mongo recomputes the
+# ledger from the raw expenses and check_mongo reports any person whose
+# stored totals disagree with them.
+
+def mongo_expense_deltas(expense: dict, sign: int = 1) -> Dict[object, Tuple[int, int]]:
+    """Deltas for an expense document"""
+    return expense_deltas(
+        expense["paid_by"],
+        expense["amount"],
+        [(share["person_id"], share["type"], share["value"]) for share in expense["shares"]],
+        sign
+    )
+
+async def bump_mongo_version(db, session=None):
+    """Advance the shared ledger version, inside ``session``'s transaction if given"""
+    if shared_versions():
+        await db.ledger_meta.update_one({"_id": "ledger"}, {"$inc": {"version": 1}}, upsert=True, session=session)
+
+def mark_committed():
+    """Advance the in-process ledger version once a write has committed"""
+    mongo_version.bump()
+
+async def current_mongo_version(db) -> int:
+    """Return the ledger version that cached results are checked against"""
+    if not shared_versions():
+        return mongo_version.value
+    meta = await db.ledger_meta.find_one({"_id": "ledger"})
+    return meta["version"] if meta else 0
+
+def _ledger_fields(paid: int, owed: int) -> dict:
+    return {"paid_cents": paid, "owed_cents": owed, "balance_cents": owed - paid}
+
+async def apply_mongo_deltas(db, deltas: Dict[object, Tuple[int, int]], session=None):
+    """$inc the balances collection by (paid, owed) deltas, inside ``session``'s transaction if given"""
+    await bump_mongo_version(db, session)
+    if not deltas:
+        return
+    await db.balances.bulk_write([
+        UpdateOne({"_id": person_id}, {"$inc": _ledger_fields(paid, owed)}, upsert=True)
+        for person_id, (paid, owed) in deltas.items()
+    ], ordered=False, session=session)
+
+async def compute_mongo_balances(db) -> Dict[object, Tuple[int, int]]:
+    """Recompute every person's (paid, owed) totals from the raw expenses"""
+    totals = {}
+    async for person in db.people.find({}, {"_id": 1}):
+        totals[person["_id"]] = (0, 0)
+    async for expense in db.expenses.find({}, {"paid_by": 1, "amount": 1, "shares": 1}):
+        for person_id, (paid, owed) in mongo_expense_deltas(expense).items():
+            total_paid, total_owed = totals.get(person_id, (0, 0))
+            totals[person_id] = (total_paid + paid, total_owed + owed)
+    return totals
+
+async def rebuild_mongo(db) -> int:
+    """Replace the ledger with totals recomputed from scratch"""
+    totals = await compute_mongo_balances(db)
+    await db.balances.delete_many({})
+    if totals:
+        await db.balances.insert_many([
+            {"_id": person_id, **_ledger_fields(paid, owed)}
+            for person_id, (paid, owed) in totals.items()
+        ])
+    await bump_mongo_version(db)
+    mark_committed()
+    return len(totals)
+
+async def check_mongo(db) -> dict:
+    """Compare the ledger with totals recomputed from scratch"""
+    expected = await compute_mongo_balances(db)
+    stored = {}
+    async for balance in db.balances.find():
+        stored[balance["_id"]] = (
+            balance.get("paid_cents", 0), balance.get("owed_cents", 0), balance["balance_cents"]
+        )
+    return diff_balances(expected, stored)
+
+async def _main(command: str):
+    from .mongodb import get_db
+    db = get_db()
+    if command == "rebuild":
+        result = {"rebuilt_people": await rebuild_mongo(db)}
+    else:
+        result = await check_mongo(db)
+    print(json.dumps(result, indent=2))
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify the MongoDB balance ledger")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+    result = asyncio.run(_main(args.command))
+    if args.command == "check" and not result["consistent"]:
+        raise SystemExit(1)
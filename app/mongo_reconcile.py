@@ -0,0 +1,97 @@
+from pymongo import UpdateMany
+import argparse
+import asyncio
+import json
+import logging
+from bson import ObjectId
+from .mongo_cache import people_cache, categories_cache
+from .mongo_ledger import bump_mongo_version, mark_committed
+
+# Keeps the person and category names embedded in expense documents in step
+# with the people and categories collections. Every rewrite is an indexed
+# UpdateMany (paid_by, shares.person_id, category_id) that only matches
+# documents whose embedded name is stale, sent in bulk_write batches.
+
+logger = logging.getLogger(__name__)
+
+def _person_updates(person_id: ObjectId, name: str) -> list:
+    return [
+        UpdateMany(
+            {"paid_by": person_id, "paid_by_name": {"$ne": name}},
+            {"$set": {"paid_by_name": name}}
+        ),
+        UpdateMany(
+            {"shares": {"$elemMatch": {"person_id": person_id, "person_name": {"$ne": name}}}},
+            {"$set": {"shares.$[share].person_name": name}},
+            array_filters=[{"share.person_id": person_id, "share.person_name": {"$ne": name}}]
+        )
+    ]
+
+def _category_updates(category_id: ObjectId, name: str) -> list:
+    return [
+        UpdateMany(
+            {"category_id": category_id, "category_name": {"$ne": name}},
+            {"$set": {"category_name": name}}
+        )
+    ]
+
+async def _run(db, operations: list, batch_size: int) -> int:
+    modified = 0
+    for start in range(0, len(operations), batch_size):
+        result = await db.expenses.bulk_write(operations[start:start + batch_size], ordered=False)
+        modified += result.modified_count
+    return modified
+
+async def rename_person(db, person_id: ObjectId, name: str) -> int:
+    """Rename a person and rewrite the name embedded in their expenses"""
+    await db.people.update_one({"_id": person_id}, {"$set": {"name": name}})
+    people_cache.invalidate(entry_id=person_id)
+    # Balances and settlements are reported by name
+    await bump_mongo_version(db)
+    mark_committed()
+    return await _run(db, _person_updates(person_id, name), batch_size=2)
+
+async def rename_category(db, category_id: ObjectId, name: str) -> int:
+    """Rename a category and rewrite the name embedded in its expenses"""
+    await db.categories.update_one({"_id": category_id}, {"$set": {"name": name}})
+    categories_cache.invalidate(entry_id=category_id)
+    return await _run(db, _category_updates(category_id, name), batch_size=1)
+
+async def reconcile(db, batch_size: int = 500) -> dict:
+    """Rewrite every stale or missing embedded name in one sweep
+
+    Also backfills expense documents written before names were embedded.
+    """
+    person_operations = []
+    async for person in db.people.find({}, {"name": 1}):
+        person_operations.extend(_person_updates(person["_id"], person["name"]))
+    category_operations = []
+    async for category in db.categories.find({}, {"name": 1}):
+        category_operations.extend(_category_updates(category["_id"], category["name"]))
+
+    return {
+        "people_updates": await _run(db, person_operations, batch_size),
+        "category_updates": await _run(db, category_operations, batch_size)
+    }
+
+async def reconcile_periodically(db, interval_seconds: float, batch_size: int = 500):
+    """Run reconcile forever, catching renames made outside the API"""
+    while True:
+        try:
+            result = await reconcile(db, batch_size)
+            if result["people_updates"] or result["category_updates"]:
+                logger.info(f"Reconciled embedded names: {result}")
+        except Exception as e:
+            logger.error(f"Error reconciling embedded names: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+async def _main(batch_size: int):
+    from .mongodb import get_db
+    result = await reconcile(get_db(), batch_size)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite names embedded in expense documents")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(_main(args.batch_size))
@@ -0,0 +1,76 @@
+from datetime import datetime, time
+from typing import Dict
+from pymongo import UpdateOne
+import argparse
+import asyncio
+import json
+from .rollup_buckets import expense_rollups
+
+# Spend rollups for the MongoDB backend, stored in the "spend_rollups"
+# collection with one document per (dimension, bucket, bucket_start,
+# entity_id); the unique index in mongo_indexes makes the upserts converge.
+# Expense writes $inc the deltas inside the same transaction as the expense
+# insert or delete, and rebuild_mongo_rollups recomputes the collection from
+# the raw expenses.
+
+def mongo_expense_rollups(expense: dict, sign: int = 1) -> Dict[tuple, list]:
+    """Rollup deltas for an expense document"""
+    return expense_rollups(
+        expense["created_at"],
+        expense.get("category_id"),
+        expense["paid_by"],
+        expense["amount"],
+        [(share["person_id"], share["type"], share["value"]) for share in expense["shares"]],
+        sign
+    )
+
+def rollup_key(dimension: str, bucket: str, start, entity_id) -> dict:
+    # BSON has no date type, so bucket starts are stored as midnight datetimes
+    return {
+        "dimension": dimension,
+        "bucket": bucket,
+        "bucket_start": datetime.combine(start, time()),
+        "entity_id": entity_id
+    }
+
+async def apply_mongo_rollups(db, deltas: Dict[tuple, list], session=None):
+    """$inc the spend_rollups collection, inside ``session``'s transaction if given"""
+    if not deltas:
+        return
+    await db.spend_rollups.bulk_write([
+        UpdateOne(
+            rollup_key(*key),
+            {"$inc": {"amount_cents": cents, "expense_count": count}},
+            upsert=True
+        )
+        for key, (cents, count) in deltas.items()
+    ], ordered=False, session=session)
+
+async def rebuild_mongo_rollups(db, batch_size: int = 1000) -> int:
+    """Replace every rollup document with ones recomputed from scratch"""
+    totals = {}
+    cursor = db.expenses.find(
+        {}, {"created_at": 1, "category_id": 1, "paid_by": 1, "amount": 1, "shares": 1}
+    ).batch_size(batch_size)
+    async for expense in cursor:
+        for key, (cents, count) in mongo_expense_rollups(expense).items():
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += cents
+            entry[1] += count
+    await db.spend_rollups.delete_many({})
+    if totals:
+        await db.spend_rollups.insert_many([
+            {**rollup_key(*key), "amount_cents": cents, "expense_count": count}
+            for key, (cents, count) in totals.items()
+        ])
+    return len(totals)
+
+async def _main():
+    from .mongodb import get_db
+    print(json.dumps({"rollup_documents": await rebuild_mongo_rollups(get_db())}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the MongoDB spend rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    asyncio.run(_main())
@@ -0,0 +1,173 @@
+from datetime import datetime, time
+from typing import Dict, Iterable, Optional
+import argparse
+import asyncio
+import json
+import logging
+from .settlement_engine import to_cents
+from .streaming_sketches import ExpenseSketch, merged_sketch, month_range, month_start, next_month
+
+# Quantile and top-payer sketches for the MongoDB backend. Expense writes
+# only insert into the "sketch_samples" collection inside their transaction:
+# inserts add a (paid_by, amount) sample, deletes a rebuild marker. Inserts
+# never conflict with one another, so concurrent writers to the same
+# category-month neither retry nor overwrite each other's updates.
+#
+# compact_mongo_sketches, run in the background or from the CLI, folds the
+# pending samples into the "expense_sketches" documents (one per month and
+# category_id) and rebuilds marked category-months from their expenses.
+# read_mongo_sketch never writes: it merges the stored sketches with the
+# samples still pending, rebuilding marked category-months in memory.
+
+logger = logging.getLogger(__name__)
+
+def sketch_key(created_at, category_id) -> dict:
+    # BSON has no date type, so months are stored as midnight datetimes
+    return {"month": datetime.combine(month_start(created_at), time()), "category_id": category_id}
+
+async def apply_mongo_sketches(db, expenses: Iterable[dict], session=None):
+    """Insert a sample for each expense document, inside ``session``'s transaction if given"""
+    samples = [
+        {
+            **sketch_key(expense["created_at"], expense.get("category_id")),
+            "paid_by": expense["paid_by"],
+            "amount_cents": to_cents(expense["amount"])
+        }
+        for expense in expenses
+    ]
+    if samples:
+        await db.sketch_samples.insert_many(samples, ordered=False, session=session)
+
+async def mark_mongo_stale(db, keys: Iterable[dict], session=None):
+    """Insert rebuild markers for category-months whose expenses changed"""
+    markers = [{**key, "rebuild": True} for key in keys]
+    if markers:
+        await db.sketch_samples.insert_many(markers, ordered=False, session=session)
+
+async def _rebuilt(db, month: datetime, category_id, session) -> ExpenseSketch:
+    current = ExpenseSketch()
+    cursor = db.expenses.find(
+        {
+            "category_id": category_id,
+            "created_at": {"$gte": month, "$lt": datetime.combine(next_month(month.date()), time())}
+        },
+        {"paid_by": 1, "amount": 1},
+        session=session
+    )
+    async for expense in cursor:
+        current.add(expense["paid_by"], to_cents(expense["amount"]))
+    return current
+
+def _fold(stored: Dict[tuple, Optional[dict]], samples: Iterable[dict]):
+    # Stored sketches plus pending samples per category-month, and the
+    # category-months with a rebuild marker, whose samples are superseded
+    current = {key: ExpenseSketch.from_dict(data) for key, data in stored.items()}
+    rebuild = set()
+    for sample in samples:
+        key = (sample["month"], sample["category_id"])
+        if sample.get("rebuild"):
+            rebuild.add(key)
+        else:
+            current.setdefault(key, ExpenseSketch()).add(sample["paid_by"], sample["amount_cents"])
+    return current, rebuild
+
+async def read_mongo_sketch(db, start=None, end=None, category_id: Optional[object] = None) -> ExpenseSketch:
+    """Merge the category-month sketches covering a date range, pending samples included"""
+    query = {}
+    if category_id is not None:
+        query["category_id"] = category_id
+    start, end = month_range(start, end)
+    bounds = {}
+    if start:
+        bounds["$gte"] = datetime.combine(start, time())
+    if end:
+        bounds["$lte"] = datetime.combine(end, time())
+    if bounds:
+        query["month"] = bounds
+
+    # Read-only transaction: its snapshot keeps a compaction committing in
+    # between from making a sample count twice or not at all
+    async def read(session):
+        stored = {
+            (doc["month"], doc["category_id"]): doc.get("sketch")
+            async for doc in db.expense_sketches.find(query, session=session)
+        }
+        current, rebuild = _fold(stored, [sample async for sample in db.sketch_samples.find(query, session=session)])
+        for month, category_id in rebuild:
+            current[(month, category_id)] = await _rebuilt(db, month, category_id, session)
+        return merged_sketch(current.values())
+
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(read)
+
+async def _compact_one(db, month: datetime, category_id) -> bool:
+    # A concurrent compaction of the same category-month write-conflicts and
+    # is retried; samples inserted meanwhile are outside the snapshot and
+    # stay pending
+    key = {"month": month, "category_id": category_id}
+
+    async def compact(session):
+        stored = await db.expense_sketches.find_one(key, session=session)
+        samples = [sample async for sample in db.sketch_samples.find(key, session=session)]
+        current, rebuild = _fold({(month, category_id): stored and stored.get("sketch")}, samples)
+        if rebuild:
+            current[(month, category_id)] = await _rebuilt(db, month, category_id, session)
+        sketch = current[(month, category_id)]
+        if sketch.amounts.n:
+            await db.expense_sketches.update_one(key, {"$set": {"sketch": sketch.to_dict()}}, upsert=True, session=session)
+        else:
+            await db.expense_sketches.delete_one(key, session=session)
+        await db.sketch_samples.delete_many({"_id": {"$in": [sample["_id"] for sample in samples]}}, session=session)
+        return bool(rebuild)
+
+    async with await db.client.start_session() as session:
+        return await session.with_transaction(compact)
+
+async def compact_mongo_sketches(db) -> dict:
+    """Fold pending samples into their sketches, one transaction per category-month"""
+    keys = await db.sketch_samples.aggregate([
+        {"$group": {"_id": {"month": "$month", "category_id": "$category_id"}}}
+    ]).to_list(length=None)
+    rebuilt = 0
+    for row in keys:
+        rebuilt += await _compact_one(db, row["_id"]["month"], row["_id"]["category_id"])
+    return {"compacted": len(keys), "rebuilt": rebuilt}
+
+async def compact_periodically(db, interval_seconds: float):
+    """Run compact_mongo_sketches forever"""
+    while True:
+        try:
+            result = await compact_mongo_sketches(db)
+            if result["compacted"]:
+                logger.info(f"Compacted MongoDB sketches: {result}")
+        except Exception as e:
+            logger.error(f"Error compacting MongoDB sketches: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+async def rebuild_mongo_sketches(db, batch_size: int = 1000) -> dict:
+    """Recompute every sketch from its expenses
+
+    Marks every category-month that has expenses or a sketch for a rebuild
+    and compacts, so writes may continue meanwhile.
+    """
+    keys = set()
+    async for doc in db.expense_sketches.find({}, {"month": 1, "category_id": 1}):
+        keys.add((doc["month"], doc["category_id"]))
+    cursor = db.expenses.find({}, {"created_at": 1, "category_id": 1}).batch_size(batch_size)
+    async for expense in cursor:
+        key = sketch_key(expense["created_at"], expense.get("category_id"))
+        keys.add((key["month"], key["category_id"]))
+    await mark_mongo_stale(db, [{"month": month, "category_id": category_id} for month, category_id in keys])
+    return await compact_mongo_sketches(db)
+
+async def _main(command: str):
+    from .mongodb import get_db
+    db = get_db()
+    result = await (compact_mongo_sketches(db) if command == "compact" else rebuild_mongo_sketches(db))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact or rebuild the MongoDB quantile and top-payer sketches")
+    parser.add_argument("command", choices=["compact", "rebuild"])
+    args = parser.parse_args()
+    asyncio.run(_main(args.command))
@@ -1,48 +1,57 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
 from typing import Optional
-import os
 from datetime import datetime
 from bson import ObjectId
-from dotenv import load_dotenv
+import logging
+from .config import settings
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# MongoDB Atlas connection URL
-MONGODB_URL = os.getenv("MONGODB_URI")
-if not MONGODB_URL:
-    raise ValueError("MONGODB_URI environment variable is not set")
+# The client is created on first use (normally from the FastAPI lifespan)
+# rather than at import time, so importing the package never touches the
+# network or requires MONGODB_URI to be set.
+_client: Optional[AsyncIOMotorClient] = None
 
-DATABASE_NAME = "expense_splitter"
+def get_client() -> AsyncIOMotorClient:
+    """Return the shared Motor client, creating it on first use"""
+    global _client
+    if _client is None:
+        if not settings.MONGODB_URI:
+            raise ValueError("MONGODB_URI environment variable is not set")
+        # Motor does not open any sockets until the first operation, so
+        # building the client never blocks.
+        _client = AsyncIOMotorClient(
+            settings.MONGODB_URI,
+            tls=settings.MONGODB_TLS,
+            tlsAllowInvalidCertificates=settings.MONGODB_TLS_ALLOW_INVALID_CERTIFICATES,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=settings.MONGODB_SOCKET_TIMEOUT_MS
+        )
+    return _client
 
-# Create MongoDB client with SSL/TLS
-client = MongoClient(
-    MONGODB_URL,
-    tls=True,
-    tlsAllowInvalidCertificates=False,
-    serverSelectionTimeoutMS=5000
-)
+def close_client():
+    """Close the shared client if it was ever created"""
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
-# Test the connection
-try:
-    client.admin.command('ping')
-    print("Successfully connected to MongoDB Atlas!")
-except Exception as e:
-    print(f"Error connecting to MongoDB Atlas: {e}")
-    raise
-
-db = client[DATABASE_NAME]
-
-# Collections
-expenses_collection = db.expenses
-people_collection = db.people
-categories_collection = db.categories
+async def ping() -> bool:
+    """Check that MongoDB answers within the server selection timeout"""
+    try:
+        await get_client().admin.command('ping')
+        return True
+    except Exception as e:
+        logger.warning(f"MongoDB ping failed: {str(e)}")
+        return False
 
 # Helper functions for MongoDB operations
 def get_db():
     """Get database instance"""
-    return db
+    return get_client()[settings.MONGODB_DATABASE]
 
 def convert_id_to_str(data: dict) -> dict:
     """Convert MongoDB ObjectId to string in response"""
@@ -85,4 +94,4 @@ class MongoDBModel:
 #     ],
 #     "created_at": datetime.utcnow()
 # }
-# expenses_collection.insert_one(expense) 
\ No newline at end of file
+# await get_db().expenses.insert_one(expense)
@@ -0,0 +1,31 @@
+from fastapi import HTTPException, status
+from datetime import datetime
+from typing import Any, Callable
+import base64
+import json
+
+# Opaque keyset cursors for expense listings. A cursor encodes the sort key
+# of the last row on a page, (created_at, id), so the next page starts with
+# an index seek instead of skipping over every earlier row.
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    """Build the cursor token pointing just past the given row"""
+    payload = json.dumps({"t": created_at.isoformat(), "id": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, parse_id: Callable[[str], Any] = str) -> tuple:
+    """Return the (created_at, id) pair encoded in a cursor token
+
+    ``parse_id`` converts the id to the store's key type; a ValueError from
+    it means a bad cursor like any other decoding failure.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), parse_id(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+            headers={"X-Error-Code": "400"}
+        )
@@ -0,0 +1,248 @@
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import asyncio
+import calendar
+import json
+import logging
+import os
+import socket
+import uuid
+from . import models, ledger, rollups, sketches, search_index
+from .config import settings
+from .database import AsyncSessionLocal, dialect_insert
+from .settlement_engine import expense_deltas, merge_deltas
+from .rollup_buckets import expense_rollups, merge_rollups
+
+# Turns recurring expenses into real expenses. Each pass takes a lease row
+# in scheduler_leases so only one worker materializes at a time, then walks
+# the due rows (indexed on next_occurrence) in bounded batches. A batch
+# clones every due occurrence's expense and shares with one multi-row
+# INSERT each, applies the merged balance, rollup, sketch and search index
+# updates and advances next_occurrence, all in one transaction. After
+# downtime a row emits every missed occurrence, at most
+# RECURRING_MAX_CATCH_UP per batch, and stays due until it has caught up.
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "recurring_expenses"
+
+def _add_months(moment: datetime, months: int, day: int) -> datetime:
+    # Month arithmetic anchored to ``day`` so Jan 31 -> Feb 28 -> Mar 31
+    index = moment.month - 1 + months
+    year, month = moment.year + index // 12, index % 12 + 1
+    return moment.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+
+def advance(moment: datetime, frequency: str, anchor_day: Optional[int] = None) -> datetime:
+    """Return the occurrence after ``moment`` for a daily/weekly/monthly/yearly schedule"""
+    if frequency == "daily":
+        return moment + timedelta(days=1)
+    if frequency == "weekly":
+        return moment + timedelta(weeks=1)
+    months = {"monthly": 1, "yearly": 12}.get(frequency)
+    if months is None:
+        raise ValueError(f"Unknown frequency {frequency}")
+    return _add_months(moment, months, anchor_day or moment.day)
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def acquire_lease(db: AsyncSession, owner: str, seconds: float, name: str = LEASE_NAME) -> bool:
+    """Take or renew the lease on ``name``; False if another worker holds it"""
+    now = datetime.utcnow()
+    stmt = dialect_insert(db, models.SchedulerLease).values(
+        name=name, owner=owner, expires_at=now + timedelta(seconds=seconds)
+    )
+    # The conditional DO UPDATE only fires for an expired or already-owned
+    # lease; RETURNING is empty when someone else holds it
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+        where=or_(models.SchedulerLease.expires_at < now, models.SchedulerLease.owner == owner)
+    ).returning(models.SchedulerLease.owner)
+    held = (await db.execute(stmt)).scalar_one_or_none() is not None
+    await db.commit()
+    return held
+
+async def materialize_batch(db: AsyncSession, now: datetime, batch_size: int, max_catch_up: int) -> dict:
+    """Materialize up to ``batch_size`` due rows in one transaction"""
+    recurring = models.RecurringExpense
+    rows = (await db.execute(
+        select(
+            recurring.id,
+            recurring.expense_id,
+            recurring.frequency,
+            recurring.start_date,
+            recurring.end_date,
+            recurring.next_occurrence
+        ).where(
+            recurring.next_occurrence <= now,
+            or_(recurring.end_date.is_(None), recurring.next_occurrence <= recurring.end_date)
+        ).order_by(recurring.next_occurrence).limit(batch_size).with_for_update(skip_locked=True)
+    )).all()
+    if not rows:
+        return {"rows": 0, "occurrences": 0}
+
+    template_ids = [row.expense_id for row in rows]
+    templates = {
+        template.id: template
+        for template in (await db.execute(
+            select(
+                models.Expense.id,
+                models.Expense.amount,
+                models.Expense.description,
+                models.Expense.paid_by,
+                models.Expense.category_id
+            ).where(models.Expense.id.in_(template_ids))
+        )).all()
+    }
+    template_shares = {}
+    for share in (await db.execute(
+        select(
+            models.ExpenseShare.expense_id,
+            models.ExpenseShare.person_id,
+            models.ExpenseShare.share_type,
+            models.ExpenseShare.value
+        ).where(models.ExpenseShare.expense_id.in_(template_ids))
+    )).all():
+        template_shares.setdefault(share.expense_id, []).append(share)
+
+    clones = []  # (template id, occurrence)
+    advanced = []
+    orphans = []
+    for row in rows:
+        if row.expense_id not in templates:
+            orphans.append(row.id)
+            continue
+        moment = row.next_occurrence
+        emitted = 0
+        while moment <= now and (row.end_date is None or moment <= row.end_date) and emitted < max_catch_up:
+            clones.append((row.expense_id, moment))
+            moment = advance(moment, row.frequency, row.start_date.day)
+            emitted += 1
+        advanced.append({"id": row.id, "next_occurrence": moment})
+
+    if clones:
+        expense_ids = (await db.scalars(
+            insert(models.Expense).returning(models.Expense.id, sort_by_parameter_order=True),
+            [
+                {
+                    "amount": templates[template_id].amount,
+                    "description": templates[template_id].description,
+                    "paid_by": templates[template_id].paid_by,
+                    "category_id": templates[template_id].category_id,
+                    "created_at": moment,
+                    "is_recurring": False
+                }
+                for template_id, moment in clones
+            ]
+        )).all()
+        share_rows = [
+            {
+                "expense_id": expense_id,
+                "person_id": share.person_id,
+                "share_type": share.share_type,
+                "value": share.value
+            }
+            for expense_id, (template_id, _) in zip(expense_ids, clones)
+            for share in template_shares.get(template_id, [])
+        ]
+        if share_rows:
+            await db.execute(insert(models.ExpenseShare).values(share_rows))
+
+        # Every clone of a template moves balances by the same deltas
+        counts = {}
+        for template_id, _ in clones:
+            counts[template_id] = counts.get(template_id, 0) + 1
+        deltas = {}
+        for template_id, count in counts.items():
+            template = templates[template_id]
+            deltas = merge_deltas(deltas, {
+                person_id: (paid * count, owed * count)
+                for person_id, (paid, owed) in expense_deltas(
+                    template.paid_by,
+                    template.amount,
+                    [(share.person_id, share.share_type, share.value) for share in template_shares.get(template_id, [])]
+                ).items()
+            })
+        await db.run_sync(ledger.apply_sql_deltas, deltas)
+
+        # Clones land in different buckets, so rollups are per occurrence
+        await db.run_sync(rollups.apply_sql_rollups, merge_rollups(*(
+            expense_rollups(
+                moment,
+                templates[template_id].category_id,
+                templates[template_id].paid_by,
+                templates[template_id].amount,
+                [(share.person_id, share.share_type, share.value) for share in template_shares.get(template_id, [])]
+            )
+            for template_id, moment in clones
+        )))
+        await db.run_sync(sketches.apply_sql_sketches, [
+            (moment, templates[template_id].category_id, templates[template_id].paid_by, templates[template_id].amount)
+            for template_id, moment in clones
+        ])
+        await db.run_sync(search_index.index_sql_expenses, [
+            (expense_id, templates[template_id].description)
+            for expense_id, (template_id, _) in zip(expense_ids, clones)
+        ])
+
+    if advanced:
+        await db.execute(update(recurring), advanced)
+    if orphans:
+        # The template expense was deleted; nothing left to repeat
+        await db.execute(delete(recurring).where(recurring.id.in_(orphans)))
+    await db.commit()
+    return {"rows": len(rows), "occurrences": len(clones)}
+
+async def materialize_due(
+    db: AsyncSession,
+    owner: str,
+    batch_size: int = 100,
+    max_catch_up: int = 50,
+    lease_seconds: float = 120.0
+) -> dict:
+    """Run batches until nothing is due, renewing the lease before each one"""
+    now = datetime.utcnow()
+    result = {"batches": 0, "rows": 0, "occurrences": 0}
+    while await acquire_lease(db, owner, lease_seconds):
+        batch = await materialize_batch(db, now, batch_size, max_catch_up)
+        if not batch["rows"]:
+            break
+        result["batches"] += 1
+        result["rows"] += batch["rows"]
+        result["occurrences"] += batch["occurrences"]
+    return result
+
+async def run_scheduler(interval_seconds: float):
+    """Materialize due recurring expenses forever; safe to run in every worker"""
+    owner = worker_id()
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await materialize_due(
+                    db,
+                    owner,
+                    settings.RECURRING_BATCH_SIZE,
+                    settings.RECURRING_MAX_CATCH_UP,
+                    settings.RECURRING_LEASE_SECONDS
+                )
+            if result["occurrences"]:
+                logger.info(f"Materialized recurring expenses: {result}")
+        except Exception as e:
+            logger.error(f"Error materializing recurring expenses: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+async def _main(batch_size: int, max_catch_up: int):
+    async with AsyncSessionLocal() as db:
+        result = await materialize_due(db, worker_id(), batch_size, max_catch_up, settings.RECURRING_LEASE_SECONDS)
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize due recurring expenses once")
+    parser.add_argument("--batch-size", type=int, default=settings.RECURRING_BATCH_SIZE)
+    parser.add_argument("--max-catch-up", type=int, default=settings.RECURRING_MAX_CATCH_UP)
+    args = parser.parse_args()
+    asyncio.run(_main(args.batch_size, args.max_catch_up))
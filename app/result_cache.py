@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+import time
+from .config import settings
+
+# Version-stamped cache for balance and settlement results. Every expense
+# write bumps a monotonically increasing ledger version in the same
+# transaction; a cached result is served only while the version it was
+# computed at is still current, so a poll costs one version lookup when
+# nothing has changed.
+#
+# With RESULT_CACHE_BACKEND="memory" the version is a counter in this
+# process, which is only correct with a single worker. With "database" the
+# version lives next to the ledger (ledger_version table / ledger_meta
+# collection) so every worker sees every other worker's writes.
+
+class VersionCounter:
+    """In-process ledger version used by the "memory" backend"""
+
+    def __init__(self):
+        self.value = 0
+
+    def bump(self):
+        self.value += 1
+
+class ResultCache:
+    """Results keyed by request key, valid only for the version they were computed at"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, value)
+        self.hits = 0
+        self.misses = 0
+        self.recomputes = 0
+        self.recompute_seconds = 0.0
+        self.last_recompute_seconds = 0.0
+
+    def get(self, key: Hashable, version: int):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, version: int, value, seconds: float):
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.recomputes += 1
+        self.recompute_seconds += seconds
+        self.last_recompute_seconds = seconds
+
+    def get_or_compute(self, key: Hashable, version: int, compute: Callable[[], object]):
+        """Return the cached value for ``key`` at ``version``, computing it on a miss"""
+        value = self.get(key, version)
+        if value is None:
+            started = time.perf_counter()
+            value = compute()
+            self.put(key, version, value, time.perf_counter() - started)
+        return value
+
+    async def aget_or_compute(self, key: Hashable, version: int, compute: Callable[[], Awaitable[object]]):
+        """Async variant of get_or_compute"""
+        value = self.get(key, version)
+        if value is None:
+            started = time.perf_counter()
+            value = await compute()
+            self.put(key, version, value, time.perf_counter() - started)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit rate and recompute timings"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "recomputes": self.recomputes,
+            "avg_recompute_ms": round(self.recompute_seconds / self.recomputes * 1000, 3) if self.recomputes else 0.0,
+            "last_recompute_ms": round(self.last_recompute_seconds * 1000, 3)
+        }
+
+def shared_versions() -> bool:
+    """Whether the ledger version is read from the database"""
+    return settings.RESULT_CACHE_BACKEND == "database"
+
+# One cache and local version per backend
+sql_version = VersionCounter()
+sql_results = ResultCache()
+mongo_version = VersionCounter()
+mongo_results = ResultCache()
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from .settlement_engine import share_cents, to_cents
+
+# Backend-agnostic spend rollups. Every expense adds its amount to day, week
+# and month buckets for its category and its payer, and each share's cents
+# to the same buckets for the person who owes it. Writes apply the deltas of
+# the expenses they add or remove, so a report over any date range reads one
+# row per bucket and key instead of scanning the expenses.
+#
+# A rollup key is (dimension, bucket, bucket_start, entity id) and its value
+# is [amount_cents, expense_count].
+
+DIMENSIONS = ("category", "person", "payer")
+BUCKETS = ("day", "week", "month")
+
+def bucket_start(moment, bucket: str) -> date:
+    """First day of the day/week (Monday)/month bucket containing ``moment``"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if bucket == "day":
+        return day
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown bucket {bucket}")
+
+def _add(rollups: dict, key: tuple, cents: int, count: int):
+    entry = rollups.setdefault(key, [0, 0])
+    entry[0] += cents
+    entry[1] += count
+
+def expense_rollups(
+    created_at,
+    category_id,
+    paid_by,
+    amount,
+    shares: Iterable[Tuple[object, str, object]],
+    sign: int = 1
+) -> Dict[tuple, list]:
+    """Return the rollup deltas of adding (or with sign=-1 removing) an expense
+
+    ``shares`` yields (person, share_type, value) triples. Share cents are
+    split exactly like the balance ledger, so per-person spend always adds
+    up to the expense amount.
+    """
+    shares = list(shares)
+    amount_cents = to_cents(amount)
+    split = share_cents(amount_cents, [(share_type, value) for _, share_type, value in shares])
+    owed = {}
+    for (person, _, _), cents in zip(shares, split):
+        owed[person] = owed.get(person, 0) + cents
+
+    rollups = {}
+    for bucket in BUCKETS:
+        start = bucket_start(created_at, bucket)
+        if category_id is not None:
+            _add(rollups, ("category", bucket, start, category_id), sign * amount_cents, sign)
+        _add(rollups, ("payer", bucket, start, paid_by), sign * amount_cents, sign)
+        for person, cents in owed.items():
+            _add(rollups, ("person", bucket, start, person), sign * cents, sign)
+    return rollups
+
+def merge_rollups(*rollups: Dict[tuple, list]) -> Dict[tuple, list]:
+    """Sum several rollup delta maps, dropping keys that cancel out"""
+    merged = {}
+    for deltas in rollups:
+        for key, (cents, count) in deltas.items():
+            _add(merged, key, cents, count)
+    return {key: value for key, value in merged.items() if value[0] or value[1]}
+
+def bucket_range(bucket: str, start: Optional[date], end: Optional[date]) -> Tuple[Optional[date], Optional[date]]:
+    """Widen a date range to whole buckets"""
+    return (
+        bucket_start(start, bucket) if start else None,
+        bucket_start(end, bucket) if end else None
+    )
@@ -0,0 +1,115 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from datetime import date
+from typing import Dict, List, Optional
+import argparse
+import json
+from . import models
+from .database import dialect_insert
+from .rollup_buckets import bucket_range, expense_rollups
+
+# Spend rollups for the SQL backend, stored in the spend_rollups table.
+# Expense writes upsert the deltas of the expenses they add or remove in the
+# same transaction; read_sql_rollups serves reports from the bucket rows and
+# rebuild_sql_rollups recomputes the table from the raw expenses.
+
+ENTITY_MODELS = {"category": models.Category, "person": models.Person, "payer": models.Person}
+
+def sql_expense_rollups(expense: models.Expense, sign: int = 1) -> Dict[tuple, list]:
+    """Rollup deltas for a stored expense, read from its current shares"""
+    return expense_rollups(
+        expense.created_at,
+        expense.category_id,
+        expense.paid_by,
+        expense.amount,
+        [(share.person_id, share.share_type, share.value) for share in expense.shares],
+        sign
+    )
+
+def apply_sql_rollups(db: Session, deltas: Dict[tuple, list]):
+    """Add rollup deltas to spend_rollups within the caller's transaction"""
+    if not deltas:
+        return
+    stmt = dialect_insert(db, models.SpendRollup).values([
+        {
+            "dimension": dimension,
+            "bucket": bucket,
+            "bucket_start": start,
+            "entity_id": entity_id,
+            "amount_cents": cents,
+            "expense_count": count
+        }
+        for (dimension, bucket, start, entity_id), (cents, count) in deltas.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["dimension", "bucket", "bucket_start", "entity_id"],
+        set_={
+            "amount_cents": models.SpendRollup.amount_cents + stmt.excluded.amount_cents,
+            "expense_count": models.SpendRollup.expense_count + stmt.excluded.expense_count
+        }
+    ))
+
+def read_sql_rollups(
+    db: Session,
+    dimension: str,
+    bucket: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> List[dict]:
+    """Return bucket rows with entity names for one dimension and bucket size"""
+    entity = ENTITY_MODELS[dimension]
+    rollup = models.SpendRollup
+    start, end = bucket_range(bucket, start, end)
+    query = select(
+        rollup.bucket_start, entity.name, rollup.amount_cents, rollup.expense_count
+    ).join(entity, entity.id == rollup.entity_id).where(
+        rollup.dimension == dimension,
+        rollup.bucket == bucket,
+        rollup.expense_count != 0
+    )
+    if start:
+        query = query.where(rollup.bucket_start >= start)
+    if end:
+        query = query.where(rollup.bucket_start <= end)
+    rows = db.execute(query.order_by(rollup.bucket_start, entity.name)).all()
+    return [
+        {"period": period, "name": name, "amount_cents": cents, "expenses": count}
+        for period, name, cents, count in rows
+    ]
+
+def rebuild_sql_rollups(db: Session, batch_size: int = 1000) -> int:
+    """Replace every rollup row with ones recomputed from scratch"""
+    totals = {}
+    expenses = db.query(models.Expense).options(selectinload(models.Expense.shares)).yield_per(batch_size)
+    for expense in expenses:
+        for key, (cents, count) in sql_expense_rollups(expense).items():
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += cents
+            entry[1] += count
+    db.query(models.SpendRollup).delete()
+    if totals:
+        db.bulk_insert_mappings(models.SpendRollup, [
+            {
+                "dimension": dimension,
+                "bucket": bucket,
+                "bucket_start": start,
+                "entity_id": entity_id,
+                "amount_cents": cents,
+                "expense_count": count
+            }
+            for (dimension, bucket, start, entity_id), (cents, count) in totals.items()
+        ])
+    db.commit()
+    return len(totals)
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    parser = argparse.ArgumentParser(description="Rebuild the SQL spend rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        result = {"rollup_rows": rebuild_sql_rollups(db)}
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
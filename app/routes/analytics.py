@@ -1,11 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import models, schemas
-from ..database import get_db
-from typing import List, Dict
-from datetime import datetime, timedelta
-from collections import defaultdict
-import calendar
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, rollups, sketches
+from ..database import get_async_db
+from ..settlement_engine import from_cents
+from ..streaming_sketches import quantile_report
+from typing import List, Optional
+from datetime import date
 
 router = APIRouter(
     prefix="/api/v1/analytics",
@@ -17,4 +17,49 @@ router = APIRouter(
 def read_health():
     return {"status": "healthy"}
 
+@router.get("/spend", response_model=List[schemas.SpendBucket])
+async def get_spend(
+    group_by: str = Query("category", pattern="^(category|person|payer)$"),
+    bucket: str = Query("month", pattern="^(day|week|month)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Served from the spend_rollups bucket rows, never from the expenses
+    rows = await db.run_sync(rollups.read_sql_rollups, group_by, bucket, start, end)
+    return [
+        {"period": row["period"], "name": row["name"], "amount": from_cents(row["amount_cents"]), "expenses": row["expenses"]}
+        for row in rows
+    ]
 
+@router.get("/amount-quantiles", response_model=schemas.AmountQuantiles)
+async def get_amount_quantiles(
+    q: List[float] = Query([0.5, 0.9, 0.95, 0.99]),
+    category: Optional[schemas.Category] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if any(not 0 <= fraction <= 1 for fraction in q):
+        raise HTTPException(
+            status_code=400,
+            detail="Quantiles must be between 0 and 1",
+            headers={"X-Error-Code": "400"}
+        )
+    # Merged from the per category-month sketches; see app.streaming_sketches for error bounds
+    sketch = await db.run_sync(sketches.read_sql_sketch, start, end, category.value if category else None)
+    return quantile_report(sketch, q)
+
+@router.get("/top-payers", response_model=List[schemas.TopPayer])
+async def get_top_payers(
+    limit: int = Query(10, ge=1, le=50),
+    category: Optional[schemas.Category] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    sketch = await db.run_sync(sketches.read_sql_sketch, start, end, category.value if category else None)
+    return [
+        {"name": row["name"], "amount": from_cents(row["amount_cents"]), "max_overcount": from_cents(row["error_cents"])}
+        for row in await db.run_sync(sketches.sql_top_payers, sketch, limit)
+    ]
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db
 from typing import List
 
 router = APIRouter(
@@ -11,20 +13,24 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.Category])
-def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(models.Category).all()
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
+    categories = (await db.scalars(select(models.Category))).all()
     return categories
 
 @router.get("/{category_name}", response_model=schemas.Category)
-def get_category(category_name: str, db: Session = Depends(get_db)):
-    category = db.query(models.Category).filter(models.Category.name == category_name).first()
+async def get_category(category_name: str, db: AsyncSession = Depends(get_async_db)):
+    category = (await db.scalars(select(models.Category).where(models.Category.name == category_name))).first()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
 @router.get("/{category_name}/expenses", response_model=List[schemas.Expense])
-def get_expenses_by_category(category_name: str, db: Session = Depends(get_db)):
-    category = db.query(models.Category).filter(models.Category.name == category_name).first()
+async def get_expenses_by_category(category_name: str, db: AsyncSession = Depends(get_async_db)):
+    category = (await db.scalars(
+        select(models.Category)
+        .where(models.Category.name == category_name)
+        .options(selectinload(models.Category.expenses))
+    )).first()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return category.expenses
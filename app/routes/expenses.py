@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from .. import models, schemas
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from .. import models, schemas, ledger, rollups, sketches, search_index
 from ..schemas import ShareType, Category
-from ..database import get_db
-from typing import List
+from ..settlement_engine import expense_deltas, merge_deltas
+from ..rollup_buckets import expense_rollups, merge_rollups
+from ..database import get_async_db, dialect_insert
+from ..pagination import encode_cursor, decode_cursor
+from ..statement_counter import count_statements
+from typing import List, Optional
 from decimal import Decimal
 import logging
 
 router = APIRouter(
     prefix="/expenses",
     tags=["expenses"],
+    dependencies=[Depends(count_statements)],
     responses={
         400: {"model": schemas.ErrorResponse},
         404: {"model": schemas.ErrorResponse},
@@ -21,6 +28,14 @@ router = APIRouter(
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Relationships every expense response reads. They are loaded up front
+# because an AsyncSession cannot lazy load on attribute access.
+EXPENSE_LOAD_OPTIONS = (
+    selectinload(models.Expense.paid_by_person),
+    selectinload(models.Expense.category),
+    selectinload(models.Expense.shares).selectinload(models.ExpenseShare.person)
+)
+
 # Helper function to calculate shares
 def calculate_shares(amount: Decimal, shares: List[schemas.ExpenseShare]) -> List[schemas.ExpenseShare]:
     total_percentage = Decimal('0')
@@ -64,47 +79,120 @@ def calculate_shares(amount: Decimal, shares: List[schemas.ExpenseShare]) -> Lis
     
     return shares
 
-# Helper function to get or create person
-def get_or_create_person(db: Session, name: str) -> models.Person:
-    person = db.query(models.Person).filter(models.Person.name == name).first()
-    if not person:
-        person = models.Person(name=name)
-        db.add(person)
-        db.flush()
-    return person
+# Helper to build an INSERT ... ON CONFLICT (name) that returns existing rows
+# too: the no-op DO UPDATE makes RETURNING report conflicting rows, so one
+# statement both creates missing names and resolves every id
+def _upsert_returning(db: AsyncSession, model, names: List[str]):
+    stmt = dialect_insert(db, model).values([{"name": name} for name in names])
+    return stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"name": stmt.excluded.name}
+    ).returning(model.id, model.name)
+
+# Helper function to get or create people in a single upsert. The unique
+# constraint on name makes concurrent requests converge on a single row
+# instead of racing to insert duplicates.
+async def upsert_people(db: AsyncSession, names) -> dict:
+    rows = (await db.execute(_upsert_returning(db, models.Person, sorted(set(names))))).all()
+    return {row.name: row for row in rows}
+
+# Helper function to get or create a category with the same upsert pattern
+async def upsert_category(db: AsyncSession, name: str):
+    return (await db.execute(_upsert_returning(db, models.Category, [name]))).one()
+
+# Helper function to insert every share of an expense in one multi-row INSERT
+async def insert_shares(db: AsyncSession, expense_id: int, shares: List[schemas.ExpenseShare], people: dict):
+    await db.execute(insert(models.ExpenseShare).values([
+        {
+            "expense_id": expense_id,
+            "person_id": people[share.person].id,
+            "share_type": share.type.value,
+            "value": share.value
+        }
+        for share in shares
+    ]))
+
+# Helper function to read the balance and rollup deltas and the sketch key of
+# a stored expense in one query; returns None if the expense does not exist
+async def stored_expense_deltas(db: AsyncSession, expense_id: int, sign: int = 1) -> Optional[tuple]:
+    rows = (await db.execute(
+        select(
+            models.Expense.paid_by,
+            models.Expense.amount,
+            models.Expense.created_at,
+            models.Expense.category_id,
+            models.ExpenseShare.person_id,
+            models.ExpenseShare.share_type,
+            models.ExpenseShare.value
+        ).outerjoin(models.ExpenseShare, models.ExpenseShare.expense_id == models.Expense.id)
+        .where(models.Expense.id == expense_id)
+    )).all()
+    if not rows:
+        return None
+    expense = rows[0]
+    shares = [(row.person_id, row.share_type, row.value) for row in rows if row.person_id is not None]
+    return (
+        expense_deltas(expense.paid_by, expense.amount, shares, sign),
+        expense_rollups(expense.created_at, expense.category_id, expense.paid_by, expense.amount, shares, sign),
+        sketches.sketch_key(expense.created_at, expense.category_id)
+    )
+
+# Helper function to load an expense with everything a response needs
+async def get_expense_with_relations(db: AsyncSession, expense_id: int) -> Optional[models.Expense]:
+    return (await db.scalars(
+        select(models.Expense)
+        .where(models.Expense.id == expense_id)
+        .options(*EXPENSE_LOAD_OPTIONS)
+        .execution_options(populate_existing=True)
+    )).first()
 
 # Continue with the rest of the file content...
 
+# Helper function to convert a loaded expense to its response dictionary
+def expense_to_dict(expense: models.Expense) -> dict:
+    return {
+        "id": expense.id,
+        "amount": float(expense.amount),  # Convert Decimal to float
+        "description": expense.description,
+        "paid_by": expense.paid_by_person.name,
+        "created_at": expense.created_at.isoformat(),
+        "shares": [{
+            "person": share.person.name if share.person else "Unknown",
+            "type": share.share_type,
+            "value": float(share.value)  # Convert Decimal to float
+        } for share in expense.shares]
+    }
+
 @router.get("/")
-def get_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_expenses(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Keyset pagination on (created_at, id); skip/limit still work without a cursor
+    query = select(models.Expense)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, int)
+        query = query.where(or_(
+            models.Expense.created_at > created_at,
+            and_(models.Expense.created_at == created_at, models.Expense.id > last_id)
+        ))
+        skip = 0
     try:
         # Query with joined relationships
-        expenses = db.query(models.Expense).options(
-            joinedload(models.Expense.paid_by_person),
-            joinedload(models.Expense.shares).joinedload(models.ExpenseShare.person)
-        ).offset(skip).limit(limit).all()
-        
-        # Convert SQLAlchemy objects to dictionaries
-        expense_list = []
-        for expense in expenses:
-            if not expense.paid_by_person:
-                continue  # Skip expenses with missing paid_by person
-                
-            expense_dict = {
-                "id": expense.id,
-                "amount": float(expense.amount),  # Convert Decimal to float
-                "description": expense.description,
-                "paid_by": expense.paid_by_person.name,
-                "created_at": expense.created_at.isoformat(),
-                "shares": [{
-                    "person": share.person.name if share.person else "Unknown",
-                    "type": share.share_type,
-                    "value": float(share.value)  # Convert Decimal to float
-                } for share in expense.shares]
-            }
-            expense_list.append(expense_dict)
+        expenses = (await db.scalars(
+            query.options(*EXPENSE_LOAD_OPTIONS)
+            .order_by(models.Expense.created_at, models.Expense.id).offset(skip).limit(limit)
+        )).all()
+
+        if limit and len(expenses) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(expenses[-1].created_at, expenses[-1].id)
         
-        return expense_list
+        # Convert SQLAlchemy objects to dictionaries, skipping expenses with
+        # a missing paid_by person
+        return [expense_to_dict(expense) for expense in expenses if expense.paid_by_person]
     except Exception as e:
         logger.error(f"Error getting expenses: {str(e)}")
         raise HTTPException(
@@ -113,59 +201,49 @@ def get_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db))
             headers={"X-Error-Code": "500"}
         )
 
+@router.get("/search")
+async def search_expenses(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Ranked matches from the expense_terms index, then one load for the page
+    matches = await db.run_sync(search_index.search_sql, q, skip, limit)
+    if not matches:
+        return []
+    expenses = {
+        expense.id: expense
+        for expense in (await db.scalars(
+            select(models.Expense)
+            .where(models.Expense.id.in_([expense_id for expense_id, _ in matches]))
+            .options(*EXPENSE_LOAD_OPTIONS)
+        )).all()
+    }
+    if len(matches) == limit:
+        response.headers["X-Next-Skip"] = str(skip + limit)
+    return [
+        {**expense_to_dict(expenses[expense_id]), "score": score}
+        for expense_id, score in matches
+        if expense_id in expenses and expenses[expense_id].paid_by_person
+    ]
+
 @router.put("/{expense_id}", response_model=schemas.Expense, operation_id="update_expense_by_id")
-def update_expense(expense_id: int, expense_update: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    # Get the expense
-    db_expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
-    if not db_expense:
+async def update_expense(expense_id: int, expense_update: schemas.ExpenseCreate, db: AsyncSession = Depends(get_async_db)):
+    # Balance deltas that remove the expense as currently stored
+    stored = await stored_expense_deltas(db, expense_id, sign=-1)
+    if stored is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expense not found",
             headers={"X-Error-Code": "404"}
         )
 
-    # Get or create people
-    people = {}
-    person_names = set([expense_update.paid_by] + [share.person for share in expense_update.shares])
-    
-    # First get all existing people
-    existing_people = db.query(models.Person).filter(models.Person.name.in_(person_names)).all()
-    for person in existing_people:
-        people[person.name] = person
-    
-    # Create new people if needed
-    new_people = []
-    for person_name in person_names:
-        if person_name not in people:
-            new_people.append(models.Person(name=person_name))
-    
-    if new_people:
-        db.add_all(new_people)
-        db.flush()  # Get IDs for new people
-        for person in new_people:
-            people[person.name] = person
-
-    # Update expense
-    db_expense.amount = Decimal(str(expense_update.amount))
-    db_expense.description = expense_update.description
-    
-    # Get or create category
-    category = db.query(models.Category).filter(models.Category.name == expense_update.category.value).first()
-    if not category:
-        category = models.Category(name=expense_update.category.value)
-        db.add(category)
-        db.flush()
-    db_expense.category_id = category.id
-    
-    db_expense.paid_by = people[expense_update.paid_by].id
-
-    # Delete existing shares
-    db.query(models.ExpenseShare).filter(models.ExpenseShare.expense_id == expense_id).delete()
+    old_deltas, old_rollups, old_sketch = stored
 
-    # Create new shares
-    total_share_value = 0
+    # Validate shares before writing anything
     for share in expense_update.shares:
-        person = people[share.person]
         share_type = share.type
         share_value = share.value
         
@@ -184,17 +262,7 @@ def update_expense(expense_id: int, expense_update: schemas.ExpenseCreate, db: S
                     detail=f"Exact share value must be positive (got {share_value})",
                     headers={"X-Error-Code": "400"}
                 )
-        
-        total_share_value += share_value
-        db_share = models.ExpenseShare(
-            expense_id=expense_id,
-            person_id=person.id,
-            share_type=share_type,
-            value=share_value
-        )
-        db.add(db_share)
 
-    # Validate shares
     percentage_shares = [share for share in expense_update.shares if share.type == ShareType.PERCENTAGE]
     exact_shares = [share for share in expense_update.shares if share.type == ShareType.EXACT]
     
@@ -216,32 +284,72 @@ def update_expense(expense_id: int, expense_update: schemas.ExpenseCreate, db: S
             headers={"X-Error-Code": "400"}
         )
 
-    db.commit()
-    db.refresh(db_expense)
+    # Get or create people and category
+    people = await upsert_people(db, [expense_update.paid_by] + [share.person for share in expense_update.shares])
+    category = await upsert_category(db, expense_update.category.value)
+
+    # Update expense
+    created_at = (await db.execute(
+        update(models.Expense)
+        .where(models.Expense.id == expense_id)
+        .values(
+            amount=Decimal(str(expense_update.amount)),
+            description=expense_update.description,
+            category_id=category.id,
+            paid_by=people[expense_update.paid_by].id
+        ).returning(models.Expense.created_at)
+    )).scalar_one()
+
+    # Replace the shares
+    await db.execute(delete(models.ExpenseShare).where(models.ExpenseShare.expense_id == expense_id))
+    await insert_shares(db, expense_id, expense_update.shares, people)
+
+    # Move balances from the old version of the expense to the new one
+    new_deltas = expense_deltas(
+        people[expense_update.paid_by].id,
+        expense_update.amount,
+        [(people[share.person].id, share.type.value, share.value) for share in expense_update.shares]
+    )
+    await db.run_sync(ledger.apply_sql_deltas, merge_deltas(old_deltas, new_deltas))
+
+    # Move spend from the old version's rollup buckets to the new one's
+    new_rollups = expense_rollups(
+        created_at,
+        category.id,
+        people[expense_update.paid_by].id,
+        expense_update.amount,
+        [(people[share.person].id, share.type.value, share.value) for share in expense_update.shares]
+    )
+    await db.run_sync(rollups.apply_sql_rollups, merge_rollups(old_rollups, new_rollups))
+
+    # Sketches cannot forget the old version, so mark both for a rebuild
+    await db.run_sync(sketches.mark_sql_stale, [old_sketch, sketches.sketch_key(created_at, category.id)])
+
+    # Reindex the description
+    await db.run_sync(search_index.unindex_sql_expenses, [expense_id])
+    await db.run_sync(search_index.index_sql_expenses, [(expense_id, expense_update.description)])
+
+    await db.commit()
     
-    # Convert ORM objects to Pydantic models for response
+    # Build the response from the request; everything it needs was just written
     response_expense = schemas.Expense(
-        id=db_expense.id,
-        amount=db_expense.amount,
-        description=db_expense.description,
-        category=db_expense.category.name,
-        paid_by=db_expense.paid_by_person.name,
+        id=expense_id,
+        amount=Decimal(str(expense_update.amount)),
+        description=expense_update.description,
+        category=expense_update.category.value,
+        paid_by=expense_update.paid_by,
         shares=[
-            schemas.ExpenseShare(
-                person=share.person.name,
-                type=share.share_type,
-                value=share.value if share.share_type == ShareType.EXACT else Decimal(str(share.value))
-            )
-            for share in db_expense.shares
+            schemas.ExpenseShare(person=share.person, type=share.type, value=share.value)
+            for share in expense_update.shares
         ],
-        created_at=db_expense.created_at
+        created_at=created_at
     )
     return response_expense
 
 @router.delete("/{expense_id}", response_model=schemas.Expense, operation_id="delete_expense_by_id")
-def delete_expense(expense_id: int, db: Session = Depends(get_db)):
+async def delete_expense(expense_id: int, db: AsyncSession = Depends(get_async_db)):
     # Get the expense
-    db_expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
+    db_expense = await get_expense_with_relations(db, expense_id)
     if not db_expense:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -249,103 +357,84 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db)):
             headers={"X-Error-Code": "404"}
         )
 
+    # Reverse the expense's balance deltas
+    await db.run_sync(ledger.apply_sql_deltas, ledger.sql_expense_deltas(db_expense, sign=-1))
+    await db.run_sync(rollups.apply_sql_rollups, rollups.sql_expense_rollups(db_expense, sign=-1))
+    await db.run_sync(sketches.mark_sql_stale, [sketches.sketch_key(db_expense.created_at, db_expense.category_id)])
+    await db.run_sync(search_index.unindex_sql_expenses, [expense_id])
+
     # Delete expense and its shares
-    db.query(models.ExpenseShare).filter(models.ExpenseShare.expense_id == expense_id).delete()
-    db.delete(db_expense)
-    db.commit()
+    await db.execute(delete(models.ExpenseShare).where(models.ExpenseShare.expense_id == expense_id))
+    await db.delete(db_expense)
+    await db.commit()
     
     return db_expense
 
 @router.post("/", response_model=schemas.Expense)
-def create_expense(expense: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    # Get or create people
-    people = {}
-    person_names = set([expense.paid_by] + [share.person for share in expense.shares])
-    
-    # First get all existing people
-    existing_people = db.query(models.Person).filter(models.Person.name.in_(person_names)).all()
-    for person in existing_people:
-        people[person.name] = person
-    
-    # Create new people if needed
-    new_people = []
-    for person_name in person_names:
-        if person_name not in people:
-            new_people.append(models.Person(name=person_name))
-    
-    if new_people:
-        db.add_all(new_people)
-        db.flush()  # Get IDs for new people
-        for person in new_people:
-            people[person.name] = person
-
-    # Get or create category
-    category = db.query(models.Category).filter(models.Category.name == expense.category.value).first()
-    if not category:
-        category = models.Category(name=expense.category.value)
-        db.add(category)
-        db.flush()
-
-    # Create expense
-    db_expense = models.Expense(
-        amount=Decimal(str(expense.amount)),  # Convert float to Decimal
-        description=expense.description,
-        paid_by=people[expense.paid_by].id,
-        category_id=category.id
-    )
-    db.add(db_expense)
-    db.flush()  # Get expense id before creating shares
-
-    # Create shares
+async def create_expense(expense: schemas.ExpenseCreate, db: AsyncSession = Depends(get_async_db)):
+    # Validate total shares before writing anything
     total_share_value = 0
     for share in expense.shares:
-        person = people[share.person]
-        share_type = share.type
-        share_value = share.value
-        
-        if share_type == "percentage":
-            share_value = (share_value / 100) * expense.amount
-        
-        total_share_value += share_value
-        db_share = models.ExpenseShare(
-            expense_id=db_expense.id,
-            person_id=person.id,
-            share_type=share_type,
-            value=share_value
-        )
-        db.add(db_share)
-
-    # Validate total shares
+        if share.type == "percentage":
+            total_share_value += (share.value / 100) * expense.amount
+        else:
+            total_share_value += share.value
     if abs(total_share_value - expense.amount) > 0.01:  # Allow small floating point error
         raise HTTPException(
             status_code=400,
             detail="Total share values do not match expense amount"
         )
 
-    db.commit()
-    db.refresh(db_expense)
+    # Get or create people
+    people = await upsert_people(db, [expense.paid_by] + [share.person for share in expense.shares])
+
+    # Get or create category
+    category = await upsert_category(db, expense.category.value)
+
+    # Create expense, getting its id back for the shares
+    expense_id, created_at = (await db.execute(
+        insert(models.Expense).values(
+            amount=Decimal(str(expense.amount)),  # Convert float to Decimal
+            description=expense.description,
+            paid_by=people[expense.paid_by].id,
+            category_id=category.id
+        ).returning(models.Expense.id, models.Expense.created_at)
+    )).one()
+
+    # Create shares, storing the raw percentage value like update_expense
+    await insert_shares(db, expense_id, expense.shares, people)
+
+    # Apply the expense's balance, rollup, sketch and search index updates in the same transaction
+    shares = [(people[share.person].id, share.type.value, share.value) for share in expense.shares]
+    await db.run_sync(ledger.apply_sql_deltas, expense_deltas(people[expense.paid_by].id, expense.amount, shares))
+    await db.run_sync(rollups.apply_sql_rollups, expense_rollups(
+        created_at, category.id, people[expense.paid_by].id, expense.amount, shares
+    ))
+    await db.run_sync(sketches.apply_sql_sketches, [(created_at, category.id, people[expense.paid_by].id, expense.amount)])
+    await db.run_sync(search_index.index_sql_expenses, [(expense_id, expense.description)])
+
+    await db.commit()
     
-    # Convert SQLAlchemy objects to dictionary for response
+    # Build the response from the request; everything it needs was just written
     response_expense = {
-        "id": db_expense.id,
-        "amount": db_expense.amount,
-        "description": db_expense.description,
-        "category": db_expense.category.name,
-        "paid_by": db_expense.paid_by_person.name,
-        "created_at": db_expense.created_at,
-        "shares": calculate_shares(db_expense.amount, expense.shares)
+        "id": expense_id,
+        "amount": Decimal(str(expense.amount)),
+        "description": expense.description,
+        "category": expense.category.value,
+        "paid_by": expense.paid_by,
+        "created_at": created_at,
+        "shares": calculate_shares(expense.amount, expense.shares)
     }
     
     return response_expense
 
 @router.put("/{expense_id}", response_model=schemas.Expense)
-def update_expense(expense_id: int, expense: schemas.ExpenseCreate, db: Session = Depends(get_db)):
-    db_expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
+async def update_expense(expense_id: int, expense: schemas.ExpenseCreate, db: AsyncSession = Depends(get_async_db)):
+    db_expense = await get_expense_with_relations(db, expense_id)
     if not db_expense:
         raise HTTPException(status_code=404, detail="Expense not found")
 
-    db.commit()
-    db.refresh(db_expense)
+    await db.commit()
     
     # Convert SQLAlchemy objects to dictionary for response
     response_expense = {
@@ -364,11 +453,11 @@ def update_expense(expense_id: int, expense: schemas.ExpenseCreate, db: Session
     return response_expense
 
 @router.delete("/{expense_id}")
-def delete_expense(expense_id: int, db: Session = Depends(get_db)):
-    db_expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
+async def delete_expense(expense_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_expense = await get_expense_with_relations(db, expense_id)
     if not db_expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    db.delete(db_expense)
-    db.commit()
+    await db.delete(db_expense)
+    await db.commit()
     return {"message": "Expense deleted successfully"}
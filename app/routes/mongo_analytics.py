@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from datetime import date
+from .. import schemas, mongo_crud
+from ..mongodb import get_db
+from ..settlement_engine import from_cents
+from ..streaming_sketches import quantile_report
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"],
+    responses={
+        500: {"model": schemas.ErrorResponse}
+    }
+)
+
+@router.get("/spend", response_model=List[schemas.SpendBucket])
+async def get_spend(
+    group_by: str = Query("category", pattern="^(category|person|payer)$"),
+    bucket: str = Query("month", pattern="^(day|week|month)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db=Depends(get_db)
+):
+    # Served from the spend_rollups collection, never from the expenses
+    rows = await mongo_crud.spend_rollups(db, group_by, bucket, start, end)
+    return [
+        {"period": row["period"], "name": row["name"], "amount": from_cents(row["amount_cents"]), "expenses": row["expenses"]}
+        for row in rows
+    ]
+
+@router.get("/amount-quantiles", response_model=schemas.AmountQuantiles)
+async def get_amount_quantiles(
+    q: List[float] = Query([0.5, 0.9, 0.95, 0.99]),
+    category: Optional[schemas.Category] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db=Depends(get_db)
+):
+    if any(not 0 <= fraction <= 1 for fraction in q):
+        raise HTTPException(
+            status_code=400,
+            detail="Quantiles must be between 0 and 1",
+            headers={"X-Error-Code": "400"}
+        )
+    # Merged from the per category-month sketches; see app.streaming_sketches for error bounds
+    sketch = await mongo_crud.expense_sketch(db, start, end, category.value if category else None)
+    return quantile_report(sketch, q)
+
+@router.get("/top-payers", response_model=List[schemas.TopPayer])
+async def get_top_payers(
+    limit: int = Query(10, ge=1, le=50),
+    category: Optional[schemas.Category] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db=Depends(get_db)
+):
+    sketch = await mongo_crud.expense_sketch(db, start, end, category.value if category else None)
+    return [
+        {"name": row["name"], "amount": from_cents(row["amount_cents"]), "max_overcount": from_cents(row["error_cents"])}
+        for row in await mongo_crud.top_payers(db, sketch, limit)
+    ]
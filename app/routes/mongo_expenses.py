@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
 from datetime import datetime
-from decimal import Decimal
-from .. import schemas
-from ..mongodb import get_db, expenses_collection, people_collection, categories_collection, convert_id_to_str, convert_str_to_id
+import csv
+import io
+import json
+from .. import schemas, mongo_crud
+from ..config import settings
+from ..mongodb import get_db, convert_str_to_id
 
 router = APIRouter(
     prefix="/expenses",
@@ -17,133 +21,115 @@ router = APIRouter(
 
 @router.post("", response_model=schemas.Expense)
 async def create_expense(expense: schemas.ExpenseCreate, db=Depends(get_db)):
-    # Validate and get people
-    people = {}
-    person_names = set([expense.paid_by] + [share.person for share in expense.shares])
-    
-    # Get or create people
-    for name in person_names:
-        person = people_collection.find_one({"name": name})
-        if not person:
-            person = {"name": name}
-            result = people_collection.insert_one(person)
-            person["_id"] = result.inserted_id
-        people[name] = person
+    return await mongo_crud.insert_expense(db, expense)
 
-    # Get or create category
-    category = categories_collection.find_one({"name": expense.category.value})
-    if not category:
-        category = {"name": expense.category.value}
-        result = categories_collection.insert_one(category)
-        category["_id"] = result.inserted_id
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Split a streamed request body into lines without buffering the whole body
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
 
-    # Create expense document
-    expense_doc = {
-        "amount": float(expense.amount),
-        "description": expense.description,
-        "paid_by": people[expense.paid_by]["_id"],
-        "category_id": category["_id"],
-        "created_at": datetime.utcnow(),
-        "shares": [
-            {
-                "person_id": people[share.person]["_id"],
-                "type": share.type.value,
-                "value": float(share.value)
-            }
-            for share in expense.shares
-        ]
-    }
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_expenses(
+    request: Request,
+    batch_size: int = Query(settings.BULK_IMPORT_BATCH_SIZE, ge=1, le=10000),
+    db=Depends(get_db)
+):
+    """Import newline-delimited JSON expenses, one ExpenseCreate per line"""
+    return await mongo_crud.import_expenses(db, _iter_lines(request.stream()), batch_size)
 
-    # Insert expense
-    result = expenses_collection.insert_one(expense_doc)
-    expense_doc["_id"] = result.inserted_id
+@router.get("", response_model=List[schemas.Expense])
+async def get_expenses(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db=Depends(get_db)
+):
+    expenses, next_cursor = await mongo_crud.list_expenses(db, skip=skip, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return expenses
 
-    # Prepare response
-    response = {
-        "id": str(expense_doc["_id"]),
-        "amount": expense_doc["amount"],
-        "description": expense_doc["description"],
-        "category": expense.category.value,
-        "paid_by": expense.paid_by,
-        "created_at": expense_doc["created_at"],
-        "shares": [
-            {
-                "person": share.person,
-                "type": share.type.value,
-                "value": float(share.value)
-            }
-            for share in expense.shares
-        ]
-    }
+EXPORT_CSV_COLUMNS = ["id", "created_at", "description", "category", "amount", "paid_by", "shares"]
 
-    return response
+async def _ndjson_rows(expenses: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async for expense in expenses:
+        yield json.dumps(expense, default=lambda value: value.isoformat()) + "\n"
 
-@router.get("", response_model=List[schemas.Expense])
-async def get_expenses(skip: int = 0, limit: int = 100, db=Depends(get_db)):
-    expenses = list(expenses_collection.find().skip(skip).limit(limit))
-    
-    # Convert to response format
-    response = []
-    for expense in expenses:
-        # Get related data
-        paid_by = people_collection.find_one({"_id": expense["paid_by"]})
-        category = categories_collection.find_one({"_id": expense["category_id"]})
-        
-        # Get share details
-        shares = []
-        for share in expense["shares"]:
-            person = people_collection.find_one({"_id": share["person_id"]})
-            shares.append({
-                "person": person["name"],
-                "type": share["type"],
-                "value": share["value"]
-            })
-        
-        response.append({
-            "id": str(expense["_id"]),
-            "amount": expense["amount"],
-            "description": expense["description"],
-            "category": category["name"],
-            "paid_by": paid_by["name"],
-            "created_at": expense["created_at"],
-            "shares": shares
-        })
-    
-    return response
+async def _csv_rows(expenses: AsyncIterator[dict]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    async for expense in expenses:
+        writer.writerow([
+            expense["id"],
+            expense["created_at"].isoformat(),
+            expense["description"],
+            expense["category"],
+            expense["amount"],
+            expense["paid_by"],
+            ";".join(f"{share['person']}:{share['type']}:{share['value']}" for share in expense["shares"])
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+@router.get("/export")
+async def export_expenses(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category: Optional[schemas.Category] = None,
+    db=Depends(get_db)
+):
+    """Stream the full expense history as NDJSON or CSV"""
+    expenses = mongo_crud.stream_expenses(
+        db,
+        start=start,
+        end=end,
+        category=category.value if category else None,
+        batch_size=settings.EXPORT_BATCH_SIZE
+    )
+    if format == "csv":
+        return StreamingResponse(
+            _csv_rows(expenses),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=expenses.csv"}
+        )
+    return StreamingResponse(
+        _ndjson_rows(expenses),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=expenses.ndjson"}
+    )
+
+@router.get("/search", response_model=List[schemas.ExpenseSearchResult])
+async def search_expenses(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db=Depends(get_db)
+):
+    expenses = await mongo_crud.search_expenses(db, q, skip=skip, limit=limit)
+    if len(expenses) == limit:
+        response.headers["X-Next-Skip"] = str(skip + limit)
+    return expenses
 
 @router.get("/{expense_id}", response_model=schemas.Expense)
 async def get_expense(expense_id: str, db=Depends(get_db)):
-    expense = expenses_collection.find_one({"_id": convert_str_to_id(expense_id)})
+    expense = await mongo_crud.get_expense(db, convert_str_to_id(expense_id))
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
-    
-    # Get related data
-    paid_by = people_collection.find_one({"_id": expense["paid_by"]})
-    category = categories_collection.find_one({"_id": expense["category_id"]})
-    
-    # Get share details
-    shares = []
-    for share in expense["shares"]:
-        person = people_collection.find_one({"_id": share["person_id"]})
-        shares.append({
-            "person": person["name"],
-            "type": share["type"],
-            "value": share["value"]
-        })
-    
-    return {
-        "id": str(expense["_id"]),
-        "amount": expense["amount"],
-        "description": expense["description"],
-        "category": category["name"],
-        "paid_by": paid_by["name"],
-        "created_at": expense["created_at"],
-        "shares": shares
-    }
+    return expense
 
 @router.delete("/{expense_id}")
 async def delete_expense(expense_id: str, db=Depends(get_db)):
-    result = expenses_collection.delete_one({"_id": convert_str_to_id(expense_id)})
-    if result.deleted_count == 0:
+    if not await mongo_crud.delete_expense(db, convert_str_to_id(expense_id)):
         raise HTTPException(status_code=404, detail="Expense not found")
-    return {"message": "Expense deleted successfully"} 
\ No newline at end of file
+    return {"message": "Expense deleted successfully"}
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List
+from .. import schemas, mongo_crud, settlement_engine, cents_ledger
+from ..mongodb import get_db
+from ..mongo_ledger import current_mongo_version
+from ..config import settings
+from ..result_cache import mongo_results
+
+router = APIRouter(
+    tags=["settlements"],
+    responses={
+        500: {"model": schemas.ErrorResponse}
+    }
+)
+
+async def _load_totals(db) -> List[dict]:
+    # Per-person paid and owed cents from the configured balance engine
+    if settings.BALANCE_ENGINE == "vectorized":
+        ledger = await cents_ledger.load_mongo(db)
+        return [{"name": name, **totals} for name, totals in ledger.totals().items()]
+    return await mongo_crud.aggregate_balances(db)
+
+@router.get("/balances", response_model=List[schemas.Balance])
+async def get_balances(db=Depends(get_db)):
+    async def compute():
+        rows = await _load_totals(db)
+        return [
+            {
+                "person": row["name"],
+                "balance": settlement_engine.from_cents(row["owed_cents"] - row["paid_cents"]),
+                "paid": settlement_engine.from_cents(row["paid_cents"]),
+                "owed": settlement_engine.from_cents(row["owed_cents"])
+            }
+            for row in rows
+        ]
+
+    return await mongo_results.aget_or_compute(("balances",), await current_mongo_version(db), compute)
+
+@router.get("/settlements", response_model=List[schemas.Settlement])
+async def get_settlements(
+    response: Response,
+    mode: str = Query("greedy", pattern="^(greedy|optimal)$"),
+    db=Depends(get_db)
+):
+    async def compute():
+        rows = await _load_totals(db)
+        balances = {row["name"]: row["owed_cents"] - row["paid_cents"] for row in rows}
+        # The optimal solver is CPU-bound; keep it off the event loop
+        result = await run_in_threadpool(
+            settlement_engine.solve,
+            balances,
+            mode,
+            settings.SETTLEMENT_MAX_OPTIMAL_PEOPLE
+        )
+        settlements = [
+            {
+                "payer": payer,
+                "receiver": receiver,
+                "amount": settlement_engine.from_cents(cents)
+            }
+            for payer, receiver, cents in result["transfers"]
+        ]
+        return settlements, settlement_engine.report_headers(result)
+
+    # Served from cache until the next expense write bumps the ledger version
+    settlements, headers = await mongo_results.aget_or_compute(
+        ("settlements", mode), await current_mongo_version(db), compute
+    )
+    response.headers.update(headers)
+    return settlements
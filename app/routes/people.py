@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db
 from typing import List
 
 router = APIRouter(
@@ -11,21 +12,21 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.Person)
-def create_person(person: schemas.PersonCreate, db: Session = Depends(get_db)):
+async def create_person(person: schemas.PersonCreate, db: AsyncSession = Depends(get_async_db)):
     db_person = models.Person(name=person.name)
     db.add(db_person)
-    db.commit()
-    db.refresh(db_person)
+    await db.commit()
+    await db.refresh(db_person)
     return db_person
 
 @router.get("/", response_model=List[schemas.Person])
-def get_people(db: Session = Depends(get_db)):
-    people = db.query(models.Person).all()
+async def get_people(db: AsyncSession = Depends(get_async_db)):
+    people = (await db.scalars(select(models.Person))).all()
     return people
 
 @router.get("/{person_name}", response_model=schemas.Person)
-def get_person(person_name: str, db: Session = Depends(get_db)):
-    person = db.query(models.Person).filter(models.Person.name == person_name).first()
+async def get_person(person_name: str, db: AsyncSession = Depends(get_async_db)):
+    person = (await db.scalars(select(models.Person).where(models.Person.name == person_name))).first()
     if not person:
         raise HTTPException(status_code=404, detail="Person not found")
     return person
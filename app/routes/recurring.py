@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import models
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, ledger, rollups, sketches, search_index
+from ..settlement_engine import expense_deltas
+from ..rollup_buckets import expense_rollups
 from ..schemas import RecurringExpense, ExpenseShare
-from ..database import get_db
+from ..database import get_async_db
+from ..recurring_scheduler import advance
+from .expenses import upsert_category
 from typing import List
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -14,32 +19,27 @@ router = APIRouter(
 )
 
 @router.get("/")
-def get_recurring_expenses(db: Session = Depends(get_db)):
-    recurring_expenses = db.query(models.RecurringExpense).all()
+async def get_recurring_expenses(db: AsyncSession = Depends(get_async_db)):
+    recurring_expenses = (await db.scalars(select(models.RecurringExpense))).all()
     return [RecurringExpense.from_orm(expense) for expense in recurring_expenses]
 
 @router.get("/due")
-def get_due_recurring_expenses(db: Session = Depends(get_db)):
+async def get_due_recurring_expenses(db: AsyncSession = Depends(get_async_db)):
     current_time = datetime.utcnow()
-    recurring_expenses = db.query(models.RecurringExpense).filter(
+    recurring_expenses = (await db.scalars(select(models.RecurringExpense).where(
         models.RecurringExpense.next_occurrence <= current_time
-    ).all()
+    ))).all()
     return [RecurringExpense.from_orm(expense) for expense in recurring_expenses]
 
 @router.post("/")
-def create_recurring_expense(
+async def create_recurring_expense(
     recurring: RecurringExpense,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Get or create category
-    category = db.query(models.Category).filter(models.Category.name == "Recurring").first()
-    if not category:
-        category = models.Category(name="Recurring")
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+    category = await upsert_category(db, "Recurring")
 
-    # Create the base expense
+    # Create the base expense, flushing for its id and created_at
     db_expense = models.Expense(
         amount=recurring.amount,
         description=recurring.description,
@@ -48,8 +48,7 @@ def create_recurring_expense(
         is_recurring=True
     )
     db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
+    await db.flush()
 
     # Create shares
     for share in recurring.shares:
@@ -60,7 +59,6 @@ def create_recurring_expense(
             value=share.value
         )
         db.add(db_share)
-    db.commit()
 
     # Create the recurring expense record
     recurring_record = models.RecurringExpense(
@@ -68,11 +66,25 @@ def create_recurring_expense(
         frequency=recurring.frequency,
         start_date=recurring.start_date,
         end_date=recurring.end_date,
-        next_occurrence=recurring.start_date
+        # The base expense above is the first occurrence
+        next_occurrence=advance(recurring.start_date, recurring.frequency.value)
     )
     db.add(recurring_record)
-    db.commit()
-    db.refresh(recurring_record)
+
+    # Apply the expense's balance, rollup, sketch and search index updates and
+    # commit everything in one transaction, like create_expense, so a failure
+    # cannot leave a template without shares or a ledger without its deltas
+    shares = [(share.person, share.type, share.value) for share in recurring.shares]
+    await db.run_sync(ledger.apply_sql_deltas, expense_deltas(db_expense.paid_by, db_expense.amount, shares))
+    await db.run_sync(rollups.apply_sql_rollups, expense_rollups(
+        db_expense.created_at, db_expense.category_id, db_expense.paid_by, db_expense.amount, shares
+    ))
+    await db.run_sync(sketches.apply_sql_sketches, [
+        (db_expense.created_at, db_expense.category_id, db_expense.paid_by, db_expense.amount)
+    ])
+    await db.run_sync(search_index.index_sql_expenses, [(db_expense.id, db_expense.description)])
+    await db.commit()
+    await db.refresh(recurring_record)
 
     # Convert SQLAlchemy model to Pydantic model
     return RecurringExpense.from_orm(recurring_record)
@@ -1,81 +1,73 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from .. import models, schemas
-from ..database import get_db
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, settlement_engine, ledger, cents_ledger
+from ..database import get_async_db
+from ..config import settings
+from ..result_cache import sql_results
+from ..statement_counter import count_statements
 from typing import List
-import itertools
 
 router = APIRouter(
     prefix="/settlements",
     tags=["settlements"],
+    dependencies=[Depends(count_statements)],
     responses={404: {"description": "Not found"}},
 )
 
 @router.get("/", response_model=List[schemas.Settlement])
-def get_settlements(db: Session = Depends(get_db)):
-    # Get all people and their total expenses
-    people = db.query(models.Person).all()
-    balances = {person.name: 0.0 for person in people}
-
-    # Calculate balances
-    expenses = db.query(models.Expense).all()
-    for expense in expenses:
-        # Add expense amount to paid_by person's balance
-        balances[expense.paid_by_person.name] -= expense.amount
-        
-        # Add shares to each person's balance
-        for share in expense.shares:
-            balances[share.person.name] += share.share_value
-
-    # Create simplified settlements
-    settlements = []
-    # Sort people by balance (most negative first)
-    sorted_people = sorted(balances.items(), key=lambda x: x[1])
-    
-    # Create settlements using a greedy algorithm
-    while sorted_people:
-        debtor = sorted_people[0]
-        creditor = sorted_people[-1]
-        
-        if debtor[1] >= 0:  # No more debtors
-            break
-        
-        amount = min(abs(debtor[1]), creditor[1])
-        settlements.append({
-            "payer": debtor[0],
-            "receiver": creditor[0],
-            "amount": amount
-        })
-        
-        # Update balances
-        balances[debtor[0]] += amount
-        balances[creditor[0]] -= amount
-        
-        # Update sorted list
-        sorted_people = sorted(balances.items(), key=lambda x: x[1])
+async def get_settlements(
+    response: Response,
+    mode: str = Query("greedy", pattern="^(greedy|optimal)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    async def compute():
+        if settings.BALANCE_ENGINE == "vectorized":
+            balances = (await db.run_sync(cents_ledger.load_sql)).balance_map()
+        else:
+            balances = await db.run_sync(ledger.read_sql_balances)
+        # The optimal solver is CPU-bound; keep it off the event loop
+        result = await run_in_threadpool(
+            settlement_engine.solve,
+            balances,
+            mode,
+            settings.SETTLEMENT_MAX_OPTIMAL_PEOPLE
+        )
+        settlements = [
+            {
+                "payer": payer,
+                "receiver": receiver,
+                "amount": settlement_engine.from_cents(cents)
+            }
+            for payer, receiver, cents in result["transfers"]
+        ]
+        return settlements, settlement_engine.report_headers(result)
 
+    # Served from cache until the next expense write bumps the ledger version
+    settlements, headers = await sql_results.aget_or_compute(
+        ("settlements", mode), await db.run_sync(ledger.current_sql_version), compute
+    )
+    response.headers.update(headers)
     return settlements
 
 @router.get("/balances", response_model=List[schemas.Balance])
-def get_balances(db: Session = Depends(get_db)):
-    people = db.query(models.Person).all()
-    balances = []
-    
-    for person in people:
-        # Calculate total expenses paid by this person
-        expenses_paid = sum(
-            expense.amount for expense in person.expenses_paid
-        )
-        
-        # Calculate total shares received by this person
-        shares_received = sum(
-            share.share_value for share in person.expenses_shared
-        )
-        
-        balance = shares_received - expenses_paid
-        balances.append({
-            "person": person.name,
-            "balance": round(balance, 2)
-        })
+async def get_balances(db: AsyncSession = Depends(get_async_db)):
+    async def compute():
+        if settings.BALANCE_ENGINE == "vectorized":
+            totals = (await db.run_sync(cents_ledger.load_sql)).totals()
+        else:
+            # One query reads the ledger balances and paid totals per person
+            totals = await db.run_sync(ledger.aggregate_sql_balances)
+        return [
+            {
+                "person": name,
+                "balance": settlement_engine.from_cents(row["owed_cents"] - row["paid_cents"]),
+                "paid": settlement_engine.from_cents(row["paid_cents"]),
+                "owed": settlement_engine.from_cents(row["owed_cents"])
+            }
+            for name, row in totals.items()
+        ]
 
-    return balances
+    return await sql_results.aget_or_compute(
+        ("balances",), await db.run_sync(ledger.current_sql_version), compute
+    )
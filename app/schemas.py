@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 from decimal import Decimal, InvalidOperation
 
@@ -86,6 +86,9 @@ class Expense(ExpenseCreate):
     class Config:
         from_attributes = True
 
+class ExpenseSearchResult(Expense):
+    score: float
+
 class Settlement(BaseModel):
     payer: str
     receiver: str
@@ -94,10 +97,45 @@ class Settlement(BaseModel):
 class Balance(BaseModel):
     person: str
     balance: Decimal
+    paid: Optional[Decimal] = None
+    owed: Optional[Decimal] = None
 
     class Config:
         from_attributes = True
 
+class SpendBucket(BaseModel):
+    period: date
+    name: str
+    amount: Decimal
+    expenses: int
+
+class AmountQuantile(BaseModel):
+    q: float
+    amount: Optional[Decimal] = None
+
+class AmountQuantiles(BaseModel):
+    count: int
+    min: Optional[Decimal] = None
+    max: Optional[Decimal] = None
+    quantiles: List[AmountQuantile]
+
+class TopPayer(BaseModel):
+    name: str
+    amount: Decimal
+    max_overcount: Decimal
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+    elapsed_seconds: float
+    expenses_per_second: float
+
 class ErrorResponse(BaseModel):
     detail: str
     error_code: str = Field(..., min_length=3, max_length=3)
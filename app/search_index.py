@@ -0,0 +1,111 @@
+from sqlalchemy import case, delete, func, select, union_all
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Tuple
+import argparse
+import json
+import re
+import unicodedata
+from . import models
+from .database import dialect_insert
+
+# Full-text search over expense descriptions for the SQL backend: an
+# inverted index in the expense_terms table, one row per distinct term of
+# each expense, kept current in the same transaction as every expense
+# create, update and delete. Its (term, expense_id) primary key serves
+# prefix matches as index range scans on both SQLite and PostgreSQL.
+#
+# Terms are runs of ASCII letters and digits after accent folding and
+# lowercasing, so "Café" is found by "cafe". Query terms of at least
+# MIN_PREFIX_LENGTH characters match as prefixes ("piz" finds "pizza"),
+# shorter ones only as whole words, since a one- or two-letter prefix would
+# read a large share of the index. An expense ranks by the number of query
+# terms it matches, whole-word matches counting double, then newest first.
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+MIN_PREFIX_LENGTH = 3
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Distinct search terms of a text, in order of first appearance"""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return list(dict.fromkeys(term[:MAX_TERM_LENGTH] for term in re.findall(r"[a-z0-9]+", folded)))
+
+def _prefix_range(prefix: str) -> Tuple[str, str]:
+    # Every term starting with ``prefix`` sorts between it and the prefix
+    # padded with "z" to the longest term; a plain string range like this
+    # holds in linguistic collations too since terms are alphanumerics
+    return prefix, prefix + "z" * (MAX_TERM_LENGTH - len(prefix))
+
+def index_sql_expenses(db: Session, expenses: Iterable[Tuple[int, Optional[str]]]):
+    """Add the terms of (expense id, description) pairs within the caller's transaction"""
+    rows = [
+        {"term": term, "expense_id": expense_id}
+        for expense_id, description in expenses
+        for term in tokenize(description)
+    ]
+    if rows:
+        # executemany form: one statement for a single expense, batched under
+        # the driver's parameter limit for bulk reindexing
+        db.execute(dialect_insert(db, models.ExpenseTerm).on_conflict_do_nothing(), rows)
+
+def unindex_sql_expenses(db: Session, expense_ids: Iterable[int]):
+    """Drop the terms of expenses within the caller's transaction"""
+    expense_ids = list(expense_ids)
+    if expense_ids:
+        db.execute(delete(models.ExpenseTerm).where(models.ExpenseTerm.expense_id.in_(expense_ids)))
+
+def search_sql(db: Session, query: str, skip: int = 0, limit: int = 20) -> List[Tuple[int, int]]:
+    """Return a page of (expense id, score) matches, best first"""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    term = models.ExpenseTerm
+    matches = []
+    for prefix in terms:
+        matches.append(
+            select(
+                term.expense_id,
+                func.max(case((term.term == prefix, 2), else_=1)).label("weight")
+            ).where(
+                term.term.between(*_prefix_range(prefix)) if len(prefix) >= MIN_PREFIX_LENGTH else term.term == prefix
+            ).group_by(term.expense_id)
+        )
+    matched = union_all(*matches).subquery() if len(matches) > 1 else matches[0].subquery()
+    score = func.sum(matched.c.weight).label("score")
+    rows = db.execute(
+        select(matched.c.expense_id, score)
+        .group_by(matched.c.expense_id)
+        .order_by(score.desc(), matched.c.expense_id.desc())
+        .offset(skip).limit(limit)
+    ).all()
+    return [(expense_id, score) for expense_id, score in rows]
+
+def rebuild_sql_index(db: Session, batch_size: int = 1000) -> int:
+    """Replace every term row with ones recomputed from the descriptions"""
+    db.query(models.ExpenseTerm).delete()
+    indexed = 0
+    batch = []
+    for row in db.execute(select(models.Expense.id, models.Expense.description).execution_options(yield_per=batch_size)):
+        batch.append(tuple(row))
+        if len(batch) >= batch_size:
+            index_sql_expenses(db, batch)
+            indexed += len(batch)
+            batch = []
+    index_sql_expenses(db, batch)
+    indexed += len(batch)
+    db.commit()
+    return indexed
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    parser = argparse.ArgumentParser(description="Rebuild the SQL expense search index")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        result = {"indexed_expenses": rebuild_sql_index(db)}
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,237 @@
+from decimal import Decimal, ROUND_HALF_UP, ROUND_FLOOR
+from typing import Dict, Iterable, List, Tuple
+import heapq
+import time
+
+# Backend-agnostic balance and settlement math. All amounts are handled as
+# integer cents so balances sum to exactly zero and no float residue can
+# produce extra transfers. A positive balance means the person owes money,
+# a negative balance means they are owed money.
+
+CENT = Decimal("0.01")
+
+def to_cents(amount) -> int:
+    """Convert a money amount (Decimal, float, int or str) to integer cents"""
+    return int((Decimal(str(amount)) / CENT).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def from_cents(cents: int) -> Decimal:
+    """Convert integer cents back to a two-place Decimal"""
+    return (Decimal(cents) * CENT).quantize(CENT)
+
+def share_cents(amount_cents: int, shares: List[Tuple[str, object]]) -> List[int]:
+    """Split an expense into per-share cents
+
+    ``shares`` is a list of (share_type, value) pairs. Exact shares take
+    their value; percentage shares split what remains after the exact
+    shares. Percentage cents are floored and the leftover cents go to the
+    largest remainders, so the shares always add up to the expense amount.
+    """
+    result = [0] * len(shares)
+    exact_total = 0
+    percentages = []
+    for index, (share_type, value) in enumerate(shares):
+        if share_type == "exact":
+            result[index] = to_cents(value)
+            exact_total += result[index]
+        else:
+            percentages.append((index, Decimal(str(value))))
+
+    remaining = amount_cents - exact_total
+    if not percentages:
+        return result
+
+    remainders = []
+    allocated = 0
+    total_percentage = sum(value for _, value in percentages)
+    for index, value in percentages:
+        raw = Decimal(remaining) * value / Decimal(100)
+        cents = int(raw.to_integral_value(rounding=ROUND_FLOOR))
+        result[index] = cents
+        allocated += cents
+        remainders.append((raw - cents, index))
+
+    if total_percentage == 100:
+        leftover = remaining - allocated
+        for _, index in sorted(remainders, reverse=True)[:max(leftover, 0)]:
+            result[index] += 1
+    return result
+
+def apply_expense(balances: Dict[str, int], paid_by: str, amount, shares: Iterable[Tuple[str, str, object]]):
+    """Add one expense to a name -> cents balance map
+
+    ``shares`` yields (person, share_type, value) triples.
+    """
+    shares = list(shares)
+    amount_cents = to_cents(amount)
+    balances[paid_by] = balances.get(paid_by, 0) - amount_cents
+    for (person, _, _), cents in zip(shares, share_cents(amount_cents, [(t, v) for _, t, v in shares])):
+        balances[person] = balances.get(person, 0) + cents
+
+def expense_deltas(paid_by, amount, shares: Iterable[Tuple[object, str, object]], sign: int = 1) -> Dict[object, Tuple[int, int]]:
+    """Return the per-person (paid, owed) cents deltas of adding (or with sign=-1 removing) an expense
+
+    A person's balance moves by owed - paid.
+    """
+    shares = list(shares)
+    amount_cents = to_cents(amount)
+    deltas = {paid_by: (sign * amount_cents, 0)}
+    for (person, _, _), cents in zip(shares, share_cents(amount_cents, [(t, v) for _, t, v in shares])):
+        paid, owed = deltas.get(person, (0, 0))
+        deltas[person] = (paid, owed + sign * cents)
+    return deltas
+
+def merge_deltas(*deltas: Dict[object, Tuple[int, int]]) -> Dict[object, Tuple[int, int]]:
+    """Sum several delta maps, dropping people whose net delta is zero"""
+    merged = {}
+    for delta in deltas:
+        for key, (paid, owed) in delta.items():
+            total_paid, total_owed = merged.get(key, (0, 0))
+            merged[key] = (total_paid + paid, total_owed + owed)
+    return {key: totals for key, totals in merged.items() if totals != (0, 0)}
+
+def diff_balances(expected: Dict[object, Tuple[int, int]], stored: Dict[object, Tuple[int, int, int]]) -> dict:
+    """Report people whose stored (paid, owed, balance) cents differ from the expected (paid, owed) ones"""
+    def row(totals):
+        return {"paid_cents": totals[0], "owed_cents": totals[1], "balance_cents": totals[1] - totals[0]}
+
+    mismatches = []
+    for key in set(expected) | set(stored):
+        want = row(expected.get(key, (0, 0)))
+        paid, owed, balance = stored.get(key, (0, 0, 0))
+        have = {"paid_cents": paid, "owed_cents": owed, "balance_cents": balance}
+        if want != have:
+            mismatches.append({"person_id": str(key), "expected": want, "stored": have})
+    return {"people": len(expected), "consistent": not mismatches, "mismatches": mismatches}
+
+def settle(balances: Dict[str, int]) -> List[Tuple[str, str, int]]:
+    """Return (payer, receiver, cents) transfers that clear every balance
+
+    Greedy largest-debtor to largest-creditor matching using two heaps, so
+    the whole run is O(n log n) in the number of people. Each transfer
+    clears at least one side, so there are at most n - 1 transfers.
+    """
+    debtors = [(-cents, name) for name, cents in balances.items() if cents > 0]
+    creditors = [(cents, name) for name, cents in balances.items() if cents < 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+
+    transfers = []
+    while debtors and creditors:
+        owed, debtor = heapq.heappop(debtors)
+        due, creditor = heapq.heappop(creditors)
+        amount = min(-owed, -due)
+        transfers.append((debtor, creditor, amount))
+        if -owed > amount:
+            heapq.heappush(debtors, (owed + amount, debtor))
+        if -due > amount:
+            heapq.heappush(creditors, (due + amount, creditor))
+    return transfers
+
+def _zero_sum_order(values: List[int]) -> List[int]:
+    # Bitmask DP over subsets: best[mask] is the largest number of disjoint
+    # zero-sum groups the people in ``mask`` can be split into. Returns an
+    # ordering of the people whose zero prefix sums mark those groups.
+    # 2 ** n states, so callers bound n.
+    n = len(values)
+    size = 1 << n
+    totals = [0] * size
+    best = [0] * size
+    for mask in range(1, size):
+        low = mask & -mask
+        totals[mask] = totals[mask ^ low] + values[low.bit_length() - 1]
+        bit = mask
+        top = 0
+        while bit:
+            low = bit & -bit
+            candidate = best[mask ^ low]
+            if candidate > top:
+                top = candidate
+            bit ^= low
+        best[mask] = top + (1 if totals[mask] == 0 else 0)
+
+    order = []
+    mask = size - 1
+    while mask:
+        target = best[mask] - (1 if totals[mask] == 0 else 0)
+        bit = mask
+        while bit:
+            low = bit & -bit
+            if best[mask ^ low] == target:
+                order.append(low.bit_length() - 1)
+                mask ^= low
+                break
+            bit ^= low
+    order.reverse()
+    return order
+
+def settle_optimal(balances: Dict[str, int], max_people: int = 16) -> Tuple[List[Tuple[str, str, int]], str]:
+    """Return (transfers, mode) using the fewest possible transfers
+
+    The minimum number of transfers is the number of non-zero balances minus
+    the largest number of disjoint zero-sum groups they can be split into;
+    each group then settles internally with the heap greedy in size - 1
+    transfers. Exactly opposite balances are always paired first, which
+    never loses optimality. The remaining subset search is exponential
+    (2 ** n states, roughly doubling in time per person), so if more than
+    ``max_people`` remain the heap greedy result is returned with mode
+    "greedy". That bound alone decides which solver runs, so the same
+    balances always get the same answer.
+    """
+    transfers = []
+
+    # Pair exact opposites: {x, -x} is always a group in some optimal split
+    debtors_by_amount = {}
+    for name, cents in balances.items():
+        if cents > 0:
+            debtors_by_amount.setdefault(cents, []).append(name)
+    remaining = {}
+    for name, cents in balances.items():
+        if cents < 0 and debtors_by_amount.get(-cents):
+            transfers.append((debtors_by_amount[-cents].pop(), name, -cents))
+    for cents, names in debtors_by_amount.items():
+        for name in names:
+            remaining[name] = cents
+    paired = {payer for payer, _, _ in transfers} | {receiver for _, receiver, _ in transfers}
+    for name, cents in balances.items():
+        if cents < 0 and name not in paired:
+            remaining[name] = cents
+
+    names = list(remaining)
+    if len(names) > max_people:
+        return settle(balances), "greedy"
+    order = _zero_sum_order([remaining[name] for name in names])
+
+    group = {}
+    running = 0
+    for index in order:
+        group[names[index]] = remaining[names[index]]
+        running += remaining[names[index]]
+        if running == 0:
+            transfers.extend(settle(group))
+            group = {}
+    if group:
+        transfers.extend(settle(group))
+    return transfers, "optimal"
+
+def solve(balances: Dict[str, int], mode: str, max_people: int = 16) -> dict:
+    """Run the requested solver and report what actually ran and how long it took"""
+    started = time.perf_counter()
+    if mode == "optimal":
+        transfers, mode = settle_optimal(balances, max_people)
+    else:
+        transfers = settle(balances)
+    return {
+        "transfers": transfers,
+        "mode": mode,
+        "max_optimal_people": max_people,
+        "solve_ms": round((time.perf_counter() - started) * 1000, 3)
+    }
+
+def report_headers(result: dict) -> dict:
+    """Response headers describing a solve() result"""
+    return {
+        "X-Settlement-Mode": result["mode"],
+        "X-Settlement-Transfers": str(len(result["transfers"])),
+        "X-Settlement-Max-Optimal-People": str(result["max_optimal_people"]),
+        "X-Settlement-Solve-Ms": str(result["solve_ms"])
+    }
@@ -0,0 +1,308 @@
+from sqlalchemy import Integer, cast, delete, event, null, select, union_all, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+from . import models
+from .config import settings
+from .database import dialect_insert
+from .settlement_engine import to_cents
+from .streaming_sketches import ExpenseSketch, merged_sketch, month_range, month_start, next_month
+
+# Quantile and top-payer sketches for the SQL backend. Expense writes only
+# append to the sketch_samples table in their own transaction: inserts add a
+# (paid_by, amount) sample, updates and deletes a rebuild marker for the old
+# and new category-month. Appends never touch a shared row, so concurrent
+# writers to the same category-month do not serialize on it.
+#
+# compact_sql_sketches folds the pending samples into the category_sketches
+# rows and rebuilds marked category-months from their expenses. Once this
+# process has committed SQL_SKETCH_COMPACT_THRESHOLD samples or markers for
+# a category-month it compacts that one in the background; a periodic sweep
+# (SQL_SKETCH_COMPACT_INTERVAL_SECONDS) or the CLI catches the rest.
+# read_sql_sketch never writes: it merges the stored sketches with the
+# samples still pending, rebuilding marked category-months in memory until
+# the next compaction.
+
+logger = logging.getLogger(__name__)
+
+UNCATEGORIZED = 0
+
+# PostgreSQL's SQLSTATE for a REPEATABLE READ transaction that lost a race
+SERIALIZATION_FAILURE = "40001"
+COMPACT_ATTEMPTS = 5
+
+SketchKey = Tuple[date, int]
+
+def sketch_key(created_at, category_id) -> SketchKey:
+    return month_start(created_at), category_id or UNCATEGORIZED
+
+def apply_sql_sketches(db: Session, samples: Iterable[Tuple[datetime, Optional[int], int, object]]):
+    """Append (created_at, category_id, paid_by, amount) samples within the caller's transaction"""
+    rows = []
+    for created_at, category_id, paid_by, amount in samples:
+        month, category_id = sketch_key(created_at, category_id)
+        rows.append({
+            "month": month, "category_id": category_id,
+            "paid_by": paid_by, "amount_cents": to_cents(amount), "rebuild": False
+        })
+    if rows:
+        db.execute(models.SketchSample.__table__.insert(), rows)
+        _note_appended(db, rows)
+
+def mark_sql_stale(db: Session, keys: Iterable[SketchKey]):
+    """Append rebuild markers for category-months whose expenses changed"""
+    rows = [
+        {"month": month, "category_id": category_id, "paid_by": None, "amount_cents": None, "rebuild": True}
+        for month, category_id in set(keys)
+    ]
+    if rows:
+        db.execute(models.SketchSample.__table__.insert(), rows)
+        _note_appended(db, rows)
+
+# Samples and markers this process committed per category-month since it
+# last scheduled a compaction of it, and the compactions still running
+_appended: Dict[SketchKey, int] = {}
+_compacting: set = set()
+
+def _note_appended(db: Session, rows: List[dict]):
+    # Counted once the transaction commits, like the ledger version
+    appended = db.info.setdefault("sketch_appended", {})
+    for row in rows:
+        key = (row["month"], row["category_id"])
+        appended[key] = appended.get(key, 0) + 1
+
+@event.listens_for(Session, "after_commit")
+def _schedule_compactions(session):
+    appended = session.info.pop("sketch_appended", None)
+    if not appended or settings.SQL_SKETCH_COMPACT_THRESHOLD <= 0:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Sync callers (CLIs, scripts) leave it to the sweep
+        return
+    for key, count in appended.items():
+        _appended[key] = _appended.get(key, 0) + count
+        if _appended[key] >= settings.SQL_SKETCH_COMPACT_THRESHOLD and key not in _compacting:
+            _appended[key] = 0
+            _compacting.add(key)
+            loop.create_task(_compact_in_background(key))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_appended(session):
+    session.info.pop("sketch_appended", None)
+
+async def _compact_in_background(key: SketchKey):
+    from .database import AsyncSessionLocal
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(_compact_with_retry, key)
+    except Exception as e:
+        logger.error(f"Error compacting SQL sketch {key}: {str(e)}")
+    finally:
+        _compacting.discard(key)
+
+def _expense_samples(db: Session, month: date, category_id: int):
+    expense = models.Expense
+    query = select(expense.paid_by, expense.amount).where(
+        expense.created_at >= month,
+        expense.created_at < next_month(month),
+        expense.category_id.is_(None) if category_id == UNCATEGORIZED else expense.category_id == category_id
+    )
+    return db.execute(query).all()
+
+def _rebuilt(db: Session, key: SketchKey) -> ExpenseSketch:
+    current = ExpenseSketch()
+    for paid_by, amount in _expense_samples(db, *key):
+        current.add(paid_by, to_cents(amount))
+    return current
+
+def _fold(stored: Dict[SketchKey, Optional[dict]], samples: Iterable) -> Tuple[Dict[SketchKey, ExpenseSketch], set]:
+    # Stored sketches plus pending samples per category-month, and the
+    # category-months with a rebuild marker, whose samples are superseded
+    current = {key: ExpenseSketch.from_dict(data) for key, data in stored.items()}
+    rebuild = set()
+    for month, category_id, paid_by, amount_cents, marker in samples:
+        key = (month, category_id)
+        if marker:
+            rebuild.add(key)
+        else:
+            current.setdefault(key, ExpenseSketch()).add(paid_by, amount_cents)
+    return current, rebuild
+
+def read_sql_sketch(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category: Optional[str] = None
+) -> ExpenseSketch:
+    """Merge the category-month sketches covering a date range, pending samples included"""
+    sketch = models.CategorySketch
+    sample = models.SketchSample
+    stored = select(
+        sketch.month, sketch.category_id, sketch.sketch,
+        cast(null(), Integer).label("paid_by"), cast(null(), Integer).label("amount_cents"), null().label("rebuild")
+    )
+    pending = select(sample.month, sample.category_id, null(), sample.paid_by, sample.amount_cents, sample.rebuild)
+    if category:
+        category_id = db.execute(select(models.Category.id).where(models.Category.name == category)).scalar()
+        if category_id is None:
+            return ExpenseSketch()
+        stored = stored.where(sketch.category_id == category_id)
+        pending = pending.where(sample.category_id == category_id)
+    start, end = month_range(start, end)
+    if start:
+        stored = stored.where(sketch.month >= start)
+        pending = pending.where(sample.month >= start)
+    if end:
+        stored = stored.where(sketch.month <= end)
+        pending = pending.where(sample.month <= end)
+    # One statement, so a compaction committing in between cannot make a
+    # sample count twice (or not at all) against the sketch it went into
+    rows = db.execute(union_all(stored, pending)).all()
+    current, rebuild = _fold(
+        {(row.month, row.category_id): row.sketch for row in rows if row.rebuild is None},
+        (row[:2] + row[3:] for row in rows if row.rebuild is not None)
+    )
+    # Marked category-months are answered from their expenses, in memory
+    for key in rebuild:
+        current[key] = _rebuilt(db, key)
+    return merged_sketch(current.values())
+
+def _begin_snapshot(db: Session):
+    # Every read of a compaction transaction must see the same committed
+    # state, so a marked category-month is rebuilt from exactly the expenses
+    # whose samples it deletes. SQLite has one writer at a time and the
+    # first statement below is a write, so nothing commits underneath it.
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+def _compact_one(db: Session, key: SketchKey) -> bool:
+    _begin_snapshot(db)
+    sketch = models.CategorySketch
+    sample = models.SketchSample
+    month, category_id = key
+    # The no-op DO UPDATE creates a missing row and row-locks it until
+    # commit. On PostgreSQL a second compaction of the same category-month
+    # blocks on that lock and, once the first commits, fails with a
+    # serialization error; _compact_with_retry runs it again on a fresh
+    # snapshot, in which the samples the first one folded are gone
+    stmt = dialect_insert(db, sketch).values(month=month, category_id=category_id)
+    stored = db.execute(stmt.on_conflict_do_update(
+        index_elements=["month", "category_id"],
+        set_={"month": stmt.excluded.month}
+    ).returning(sketch.sketch)).scalar()
+    rows = db.execute(
+        select(sample.id, sample.month, sample.category_id, sample.paid_by, sample.amount_cents, sample.rebuild)
+        .where(sample.month == month, sample.category_id == category_id)
+    ).all()
+    current, rebuild = _fold({key: stored}, (row[1:] for row in rows))
+    if rebuild:
+        current[key] = _rebuilt(db, key)
+    if current[key].amounts.n:
+        db.execute(update(sketch), [{"month": month, "category_id": category_id, "sketch": current[key].to_dict()}])
+    else:
+        db.execute(delete(sketch).where(sketch.month == month, sketch.category_id == category_id))
+    # The snapshot hides samples committed since the read above; they stay pending
+    if rows:
+        db.execute(delete(sample).where(
+            sample.month == month, sample.category_id == category_id, sample.id <= max(row.id for row in rows)
+        ))
+    db.commit()
+    return bool(rebuild)
+
+def _serialization_failure(error: DBAPIError) -> bool:
+    # psycopg2 calls it pgcode, psycopg and the asyncpg adapter sqlstate
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    return code == SERIALIZATION_FAILURE
+
+def _compact_with_retry(db: Session, key: SketchKey) -> Optional[bool]:
+    # Whether the category-month was rebuilt, or None if it kept losing to
+    # concurrent compactions; its samples then stay pending for the next pass
+    for attempt in range(COMPACT_ATTEMPTS):
+        try:
+            return _compact_one(db, key)
+        except DBAPIError as e:
+            db.rollback()
+            if not _serialization_failure(e):
+                raise
+    logger.warning(f"Gave up compacting SQL sketch {key} after {COMPACT_ATTEMPTS} serialization failures")
+    return None
+
+def compact_sql_sketches(db: Session) -> dict:
+    """Fold pending samples into their sketches, one transaction per category-month
+
+    A category-month that a concurrent compaction keeps winning is skipped
+    (and counted as such) instead of ending the pass.
+    """
+    sample = models.SketchSample
+    keys = db.execute(select(sample.month, sample.category_id).distinct()).all()
+    db.commit()
+    compacted = rebuilt = skipped = 0
+    for month, category_id in keys:
+        result = _compact_with_retry(db, (month, category_id))
+        if result is None:
+            skipped += 1
+        else:
+            compacted += 1
+            rebuilt += result
+    return {"compacted": compacted, "rebuilt": rebuilt, "skipped": skipped}
+
+def sql_top_payers(db: Session, sketch: ExpenseSketch, limit: int) -> List[dict]:
+    """Top payers of a sketch with their names"""
+    top = sketch.payers.top(limit)
+    names = dict(db.execute(
+        select(models.Person.id, models.Person.name).where(models.Person.id.in_([person_id for person_id, _, _ in top]))
+    ).all())
+    return [
+        {"name": names.get(person_id, "Unknown"), "amount_cents": total, "error_cents": error}
+        for person_id, total, error in top
+    ]
+
+def rebuild_sql_sketches(db: Session, batch_size: int = 1000) -> dict:
+    """Recompute every sketch from its expenses
+
+    Marks every category-month that has expenses or a sketch for a rebuild
+    and compacts, so writes may continue meanwhile.
+    """
+    expense = models.Expense
+    keys = {
+        (month, category_id)
+        for month, category_id in db.execute(select(models.CategorySketch.month, models.CategorySketch.category_id))
+    }
+    rows = db.execute(select(expense.created_at, expense.category_id).execution_options(yield_per=batch_size))
+    for created_at, category_id in rows:
+        keys.add(sketch_key(created_at, category_id))
+    mark_sql_stale(db, keys)
+    db.commit()
+    return compact_sql_sketches(db)
+
+async def compact_periodically(interval_seconds: float):
+    """Run compact_sql_sketches forever"""
+    from .database import AsyncSessionLocal
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.run_sync(compact_sql_sketches)
+            if result["compacted"]:
+                logger.info(f"Compacted SQL sketches: {result}")
+        except Exception as e:
+            logger.error(f"Error compacting SQL sketches: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+    parser = argparse.ArgumentParser(description="Compact or rebuild the SQL quantile and top-payer sketches")
+    parser.add_argument("command", choices=["compact", "rebuild"])
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        result = compact_sql_sketches(db) if args.command == "compact" else rebuild_sql_sketches(db)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,61 @@
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+
+# Counts the SQL statements each request sends to the database. A
+# before_cursor_execute listener on the engines bumps the tally of the
+# request currently running, which the count_statements dependency opens
+# and records per route once the handler returns.
+
+_current: ContextVar[Optional[list]] = ContextVar("sql_statement_tally", default=None)
+
+class StatementStats:
+    """Per-route request and statement totals"""
+
+    def __init__(self):
+        self._routes = {}  # route -> [requests, statements, max, last]
+
+    def record(self, route: str, count: int):
+        entry = self._routes.setdefault(route, [0, 0, 0, 0])
+        entry[0] += 1
+        entry[1] += count
+        entry[2] = max(entry[2], count)
+        entry[3] = count
+
+    def clear(self):
+        self._routes.clear()
+
+    def stats(self) -> dict:
+        """Return average, max and last statements per request for every route"""
+        return {
+            route: {
+                "requests": requests,
+                "statements": statements,
+                "avg_per_request": round(statements / requests, 2),
+                "max_per_request": most,
+                "last_per_request": last
+            }
+            for route, (requests, statements, most, last) in self._routes.items()
+        }
+
+statement_stats = StatementStats()
+
+def listen(engine):
+    """Count every statement ``engine`` executes against the current request"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        tally = _current.get()
+        if tally is not None:
+            tally[0] += 1
+
+async def count_statements(request: Request):
+    """Router dependency that records the statements sent while handling a request"""
+    tally = [0]
+    _current.set(tally)
+    try:
+        yield
+    finally:
+        route = request.scope.get("route")
+        statement_stats.record(f"{request.method} {route.path if route else request.url.path}", tally[0])
@@ -0,0 +1,227 @@
+from datetime import date, datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+import random
+from .settlement_engine import from_cents
+
+# Mergeable streaming sketches for expense analytics, kept per category and
+# month. KLLSketch answers quantiles of expense amounts and SpaceSaving the
+# top payers by amount, both in bounded memory and without the raw expenses.
+# Both are insert-only: a write that removes or changes an expense marks its
+# category-month for a rebuild from its expenses (see app.sketches).
+#
+# Error bounds (checked against exact answers by scripts/check_sketches.py):
+#  - KLLSketch(k=200) keeps at most ~3k values. A quantile's rank is within
+#    about 1.7% of n of the requested rank with 99% probability, for any n
+#    and after any number of merges. min and max are exact, and so is every
+#    answer while n <= k.
+#  - SpaceSaving(capacity=m) reports each payer's total with an overestimate
+#    of at most ``error`` <= W / m, where W is the total amount. Every payer
+#    whose total exceeds W / m is reported, and totals are exact while there
+#    are at most m distinct payers.
+
+KLL_K = 200
+TOP_PAYERS_CAPACITY = 64
+
+def month_start(moment) -> date:
+    """First day of the month containing ``moment``"""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return day.replace(day=1)
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+class KLLSketch:
+    """KLL quantile sketch over integer values (Karnin, Lang and Liberty 2016)"""
+
+    def __init__(self, k: int = KLL_K, levels: Optional[List[List[int]]] = None, n: int = 0,
+                 min_value: Optional[int] = None, max_value: Optional[int] = None):
+        self.k = k
+        self.levels = levels or [[]]
+        self.n = n
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def _capacity(self, level: int) -> int:
+        # Capacities shrink by 2/3 per level below the top one
+        depth = len(self.levels) - level - 1
+        return max(2, int(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        for level in range(len(self.levels)):
+            items = self.levels[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            # Keep an odd item behind and promote every other one of the rest,
+            # each now standing for twice the weight
+            keep = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[random.getrandbits(1)::2])
+            self.levels[level] = keep
+            if sum(map(len, self.levels)) < self._max_size():
+                break
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value: int):
+        self.levels[0].append(value)
+        self.n += 1
+        self.min_value = value if self.min_value is None else min(self.min_value, value)
+        self.max_value = value if self.max_value is None else max(self.max_value, value)
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        for value in (other.min_value, other.max_value):
+            if value is not None:
+                self.min_value = value if self.min_value is None else min(self.min_value, value)
+                self.max_value = value if self.max_value is None else max(self.max_value, value)
+        while sum(map(len, self.levels)) >= self._max_size():
+            self._compress()
+
+    def _weighted(self) -> List[Tuple[int, int]]:
+        return sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.levels)
+            for value in items
+        )
+
+    def quantiles(self, fractions: Iterable[float]) -> List[Optional[int]]:
+        """Return the value at each rank fraction in [0, 1], None when empty"""
+        fractions = list(fractions)
+        if not self.n:
+            return [None] * len(fractions)
+        weighted = self._weighted()
+        total = sum(weight for _, weight in weighted)
+        result = []
+        for fraction in fractions:
+            if fraction <= 0:
+                result.append(self.min_value)
+                continue
+            if fraction >= 1:
+                result.append(self.max_value)
+                continue
+            target = fraction * total
+            seen = 0
+            for value, weight in weighted:
+                seen += weight
+                if seen >= target:
+                    break
+            result.append(value)
+        return result
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": self.n, "min": self.min_value, "max": self.max_value, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "KLLSketch":
+        if not data:
+            return cls()
+        return cls(data["k"], [list(items) for items in data["levels"]], data["n"], data["min"], data["max"])
+
+class SpaceSaving:
+    """Weighted Space-Saving heavy hitters (Metwally, Agrawal and El Abbadi 2005)"""
+
+    def __init__(self, capacity: int = TOP_PAYERS_CAPACITY, counters: Optional[Dict[Hashable, List[int]]] = None):
+        self.capacity = capacity
+        self.counters = counters or {}  # key -> [total, overestimate]
+
+    def update(self, key: Hashable, weight: int):
+        if key in self.counters:
+            self.counters[key][0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+        else:
+            # The newcomer takes over the smallest counter and inherits its
+            # total as the bound on how much it may be overcounted
+            smallest = min(self.counters, key=lambda entry: self.counters[entry][0])
+            floor = self.counters.pop(smallest)[0]
+            self.counters[key] = [floor + weight, floor]
+
+    def _floor(self) -> int:
+        # A full sketch may have evicted any key, but never one above its smallest counter
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(total for total, _ in self.counters.values())
+
+    def merge(self, other: "SpaceSaving"):
+        # Agarwal et al. 2012: a key missing from one side is charged that
+        # side's floor, then all but the largest counters are dropped
+        floors = (self._floor(), other._floor())
+        merged = {}
+        for key in self.counters.keys() | other.counters.keys():
+            mine = self.counters.get(key, [floors[0], floors[0]])
+            theirs = other.counters.get(key, [floors[1], floors[1]])
+            merged[key] = [mine[0] + theirs[0], mine[1] + theirs[1]]
+        kept = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:self.capacity]
+        self.counters = dict(kept)
+
+    def top(self, limit: int) -> List[Tuple[Hashable, int, int]]:
+        """Return up to ``limit`` (key, total, overestimate) triples, largest first"""
+        ranked = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, total, error) for key, (total, error) in ranked[:limit]]
+
+    def to_dict(self) -> dict:
+        # A list of triples so BSON ObjectIds survive as keys
+        return {"capacity": self.capacity, "counters": [[key, total, error] for key, (total, error) in self.counters.items()]}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "SpaceSaving":
+        if not data:
+            return cls()
+        return cls(data["capacity"], {key: [total, error] for key, total, error in data["counters"]})
+
+class ExpenseSketch:
+    """Amount quantiles and top payers for one category-month"""
+
+    def __init__(self, amounts: Optional[KLLSketch] = None, payers: Optional[SpaceSaving] = None):
+        self.amounts = amounts or KLLSketch()
+        self.payers = payers or SpaceSaving()
+
+    def add(self, paid_by, amount_cents: int):
+        self.amounts.update(amount_cents)
+        self.payers.update(paid_by, amount_cents)
+
+    def merge(self, other: "ExpenseSketch"):
+        self.amounts.merge(other.amounts)
+        self.payers.merge(other.payers)
+
+    def to_dict(self) -> dict:
+        return {"amounts": self.amounts.to_dict(), "payers": self.payers.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "ExpenseSketch":
+        data = data or {}
+        return cls(KLLSketch.from_dict(data.get("amounts")), SpaceSaving.from_dict(data.get("payers")))
+
+def merged_sketch(sketches: Iterable[ExpenseSketch]) -> ExpenseSketch:
+    """Merge category-month sketches into one for a wider report"""
+    merged = ExpenseSketch()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+def month_range(start: Optional[date], end: Optional[date]) -> Tuple[Optional[date], Optional[date]]:
+    """Widen a date range to whole months"""
+    return (month_start(start) if start else None, month_start(end) if end else None)
+
+def quantile_report(sketch: ExpenseSketch, fractions: List[float]) -> dict:
+    """Amount quantiles of a sketch in the AmountQuantiles response shape"""
+    amounts = sketch.amounts
+    to_amount = lambda cents: None if cents is None else from_cents(cents)
+    return {
+        "count": amounts.n,
+        "min": to_amount(amounts.min_value),
+        "max": to_amount(amounts.max_value),
+        "quantiles": [
+            {"q": fraction, "amount": to_amount(cents)}
+            for fraction, cents in zip(fractions, amounts.quantiles(fractions))
+        ]
+    }
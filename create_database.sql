@@ -4,31 +4,9 @@ CREATE DATABASE expense_splitter;
 -- Connect to the database
 \c expense_splitter
 
--- Create people table
-CREATE TABLE people (
-    id SERIAL PRIMARY KEY,
-    name VARCHAR(100) UNIQUE NOT NULL
-);
-
--- Create expenses table
-CREATE TABLE expenses (
-    id SERIAL PRIMARY KEY,
-    amount DECIMAL(10,2) NOT NULL,
-    description VARCHAR(255) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    paid_by INTEGER REFERENCES people(id)
-);
-
--- Create expense_shares table
-CREATE TABLE expense_shares (
-    id SERIAL PRIMARY KEY,
-    expense_id INTEGER REFERENCES expenses(id),
-    person_id INTEGER REFERENCES people(id),
-    share_type VARCHAR(20) NOT NULL, -- percentage, exact, or equal
-    share_value DECIMAL(10,2) NOT NULL,
-    CONSTRAINT fk_expense FOREIGN KEY (expense_id) REFERENCES expenses(id) ON DELETE CASCADE,
-    CONSTRAINT fk_person FOREIGN KEY (person_id) REFERENCES people(id) ON DELETE CASCADE
-);
+-- Tables and indexes are created by the alembic migrations in versions/,
+-- which mirror app/models.py. Run them before loading the sample data:
+--   DATABASE_URL=postgresql://.../expense_splitter alembic upgrade head
 
 -- Insert sample data
 INSERT INTO people (name) VALUES ('Shantanu'), ('Sanket'), ('Om');
@@ -42,7 +20,7 @@ INSERT INTO expenses (amount, description, paid_by) VALUES
     (280.00, 'Pizza', (SELECT id FROM people WHERE name = 'Sanket'));
 
 -- Insert sample shares
-INSERT INTO expense_shares (expense_id, person_id, share_type, share_value) VALUES
+INSERT INTO expense_shares (expense_id, person_id, share_type, value) VALUES
     -- Dinner split equally
     ((SELECT id FROM expenses WHERE description = 'Dinner at restaurant'), (SELECT id FROM people WHERE name = 'Shantanu'), 'percentage', 33.33),
     ((SELECT id FROM expenses WHERE description = 'Dinner at restaurant'), (SELECT id FROM people WHERE name = 'Sanket'), 'percentage', 33.33),
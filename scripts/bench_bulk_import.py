@@ -0,0 +1,77 @@
+"""Throughput benchmark for POST /expenses/bulk.
+
+Generates ``--count`` random expenses as NDJSON, streams them to a running
+server in one request and prints the server-reported and client-observed
+import rate in expenses per second:
+
+    python scripts/bench_bulk_import.py --count 50000 --batch-size 1000
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+
+BASE_URL = "http://localhost:8000/api/v1"
+PEOPLE = [f"Person {i}" for i in range(200)]
+CATEGORIES = ["food", "travel", "utilities", "entertainment", "other"]
+
+
+def generate_expenses(count, seed=42):
+    rng = random.Random(seed)
+    for i in range(count):
+        group = rng.sample(PEOPLE, rng.randint(2, 6))
+        share = 100 // len(group)
+        values = [share] * len(group)
+        values[0] += 100 - sum(values)
+        yield {
+            "amount": round(rng.uniform(1, 500), 2),
+            "description": f"Imported expense {i}",
+            "category": rng.choice(CATEGORIES),
+            "paid_by": group[0],
+            "shares": [
+                {"person": person, "type": "percentage", "value": value}
+                for person, value in zip(group, values)
+            ],
+        }
+
+
+def ndjson_body(count, chunk_lines=1000):
+    # Yield the body in chunks so the client never holds the whole upload
+    chunk = []
+    for expense in generate_expenses(count):
+        chunk.append(json.dumps(expense))
+        if len(chunk) >= chunk_lines:
+            yield ("\n".join(chunk) + "\n").encode()
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    request = urllib.request.Request(
+        f"{args.base_url}/expenses/bulk?batch_size={args.batch_size}",
+        data=ndjson_body(args.count),
+        headers={"Content-Type": "application/x-ndjson"},
+        method="POST",
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        result = json.load(response)
+    elapsed = time.perf_counter() - start
+
+    print(f"received:          {result['received']}")
+    print(f"inserted:          {result['inserted']}")
+    print(f"failed:            {result['failed']}")
+    print(f"server rate:       {result['expenses_per_second']} expenses/s")
+    print(f"end-to-end rate:   {round(result['inserted'] / elapsed, 1)} expenses/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Cold-start benchmark for importing app.main.
+
+Imports the application in fresh interpreters ``--runs`` times and prints
+the import time, which is what every worker boot, test run and alembic
+invocation pays before doing any work:
+
+    python scripts/bench_cold_start.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", SNIPPET],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]) * 1000)
+
+    print(f"runs:   {args.runs}")
+    print(f"min:    {min(samples):.1f} ms")
+    print(f"median: {statistics.median(samples):.1f} ms")
+    print(f"max:    {max(samples):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Scan benchmark for the columnar ledger snapshot.
+
+Writes a synthetic snapshot of ``--expenses`` expenses (three shares each)
+in ``--batches`` incremental appends, then memory-maps it and times the
+vectorized balance and monthly spend scans:
+
+    python scripts/bench_columnar_snapshot.py --expenses 10000000 --dir /tmp/snapshot
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from app.cents_ledger import CentsLedger
+from app.columnar_snapshot import COLUMNS, SnapshotWriter, load_snapshot, to_micros
+
+
+def write_synthetic(directory, expenses, batches, people, seed):
+    # Bypasses the row tuples of SnapshotWriter.append: the columns are
+    # generated as arrays and appended the same way
+    rng = np.random.default_rng(seed)
+    writer = SnapshotWriter(directory, "synthetic", full=True)
+    for person in range(people):
+        writer.people.rename(person, f"person-{person}")
+    for category in ("food", "travel", "utilities", "entertainment", "other"):
+        writer.categories.rename(category, category)
+    start = datetime(2020, 1, 1)
+    per_batch = -(-expenses // batches)
+    for batch in range(batches):
+        rows = min(per_batch, expenses - batch * per_batch)
+        if rows <= 0:
+            break
+        offset = writer.manifest["expenses"]
+        created_at = to_micros(start) + np.sort(rng.integers(0, 10 ** 6 * 86400 * 30, rows)) + batch * 10 ** 6 * 86400 * 30
+        share_expense = np.repeat(np.arange(rows), 3)
+        split = CentsLedger.from_arrays(
+            writer.people.names,
+            rng.integers(0, people, rows),
+            rng.integers(100, 50000, rows) / 100,
+            share_expense,
+            rng.integers(0, people, rows * 3),
+            np.zeros(rows * 3, dtype=bool),
+            np.tile([33.33, 33.33, 33.34], rows)
+        )
+        columns = {
+            ("expenses", "created_at"): created_at,
+            ("expenses", "amount_cents"): split.amount_cents,
+            ("expenses", "payer"): split.payer,
+            ("expenses", "category"): rng.integers(0, 5, rows),
+            ("shares", "expense"): split.share_expense + offset,
+            ("shares", "person"): split.share_person,
+            ("shares", "cents"): split.share_cents,
+        }
+        for (table, column), values in columns.items():
+            with open(os.path.join(directory, f"{table}.{column}"), "ab") as f:
+                np.asarray(values, dtype=COLUMNS[table][column]).tofile(f)
+        writer.manifest["expenses"] += rows
+        writer.manifest["shares"] += rows * 3
+        writer.manifest["watermark"] = {"created_at": int(created_at[-1]), "id": str(offset + rows)}
+        writer.commit()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - started, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=1000000)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--people", type=int, default=1000)
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp()
+    _, write_seconds = timed(lambda: write_synthetic(directory, args.expenses, args.batches, args.people, args.seed))
+    snapshot, load_seconds = timed(lambda: load_snapshot(directory))
+    balances, balance_seconds = timed(lambda: snapshot.ledger().balances())
+    spend, spend_seconds = timed(lambda: snapshot.spend("category", "month"))
+    print(json.dumps({
+        "expenses": args.expenses,
+        "shares": args.expenses * 3,
+        "directory": directory,
+        "write_seconds": write_seconds,
+        "map_seconds": load_seconds,
+        "balances_seconds": balance_seconds,
+        "balances_sum_cents": int(balances.sum()),
+        "monthly_category_spend_seconds": spend_seconds,
+        "monthly_category_buckets": len(spend)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
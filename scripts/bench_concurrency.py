@@ -0,0 +1,80 @@
+"""Concurrency benchmark for the expense API.
+
+Fires ``--requests`` GET /expenses calls with ``--concurrency`` parallel
+clients against a running server and prints throughput and latency
+percentiles. Run it once against a build that uses the blocking driver and
+once against the Motor build to compare p99 under load:
+
+    uvicorn app.main:app --workers 1 &
+    python scripts/bench_concurrency.py --label motor --out bench.json
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:8000/api/v1"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed_get(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run(base_url, path, concurrency, total):
+    url = f"{base_url}{path}"
+    timed_get(url)  # warm up connection pool and caches
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed_get, [url] * total))
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--path", default="/expenses?limit=50")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--out", help="append the result to this JSON file")
+    args = parser.parse_args()
+
+    result = run(args.base_url, args.path, args.concurrency, args.requests)
+    result["label"] = args.label
+    print(json.dumps(result, indent=2))
+
+    if args.out:
+        try:
+            with open(args.out) as f:
+                results = json.load(f)
+        except FileNotFoundError:
+            results = []
+        results.append(result)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        for previous in results:
+            print(f"{previous['label']:>12}: p99 {previous['p99_ms']} ms, {previous['rps']} req/s")
+
+
+if __name__ == "__main__":
+    main()
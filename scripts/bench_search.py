@@ -0,0 +1,146 @@
+"""Query latency benchmark for expense search.
+
+Seeds ``--expenses`` expenses with random descriptions (if the store has
+fewer) and times the search that GET /expenses/search runs for a mix of
+whole-word, prefix and multi-word queries, printing p50/p95/max per query:
+
+    python scripts/bench_search.py --expenses 1000000              # SQL, DATABASE_URL
+    python scripts/bench_search.py --backend mongo --expenses 1000000
+
+The SQL backend defaults to a throwaway SQLite file; set DATABASE_URL (after
+``alembic upgrade head``) for PostgreSQL. The MongoDB backend uses the
+MONGODB_* settings and applies the index spec first.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/search.db")
+
+WORDS = [
+    "pizza", "petrol", "groceries", "dinner", "lunch", "taxi", "train", "hotel", "rent", "electricity",
+    "internet", "coffee", "cinema", "concert", "flight", "museum", "pharmacy", "gym", "parking", "snacks",
+] + [f"word{i}" for i in range(2000)]
+QUERIES = ["pizza", "piz", "petrol", "pet", "dinner pizza", "word1234", "word12", "hotel flight", "zzz"]
+
+
+def descriptions(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2)
+    }
+
+
+def bench_sql(args):
+    from sqlalchemy import func, insert, select
+    from app import models, search_index
+    from app.database import Base, SessionLocal, engine
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    existing = db.execute(select(func.count(models.Expense.id))).scalar()
+    if existing < args.expenses:
+        person = db.execute(select(models.Person.id).limit(1)).scalar()
+        if person is None:
+            person = db.execute(insert(models.Person).values(name="bench").returning(models.Person.id)).scalar()
+        started = datetime(2020, 1, 1)
+        batch = []
+        for index, description in enumerate(descriptions(args.expenses - existing, args.seed), start=existing):
+            batch.append({
+                "id": index + 1,
+                "amount": 10,
+                "description": description,
+                "paid_by": person,
+                "created_at": started + timedelta(minutes=index)
+            })
+            if len(batch) >= 50000:
+                db.execute(insert(models.Expense), batch)
+                search_index.index_sql_expenses(db, [(row["id"], row["description"]) for row in batch])
+                batch = []
+        if batch:
+            db.execute(insert(models.Expense), batch)
+            search_index.index_sql_expenses(db, [(row["id"], row["description"]) for row in batch])
+        db.commit()
+
+    results = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            matches = search_index.search_sql(db, query, 0, args.limit)
+            samples.append(time.perf_counter() - started)
+        results[query] = {"results": len(matches), **percentiles(samples)}
+    db.close()
+    return results
+
+
+async def bench_mongo(args):
+    from app import mongo_crud
+    from app.mongo_indexes import apply_indexes
+    from app.mongodb import get_db
+    db = get_db()
+    await apply_indexes(db)
+    existing = await db.expenses.count_documents({})
+    if existing < args.expenses:
+        category_id = await mongo_crud.resolve_category_id(db, "other")
+        person_id = (await mongo_crud.resolve_person_ids(db, ["bench"]))["bench"]
+        started = datetime(2020, 1, 1)
+        batch = []
+        for index, description in enumerate(descriptions(args.expenses - existing, args.seed), start=existing):
+            batch.append({
+                "amount": 10.0,
+                "description": description,
+                "paid_by": person_id,
+                "paid_by_name": "bench",
+                "category_id": category_id,
+                "category_name": "other",
+                "created_at": started + timedelta(minutes=index),
+                "shares": [{"person_id": person_id, "person_name": "bench", "type": "percentage", "value": 100.0}]
+            })
+            if len(batch) >= 10000:
+                await db.expenses.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await db.expenses.insert_many(batch, ordered=False)
+
+    results = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            matches = await mongo_crud.search_expenses(db, query, 0, args.limit)
+            samples.append(time.perf_counter() - started)
+        results[query] = {"results": len(matches), **percentiles(samples)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["sql", "mongo"], default="sql")
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    results = bench_sql(args) if args.backend == "sql" else asyncio.run(bench_mongo(args))
+    print(json.dumps({"backend": args.backend, "expenses": args.expenses, "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
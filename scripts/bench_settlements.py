@@ -0,0 +1,74 @@
+"""Benchmark for the settlement engine.
+
+Times app.settlement_engine.settle on random zero-sum ledgers of 10, 1k and
+100k participants, next to the previous resort-after-every-transfer loop for
+the sizes where it finishes in reasonable time:
+
+    python scripts/bench_settlements.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.settlement_engine import settle  # noqa: E402
+
+LEGACY_LIMIT = 2000
+
+
+def random_balances(count, seed=7):
+    rng = random.Random(seed)
+    balances = {f"person-{i}": rng.randint(-500_000, 500_000) for i in range(count - 1)}
+    balances[f"person-{count - 1}"] = -sum(balances.values())
+    return balances
+
+
+def legacy_settle(balances):
+    # The original algorithm: sort everyone again after every transfer
+    balances = dict(balances)
+    transfers = []
+    sorted_people = sorted(balances.items(), key=lambda x: x[1])
+    while sorted_people:
+        creditor = sorted_people[0]
+        debtor = sorted_people[-1]
+        if creditor[1] >= 0:
+            break
+        amount = min(-creditor[1], debtor[1])
+        transfers.append((debtor[0], creditor[0], amount))
+        balances[creditor[0]] += amount
+        balances[debtor[0]] -= amount
+        sorted_people = sorted(balances.items(), key=lambda x: x[1])
+    return transfers
+
+
+def timed(func, balances, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(balances)
+        best = min(best, time.perf_counter() - start)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'participants':>12} {'heap ms':>10} {'transfers':>10} {'legacy ms':>10}")
+    for size in args.sizes:
+        balances = random_balances(size)
+        heap_time, transfers = timed(settle, balances, args.repeat)
+        legacy = "-"
+        if size <= LEGACY_LIMIT:
+            legacy_time, _ = timed(legacy_settle, balances, args.repeat)
+            legacy = f"{legacy_time * 1000:.2f}"
+        print(f"{size:>12} {heap_time * 1000:>10.2f} {transfers:>10} {legacy:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Sync vs async load benchmark for the SQL expense routes.
+
+Seeds ``--expenses`` expenses into the database named by DATABASE_URL (if
+it is empty), then serves GET /expenses/ twice on the same data: once from
+a blocking ``def`` handler on the sync engine, which runs in Starlette's
+threadpool, and once from the async router on the asyncpg/aiosqlite
+engine. Each server is loaded with ``--concurrency`` parallel clients and
+throughput and tail latency are printed side by side:
+
+    DATABASE_URL=postgresql://... python scripts/bench_sql_async.py --concurrency 200
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session, joinedload
+from app import models
+from app.database import Base, SessionLocal, engine, get_db
+from app.routes import expenses
+from bench_concurrency import run
+
+PEOPLE = [f"person-{i}" for i in range(50)]
+
+
+# The sync baseline runs the same query as the async router
+sync_app = FastAPI()
+
+
+@sync_app.get("/expenses/")
+def list_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    rows = db.query(models.Expense).options(
+        joinedload(models.Expense.paid_by_person),
+        joinedload(models.Expense.category),
+        joinedload(models.Expense.shares).joinedload(models.ExpenseShare.person)
+    ).order_by(models.Expense.created_at, models.Expense.id).offset(skip).limit(limit).all()
+    return [
+        {
+            "id": expense.id,
+            "amount": float(expense.amount),
+            "description": expense.description,
+            "paid_by": expense.paid_by_person.name,
+            "created_at": expense.created_at.isoformat(),
+            "shares": [
+                {"person": share.person.name, "type": share.share_type, "value": float(share.value)}
+                for share in expense.shares
+            ]
+        }
+        for expense in rows
+    ]
+
+
+async_app = FastAPI()
+async_app.include_router(expenses.router)
+
+
+def seed(count):
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.Expense).count() >= count:
+            return
+        db.add_all(models.Person(name=name) for name in PEOPLE)
+        db.add(models.Category(name="Food"))
+        db.flush()
+        people = [person.id for person in db.query(models.Person)]
+        category = db.query(models.Category).first().id
+        rng = random.Random(0)
+        for index in range(count):
+            members = rng.sample(people, 4)
+            expense = models.Expense(
+                amount=rng.randint(100, 100000) / 100,
+                description=f"expense {index}",
+                paid_by=members[0],
+                category_id=category
+            )
+            expense.shares = [
+                models.ExpenseShare(person_id=person_id, share_type="percentage", value=25)
+                for person_id in members
+            ]
+            db.add(expense)
+        db.commit()
+    finally:
+        db.close()
+
+
+def serve(app_name, port):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"bench_sql_async:{app_name}",
+         "--app-dir", os.path.dirname(os.path.abspath(__file__)),
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs").read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{app_name} did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=5000)
+    parser.add_argument("--path", default="/expenses/?limit=50")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8101)
+    args = parser.parse_args()
+
+    seed(args.expenses)
+    results = []
+    for label in ("sync_app", "async_app"):
+        server = serve(label, args.port)
+        try:
+            result = run(f"http://127.0.0.1:{args.port}", args.path, args.concurrency, args.requests)
+        finally:
+            server.terminate()
+            server.wait()
+        result["label"] = label.replace("_app", "")
+        results.append(result)
+
+    print(json.dumps(results, indent=2))
+    for result in results:
+        print(f"{result['label']:>6}: {result['rps']} req/s, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Statements-per-request report for the SQL expense write path.
+
+Mounts the expenses router in-process against the database named by
+DATABASE_URL (a throwaway SQLite file by default), creates and updates
+``--expenses`` expenses and prints how many SQL statements each route sent
+per request, as counted by app.statement_counter:
+
+    python scripts/bench_sql_statements.py --expenses 200 --people 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/statements.db")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.database import Base, engine
+from app.routes import expenses
+from app.statement_counter import statement_stats
+
+
+def expense_body(index, people):
+    names = [f"person-{(index + offset) % (people * 2)}" for offset in range(people)]
+    return {
+        "amount": 120,
+        "description": f"expense {index}",
+        "category": "food",
+        "paid_by": names[0],
+        "shares": [{"person": name, "type": "percentage", "value": 100 / people} for name in names]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=100)
+    parser.add_argument("--people", type=int, default=4, help="shares per expense")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    # Responses are not inspected; only the statements sent matter here
+    client = TestClient(app, raise_server_exceptions=False)
+
+    ids = []
+    for index in range(args.expenses):
+        client.post("/expenses/", json=expense_body(index, args.people))
+        ids.append(index + 1)
+    for expense_id in ids:
+        client.put(f"/expenses/{expense_id}", json=expense_body(expense_id + 1, args.people))
+
+    print(json.dumps(statement_stats.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
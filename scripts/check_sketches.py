@@ -0,0 +1,95 @@
+"""Accuracy check for the streaming analytics sketches.
+
+Feeds ``--expenses`` synthetic amounts (log-normal) and payers (Zipf-like)
+into per-shard sketches, merges the shards the way a multi-month report
+does and compares every answer with the exact one computed by sorting:
+
+    python scripts/check_sketches.py --expenses 200000 --shards 12
+
+Exits non-zero if a quantile's rank error exceeds the documented 1.7% of n,
+or a top payer's total is off by more than its reported overestimate or
+more than W / capacity (see app/streaming_sketches.py).
+"""
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.streaming_sketches import ExpenseSketch, merged_sketch
+
+FRACTIONS = [0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+RANK_ERROR_BOUND = 0.017
+
+
+def rank_error(exact, value, fraction):
+    # Distance from the requested rank to the nearest rank of ``value``
+    target = fraction * len(exact)
+    low, high = bisect.bisect_left(exact, value), bisect.bisect_right(exact, value)
+    if low <= target <= high:
+        return 0.0
+    return min(abs(low - target), abs(high - target)) / len(exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--shards", type=int, default=12)
+    parser.add_argument("--payers", type=int, default=1000)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    weights = [1 / (rank + 1) for rank in range(args.payers)]
+    amounts = [max(1, int(random.lognormvariate(7.5, 1.1))) for _ in range(args.expenses)]
+    payers = random.choices(range(args.payers), weights=weights, k=args.expenses)
+
+    started = time.perf_counter()
+    shards = [ExpenseSketch() for _ in range(args.shards)]
+    for index, (payer, cents) in enumerate(zip(payers, amounts)):
+        shards[index % args.shards].add(payer, cents)
+    sketch = merged_sketch(shards)
+    elapsed = time.perf_counter() - started
+
+    exact = sorted(amounts)
+    quantiles = {
+        str(fraction): {"sketch": value, "rank_error": round(rank_error(exact, value, fraction), 5)}
+        for fraction, value in zip(FRACTIONS, sketch.amounts.quantiles(FRACTIONS))
+    }
+    worst_rank_error = max(entry["rank_error"] for entry in quantiles.values())
+
+    totals = {}
+    for payer, cents in zip(payers, amounts):
+        totals[payer] = totals.get(payer, 0) + cents
+    bound = sum(amounts) / sketch.payers.capacity
+    top = sketch.payers.top(args.top)
+    exact_top = sorted(totals, key=totals.get, reverse=True)[:args.top]
+    payer_failures = [
+        payer for payer, total, error in top
+        if not (0 <= total - totals[payer] <= min(error, bound))
+    ]
+
+    report = {
+        "expenses": args.expenses,
+        "shards": args.shards,
+        "sketch_seconds": round(elapsed, 3),
+        "retained_values": sum(map(len, sketch.amounts.levels)),
+        "quantiles": quantiles,
+        "worst_rank_error": worst_rank_error,
+        "top_payers_recall": len(set(exact_top) & {payer for payer, _, _ in top}) / len(exact_top),
+        "top_payer_overcount_bound": round(bound),
+        "top_payer_failures": payer_failures
+    }
+    print(json.dumps(report, indent=2))
+    if worst_rank_error > RANK_ERROR_BOUND or payer_failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
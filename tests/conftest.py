@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# app.database binds its engines at import; point them at a throwaway file
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/tests.db")
@@ -0,0 +1,201 @@
+import copy
+import re
+from types import SimpleNamespace
+from bson import ObjectId
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+
+# A minimal in-memory stand-in for the Motor database, covering only the
+# query operators, sorts and updates the code under test sends, so the
+# MongoDB paths can be tested without a server.
+
+
+def _resolve(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _compare(value, condition):
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return value == condition
+    for operator, operand in condition.items():
+        if operator == "$gt" and not (value is not None and value > operand):
+            return False
+        if operator == "$gte" and not (value is not None and value >= operand):
+            return False
+        if operator == "$lt" and not (value is not None and value < operand):
+            return False
+        if operator == "$ne" and value == operand:
+            return False
+        if operator == "$in" and value not in operand:
+            return False
+        if operator == "$elemMatch" and not any(matches(item, operand) for item in value or []):
+            return False
+    return True
+
+
+def matches(document, query) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif not _compare(_resolve(document, key), condition):
+            return False
+    return True
+
+
+def _apply_update(document, update, array_filters=None):
+    for path, value in update.get("$inc", {}).items():
+        document[path] = document.get(path, 0) + value
+    for path, value in update.get("$set", {}).items():
+        positional = re.fullmatch(r"(\w+)\.\$\[(\w+)\]\.(\w+)", path)
+        if not positional:
+            document[path] = value
+            continue
+        array, name, field = positional.groups()
+        for array_filter in array_filters or []:
+            conditions = {key[len(name) + 1:]: condition for key, condition in array_filter.items()}
+            for item in document[array]:
+                if matches(item, conditions):
+                    item[field] = value
+
+
+class Cursor:
+    def __init__(self, documents):
+        self._documents = documents
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self._documents.sort(key=lambda document: _resolve(document, field), reverse=direction < 0)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _page(self):
+        documents = self._documents[self._skip:]
+        return documents[:self._limit] if self._limit else documents
+
+    async def to_list(self, length=None):
+        return [copy.deepcopy(document) for document in self._page()]
+
+    def __aiter__(self):
+        self._iterator = iter(self._page())
+        return self
+
+    async def __anext__(self):
+        try:
+            return copy.deepcopy(next(self._iterator))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class Collection:
+    def __init__(self):
+        self.documents = []
+        # Called with each document before insert; return an error message to fail it
+        self.reject = lambda document: None
+
+    def find(self, query=None, projection=None, session=None):
+        return Cursor([document for document in self.documents if matches(document, query or {})])
+
+    async def find_one(self, query, projection=None, session=None):
+        found = await self.find(query).limit(1).to_list()
+        return found[0] if found else None
+
+    async def insert_many(self, documents, ordered=True, session=None):
+        errors = []
+        for index, document in enumerate(documents):
+            message = self.reject(document)
+            if message:
+                errors.append({"index": index, "code": 11000, "errmsg": message})
+                continue
+            document.setdefault("_id", ObjectId())
+            self.documents.append(copy.deepcopy(document))
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    def _update(self, query, update, many=False, upsert=False, array_filters=None) -> int:
+        modified = 0
+        for document in self.documents:
+            if matches(document, query):
+                _apply_update(document, update, array_filters)
+                modified += 1
+                if not many:
+                    return modified
+        if upsert and not modified:
+            document = {key: value for key, value in query.items() if not key.startswith("$")}
+            document.update(update.get("$setOnInsert", {}))
+            _apply_update(document, update)
+            document.setdefault("_id", ObjectId())
+            self.documents.append(document)
+        return modified
+
+    async def update_one(self, query, update, upsert=False, session=None):
+        self._update(query, update, upsert=upsert)
+
+    async def bulk_write(self, operations, ordered=True, session=None):
+        modified = 0
+        for operation in operations:
+            modified += self._update(
+                operation._filter,
+                operation._doc,
+                many=isinstance(operation, UpdateMany),
+                upsert=bool(operation._upsert),
+                array_filters=operation._array_filters
+            )
+        return SimpleNamespace(modified_count=modified)
+
+
+class Session:
+    def __init__(self, db):
+        self._db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def with_transaction(self, callback):
+        # All or nothing: a failed callback restores every collection
+        collections = {name: value for name, value in vars(self._db).items() if isinstance(value, Collection)}
+        snapshot = {name: copy.deepcopy(collection.documents) for name, collection in collections.items()}
+        try:
+            return await callback(self)
+        except Exception:
+            for name, collection in collections.items():
+                collection.documents = snapshot[name]
+            for name in set(vars(self._db)) - set(collections):
+                if isinstance(getattr(self._db, name), Collection):
+                    delattr(self._db, name)
+            raise
+
+
+class Database:
+    """Collections are created on first access, like Motor's"""
+
+    def __init__(self):
+        self.client = SimpleNamespace(start_session=self._start_session)
+
+    async def _start_session(self):
+        return Session(self)
+
+    def __getattr__(self, name):
+        collection = Collection()
+        setattr(self, name, collection)
+        return collection
@@ -0,0 +1,95 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import mongo_crud
+from app.mongo_cache import categories_cache, people_cache
+from app.mongodb import get_db
+from app.routes import mongo_expenses
+from tests import fake_mongo
+
+
+def expense_line(description):
+    return json.dumps({
+        "amount": 10,
+        "description": description,
+        "category": "food",
+        "paid_by": "A",
+        "shares": [{"person": "A", "type": "percentage", "value": 100}]
+    }).encode()
+
+
+def shared_line(description):
+    # A pays, B owes the whole amount
+    return json.dumps({
+        "amount": 20,
+        "description": description,
+        "category": "food",
+        "paid_by": "A",
+        "shares": [{"person": "B", "type": "percentage", "value": 100}]
+    }).encode()
+
+
+async def lines(values):
+    for value in values:
+        yield value
+
+
+def test_totals_across_batches_with_failures(monkeypatch):
+    async def upsert_names(collection, cache, names):
+        return {name: name for name in names}
+
+    async def insert_with_ledger(db, documents):
+        # Every document described "bad" fails to insert
+        return [
+            {"index": index, "errmsg": "duplicate"}
+            for index, document in enumerate(documents)
+            if document["description"] == "bad"
+        ]
+
+    monkeypatch.setattr(mongo_crud, "_upsert_names", upsert_names)
+    monkeypatch.setattr(mongo_crud, "_insert_with_ledger", insert_with_ledger)
+
+    body = [
+        # Batches of two valid lines: lines 1-2, 4-5 and 6-7
+        expense_line("ok"), expense_line("bad"), b"not json",
+        expense_line("ok"), expense_line("bad"), expense_line("bad"),
+        expense_line("ok"),
+    ]
+    result = asyncio.run(mongo_crud.import_expenses(SimpleNamespace(people=None, categories=None), lines(body), batch_size=2))
+
+    assert result["received"] == 7
+    assert result["inserted"] == 3
+    assert result["failed"] == 4
+    assert [error["line"] for error in result["errors"]] == [2, 3, 5, 6]
+
+
+def test_bulk_endpoint_reports_partial_failures(monkeypatch):
+    db = fake_mongo.Database()
+    # The second valid line fails to insert, which aborts and retries its batch
+    db.expenses.reject = lambda document: "duplicate key" if document["description"] == "bad" else None
+    people_cache.clear()
+    categories_cache.clear()
+    app = FastAPI()
+    app.include_router(mongo_expenses.router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    body = b"\n".join([shared_line("ok"), shared_line("bad"), b"{\"amount\": -1}", shared_line("ok")])
+    response = TestClient(app).post("/expenses/bulk?batch_size=2", content=body)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["received"], result["inserted"], result["failed"]) == (4, 2, 2)
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert result["errors"][0]["error"] == "duplicate key"
+    assert [expense["description"] for expense in db.expenses.documents] == ["ok", "ok"]
+    # Only the inserted expenses reach the ledger and rollups
+    balances = {document["_id"]: document for document in db.balances.documents}
+    people = {document["name"]: document["_id"] for document in db.people.documents}
+    assert (balances[people["A"]]["paid_cents"], balances[people["B"]]["owed_cents"]) == (4000, 4000)
+    assert sum(
+        document["expense_count"]
+        for document in db.spend_rollups.documents
+        if (document["dimension"], document["bucket"]) == ("category", "day")
+    ) == 2
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from app import models
+from app.columnar_snapshot import load_snapshot, snapshot_sql
+from app.database import Base, SessionLocal, engine
+
+NOW = datetime(2026, 10, 18, 12, 0)
+
+
+def add_expense(db, minutes_ago, amount=10):
+    payer = db.query(models.Person).filter_by(name="A").first() or models.Person(name="A")
+    expense = models.Expense(amount, description="expense", paid_by_person=payer, created_at=NOW - timedelta(minutes=minutes_ago))
+    expense.shares.append(models.ExpenseShare(person=payer, share_type="percentage", value=100))
+    db.add(expense)
+    db.commit()
+    return expense
+
+
+def test_late_commits_and_deletes_reach_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.columnar_snapshot.settings.SNAPSHOT_OVERLAP_SECONDS", 300)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        for minutes_ago in (30, 20, 10):
+            add_expense(db, minutes_ago)
+        assert snapshot_sql(db, str(tmp_path))["added"] == 3
+
+        # Committed after the last run but stamped behind its watermark
+        add_expense(db, 12, amount=5)
+        result = snapshot_sql(db, str(tmp_path))
+        assert (result["added"], result["rewritten"]) == (1, False)
+
+        # Too far behind for the overlap window, so the snapshot is rewritten
+        add_expense(db, 60, amount=7)
+        result = snapshot_sql(db, str(tmp_path))
+        assert (result["rewritten"], result["expenses"]) == (True, 5)
+
+        deleted = db.query(models.Expense).filter_by(amount=5).one()
+        db.delete(deleted.shares[0])
+        db.delete(deleted)
+        db.commit()
+        result = snapshot_sql(db, str(tmp_path))
+        assert (result["rewritten"], result["expenses"]) == (True, 4)
+        assert sorted(load_snapshot(str(tmp_path)).expense_amount_cents.tolist()) == [700, 1000, 1000, 1000]
+        assert snapshot_sql(db, str(tmp_path)) == {"added": 0, "rewritten": False, "expenses": 4, "shares": 4}
+    finally:
+        db.close()
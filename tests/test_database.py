@@ -0,0 +1,12 @@
+import pytest
+from app.database import check_backend
+
+
+def test_supported_backends_pass():
+    for url in ("sqlite:///split.db", "postgresql://user@host/split", "postgresql+asyncpg://user@host/split"):
+        check_backend(url)
+
+
+def test_other_backends_fail_with_the_setting_named():
+    with pytest.raises(ValueError, match="ASYNC_DATABASE_URL uses unsupported database 'mysql'"):
+        check_backend("mysql+aiomysql://user@host/split", "ASYNC_DATABASE_URL")
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from datetime import datetime
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.mongo_cache import categories_cache
+from app.mongodb import get_db
+from app.routes import mongo_expenses
+from tests import fake_mongo
+
+NOON = datetime(2026, 10, 1, 12)
+CATEGORIES = {"food": ObjectId(), "travel": ObjectId()}
+
+
+def expense_document(created_at, category="food"):
+    person = ObjectId()
+    return {
+        "_id": ObjectId(),
+        "amount": 10.0,
+        "description": "expense",
+        "paid_by": person,
+        "paid_by_name": "A",
+        "category_id": CATEGORIES[category],
+        "category_name": category,
+        "created_at": created_at,
+        "shares": [{"person_id": person, "person_name": "A", "type": "percentage", "value": 100.0}]
+    }
+
+
+def make_client(monkeypatch, documents):
+    db = fake_mongo.Database()
+    db.categories.documents = [{"_id": category_id, "name": name} for name, category_id in CATEGORIES.items()]
+    db.expenses.documents = documents
+    categories_cache.clear()
+    # Small batches, so ties on created_at straddle batch boundaries
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    app = FastAPI()
+    app.include_router(mongo_expenses.router)
+    app.dependency_overrides[get_db] = lambda: db
+    return TestClient(app)
+
+
+def test_export_is_in_keyset_order_across_batches(monkeypatch):
+    documents = [expense_document(NOON) for _ in range(5)] + [expense_document(datetime(2026, 9, 1))]
+    # Stored out of order; the export must not depend on insertion order
+    documents.reverse()
+    client = make_client(monkeypatch, documents)
+
+    response = client.get("/expenses/export")
+    assert response.status_code == 200
+    exported = [json.loads(line)["id"] for line in response.text.splitlines()]
+    expected = [str(document["_id"]) for document in sorted(documents, key=lambda d: (d["created_at"], d["_id"]))]
+    assert exported == expected
+
+    rows = list(csv.reader(io.StringIO(client.get("/expenses/export?format=csv").text)))
+    assert rows[0] == mongo_expenses.EXPORT_CSV_COLUMNS
+    assert [row[0] for row in rows[1:]] == expected
+
+
+def test_export_filters_keep_the_order(monkeypatch):
+    documents = [expense_document(NOON, category) for category in ("food", "travel", "food", "food", "travel")]
+    documents.append(expense_document(datetime(2026, 11, 1)))
+    client = make_client(monkeypatch, documents)
+
+    response = client.get("/expenses/export", params={"category": "food", "end": "2026-10-31T00:00:00"})
+    exported = [json.loads(line)["id"] for line in response.text.splitlines()]
+    food = [document for document in documents if document["category_name"] == "food" and document["created_at"] == NOON]
+    assert exported == [str(document["_id"]) for document in sorted(food, key=lambda d: d["_id"])]
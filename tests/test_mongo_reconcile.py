@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from app import mongo_crud, mongo_reconcile
+from app.mongo_cache import categories_cache, people_cache
+from tests import fake_mongo
+
+
+def seed():
+    db = fake_mongo.Database()
+    people = {name: ObjectId() for name in ("Ann", "Bob")}
+    food = ObjectId()
+    db.people.documents = [{"_id": person_id, "name": name} for name, person_id in people.items()]
+    db.categories.documents = [{"_id": food, "name": "food"}]
+    db.expenses.documents = [
+        {
+            "_id": ObjectId(),
+            "amount": 10.0,
+            "description": "expense",
+            "paid_by": people[payer],
+            "paid_by_name": payer,
+            "category_id": food,
+            "category_name": "food",
+            "created_at": datetime(2026, 10, index + 1),
+            "shares": [
+                {"person_id": people["Ann"], "person_name": "Ann", "type": "percentage", "value": 50.0},
+                {"person_id": people["Bob"], "person_name": "Bob", "type": "percentage", "value": 50.0}
+            ]
+        }
+        for index, payer in enumerate(["Ann", "Bob", "Ann"])
+    ]
+    people_cache.clear()
+    categories_cache.clear()
+    return db, people
+
+
+def listing(db):
+    expenses, _ = asyncio.run(mongo_crud.list_expenses(db))
+    return [(expense["paid_by"], [share["person"] for share in expense["shares"]]) for expense in expenses]
+
+
+def test_rename_person_rewrites_embedded_names():
+    db, people = seed()
+    # Warm the name cache with the old name
+    people_cache.put("Ann", people["Ann"])
+
+    # Two payer rewrites plus three share rewrites
+    assert asyncio.run(mongo_reconcile.rename_person(db, people["Ann"], "Anna")) == 5
+    assert listing(db) == [
+        ("Anna", ["Anna", "Bob"]),
+        ("Bob", ["Anna", "Bob"]),
+        ("Anna", ["Anna", "Bob"])
+    ]
+    assert people_cache.get_id("Ann") is None
+    # Only stale names match, so a second pass rewrites nothing
+    assert asyncio.run(mongo_reconcile.rename_person(db, people["Ann"], "Anna")) == 0
+
+
+def test_reconcile_catches_renames_made_outside_the_api():
+    db, people = seed()
+    db.people.documents[1]["name"] = "Robert"
+    db.categories.documents[0]["name"] = "groceries"
+
+    assert asyncio.run(mongo_reconcile.reconcile(db)) == {"people_updates": 4, "category_updates": 3}
+    assert listing(db)[1] == ("Robert", ["Ann", "Robert"])
+    assert {expense["category_name"] for expense in db.expenses.documents} == {"groceries"}
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from datetime import datetime
+from bson import ObjectId
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app import models, mongo_crud
+from app.database import Base, SessionLocal, engine
+from app.mongodb import get_db
+from app.pagination import encode_cursor
+from app.routes import expenses, mongo_expenses
+from tests import fake_mongo
+
+BAD_ID_CURSOR = encode_cursor(datetime(2026, 10, 18), "not-an-id")
+
+
+def test_mongo_cursor_with_invalid_object_id_is_rejected():
+    # Rejected while decoding, before any query runs
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(mongo_crud.list_expenses(None, cursor=BAD_ID_CURSOR))
+    assert raised.value.status_code == 400
+    assert raised.value.detail == "Invalid pagination cursor"
+
+
+def test_sql_cursor_with_invalid_id_is_rejected():
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    response = TestClient(app).get("/expenses/", params={"cursor": BAD_ID_CURSOR})
+    assert response.status_code == 400
+    assert response.headers["X-Error-Code"] == "400"
+
+
+def expense(description):
+    return {
+        "amount": 10,
+        "description": description,
+        "category": "food",
+        "paid_by": "A",
+        "shares": [{"person": "A", "type": "percentage", "value": 100}]
+    }
+
+
+def walk(client, path):
+    # Follow X-Next-Cursor from the first page to the last
+    ids = []
+    response = client.get(path, params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        ids.extend(expense["id"] for expense in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+        response = client.get(path, params={"limit": 2, "cursor": cursor})
+
+
+def test_sql_cursor_pages_through_equal_created_at():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    client = TestClient(app, raise_server_exceptions=False)
+    for index in range(5):
+        client.post("/expenses/", json=expense(f"expense {index}"))
+    db = SessionLocal()
+    try:
+        # Every expense shares one timestamp, so only the id orders them
+        db.query(models.Expense).update({models.Expense.created_at: datetime(2026, 10, 1, 12)})
+        db.commit()
+    finally:
+        db.close()
+
+    assert walk(client, "/expenses/") == [1, 2, 3, 4, 5]
+
+
+def test_mongo_cursor_pages_through_equal_created_at():
+    db = fake_mongo.Database()
+    person = ObjectId()
+    db.expenses.documents = [
+        {
+            "_id": ObjectId(),
+            "amount": 10.0,
+            "description": "expense",
+            "paid_by": person,
+            "paid_by_name": "A",
+            "category_id": ObjectId(),
+            "category_name": "food",
+            "created_at": datetime(2026, 10, 1, 12) if index else datetime(2026, 9, 1),
+            "shares": [{"person_id": person, "person_name": "A", "type": "percentage", "value": 100.0}]
+        }
+        for index in range(6)
+    ]
+    db.expenses.documents.reverse()
+    app = FastAPI()
+    app.include_router(mongo_expenses.router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    expected = [
+        str(document["_id"])
+        for document in sorted(db.expenses.documents, key=lambda document: (document["created_at"], document["_id"]))
+    ]
+    assert walk(TestClient(app), "/expenses") == expected
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi import Response
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app import ledger, models, rollups, search_index
+from app.database import Base, async_url
+from app.pagination import encode_cursor
+from app.recurring_scheduler import materialize_batch
+from app.routes import expenses
+
+# EXPLAINs every statement the SQL hot paths send and fails if one reads a
+# table with a sequential scan. The statements are captured from the real
+# query functions, run against a database built by the alembic chain: a
+# fresh SQLite file, or QUERY_PLAN_DATABASE_URL (migrated to head first).
+# On PostgreSQL the plans are taken with enable_seqscan off, so a Seq Scan
+# means no index can serve the query at all, whatever the table sizes. On
+# SQLite a bare SCAN of a table (one not USING an index) fails. Everything
+# a check writes is rolled back.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOW = datetime(2030, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def database_url():
+    url = os.getenv("QUERY_PLAN_DATABASE_URL")
+    if url:
+        return url
+    url = f"sqlite:///{tempfile.mkdtemp()}/plans.db"
+    config = Config()
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    config.set_main_option("version_locations", os.path.join(ROOT, "versions"))
+    config.set_main_option("path_separator", "os")
+    with pytest.MonkeyPatch.context() as patch:
+        # alembic/env.py migrates DATABASE_URL when it is set
+        patch.setenv("DATABASE_URL", url)
+        command.upgrade(config, "head")
+    return url
+
+
+async def seed(connection) -> dict:
+    person = (await connection.execute(insert(models.Person).values(name="plan-check").returning(models.Person.id))).scalar()
+    category = (await connection.execute(insert(models.Category).values(name="plan-check").returning(models.Category.id))).scalar()
+    expense = (await connection.execute(insert(models.Expense.__table__).values(
+        amount=10, description="pizza", paid_by=person, category_id=category, created_at=NOW, is_recurring=True
+    ).returning(models.Expense.id))).scalar()
+    await connection.execute(insert(models.ExpenseShare).values(
+        expense_id=expense, person_id=person, share_type="percentage", value=100
+    ))
+    await connection.execute(insert(models.ExpenseTerm).values(term="pizza", expense_id=expense))
+    await connection.execute(insert(models.RecurringExpense).values(
+        expense_id=expense, frequency="monthly", start_date=NOW, next_occurrence=NOW + timedelta(days=31)
+    ))
+    return {"expense": expense}
+
+
+# (name, coroutine running the real code path on a session, tables a full
+# read is expected for)
+CHECKS = [
+    (
+        "listing: keyset page and its relationships",
+        lambda db, ids: expenses.get_expenses(
+            Response(), limit=50, cursor=encode_cursor(NOW - timedelta(days=1), 0), db=db
+        ),
+        set()
+    ),
+    (
+        # Every person is reported, so reading all of people is expected
+        "balances: ledger totals",
+        lambda db, ids: db.run_sync(ledger.aggregate_sql_balances),
+        {"people"}
+    ),
+    (
+        "settlements: ledger balances",
+        lambda db, ids: db.run_sync(ledger.read_sql_balances),
+        {"people"}
+    ),
+    (
+        "writes: deltas of one stored expense",
+        lambda db, ids: expenses.stored_expense_deltas(db, ids["expense"]),
+        set()
+    ),
+    (
+        "analytics: spend rollup range",
+        lambda db, ids: db.run_sync(rollups.read_sql_rollups, "category", "month", NOW.date(), NOW.date()),
+        set()
+    ),
+    (
+        "search: ranked prefix matches",
+        lambda db, ids: db.run_sync(search_index.search_sql, "pizza zz"),
+        set()
+    ),
+    (
+        "search: reindex one expense",
+        lambda db, ids: db.run_sync(search_index.unindex_sql_expenses, [ids["expense"]]),
+        set()
+    ),
+    (
+        "recurring: due rows",
+        lambda db, ids: materialize_batch(db, NOW, 100, 50),
+        set()
+    ),
+]
+
+
+def _postgres_scans(plan):
+    # Yield the relation of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from _postgres_scans(child)
+
+
+async def sequential_scans(connection, statement, parameters):
+    """Return (tables read sequentially, plan lines) for one captured statement"""
+    if connection.dialect.name == "postgresql":
+        await connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]["Plan"]
+        return set(_postgres_scans(root)), json.dumps(root, indent=2).splitlines()
+    details = [row[-1] for row in await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    scans = {
+        match.group(1)
+        for match in (re.match(r"SCAN (\w+)(.*)", detail) for detail in details)
+        # Subqueries are scanned by name too; only real tables count
+        if match and "USING" not in match.group(2) and match.group(1) in Base.metadata.tables
+    }
+    return scans, details
+
+
+async def check(url: str, run, full_scan_ok: set) -> list:
+    engine = create_async_engine(async_url(url))
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE") and not executemany:
+            captured.append((statement, parameters))
+
+    failures = []
+    try:
+        async with engine.connect() as connection:
+            transaction = await connection.begin()
+            ids = await seed(connection)
+            db = AsyncSession(bind=connection, join_transaction_mode="create_savepoint")
+            event.listen(engine.sync_engine, "before_cursor_execute", capture)
+            try:
+                await run(db, ids)
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", capture)
+            assert captured, "the code path sent no statement to check"
+            for statement, parameters in captured:
+                scans, plan = await sequential_scans(connection, statement, parameters)
+                if scans - full_scan_ok:
+                    failures.append((statement, sorted(scans - full_scan_ok), plan))
+            await transaction.rollback()
+    finally:
+        await engine.dispose()
+    return failures
+
+
+@pytest.mark.parametrize("name,run,full_scan_ok", CHECKS, ids=[name for name, _, _ in CHECKS])
+def test_hot_path_is_index_served(database_url, name, run, full_scan_ok):
+    failures = asyncio.run(check(database_url, run, full_scan_ok))
+    assert not failures, "\n\n".join(
+        f"sequential scan on {', '.join(tables)}:\n{statement}\n" + "\n".join(plan)
+        for statement, tables, plan in failures
+    )
@@ -0,0 +1,76 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.database import Base, engine
+from app.result_cache import sql_results
+from app.routes import expenses, settlements
+
+
+def make_client():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    sql_results.clear()
+    app = FastAPI()
+    app.include_router(expenses.router)
+    app.include_router(settlements.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def expense(amount, paid_by):
+    return {
+        "amount": amount,
+        "description": "dinner",
+        "category": "food",
+        "paid_by": paid_by,
+        "shares": [
+            {"person": "A", "type": "percentage", "value": 50},
+            {"person": "B", "type": "percentage", "value": 50}
+        ]
+    }
+
+
+def lookups():
+    stats = sql_results.stats()
+    return stats["hits"], stats["misses"]
+
+
+@pytest.mark.parametrize("backend", ["memory", "database"])
+def test_writes_invalidate_cached_settlements(monkeypatch, backend):
+    monkeypatch.setattr(settings, "RESULT_CACHE_BACKEND", backend)
+    client = make_client()
+    client.post("/expenses/", json=expense(10, "A"))
+
+    hits, misses = lookups()
+    recomputes = sql_results.stats()["recomputes"]
+    first = client.get("/settlements/").json()
+    assert first == [{"payer": "B", "receiver": "A", "amount": "5.00"}]
+    assert lookups() == (hits, misses + 1)
+    assert client.get("/settlements/").json() == first
+    assert lookups() == (hits + 1, misses + 1)
+
+    # The write's commit bumps the ledger version, so the next read recomputes
+    client.post("/expenses/", json=expense(30, "B"))
+    assert client.get("/settlements/").json() == [{"payer": "A", "receiver": "B", "amount": "10.00"}]
+    assert lookups() == (hits + 1, misses + 2)
+
+    client.put("/expenses/2", json=expense(10, "B"))
+    assert client.get("/settlements/").json() == []
+    client.delete("/expenses/2")
+    assert client.get("/settlements/").json() == first
+    assert lookups() == (hits + 1, misses + 4)
+    assert sql_results.stats()["recomputes"] == recomputes + 4
+
+
+def test_failed_writes_keep_the_cached_result():
+    client = make_client()
+    client.post("/expenses/", json=expense(10, "A"))
+    first = client.get("/settlements/").json()
+    hits, misses = lookups()
+
+    # Shares that do not sum to 100 are rejected before anything is written
+    invalid = expense(30, "B")
+    invalid["shares"][0]["value"] = 10
+    assert client.post("/expenses/", json=invalid).status_code == 422
+    assert client.get("/settlements/").json() == first
+    assert lookups() == (hits + 1, misses)
@@ -0,0 +1,74 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.database import Base, engine
+from app.routes import expenses
+
+
+def make_client():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def expense(description):
+    return {
+        "amount": 10,
+        "description": description,
+        "category": "food",
+        "paid_by": "A",
+        "shares": [{"person": "A", "type": "percentage", "value": 100}]
+    }
+
+
+def search(client, query):
+    response = client.get("/expenses/search", params={"q": query})
+    assert response.status_code == 200
+    return [(row["description"], row["score"]) for row in response.json()]
+
+
+def test_short_terms_match_whole_words_only():
+    client = make_client()
+    for description in ("pizza night", "pi day", "pie"):
+        client.post("/expenses/", json=expense(description))
+
+    # Three characters and up match as prefixes, shorter terms as words
+    assert search(client, "piz") == [("pizza night", 1)]
+    assert search(client, "pi") == [("pi day", 2)]
+    assert search(client, "pizzas") == []
+
+
+def test_accents_and_case_fold():
+    client = make_client()
+    client.post("/expenses/", json=expense("Café Crème"))
+
+    assert search(client, "cafe creme") == [("Café Crème", 4)]
+    assert search(client, "CAFÉ") == [("Café Crème", 2)]
+
+
+def test_whole_words_outrank_prefixes_then_newest_first():
+    client = make_client()
+    for description in ("dinner", "dinner tickets", "dinnerware", "train tickets"):
+        client.post("/expenses/", json=expense(description))
+
+    assert search(client, "dinner tickets") == [
+        ("dinner tickets", 4),
+        ("train tickets", 2),
+        ("dinner", 2),
+        ("dinnerware", 1)
+    ]
+
+
+def test_updates_and_deletes_reindex():
+    client = make_client()
+    client.post("/expenses/", json=expense("taxi to airport"))
+    client.post("/expenses/", json=expense("hotel"))
+
+    client.put("/expenses/1", json=expense("train to airport"))
+    assert search(client, "taxi") == []
+    assert search(client, "train") == [("train to airport", 2)]
+
+    client.delete("/expenses/1")
+    assert search(client, "airport") == []
+    assert search(client, "hotel") == [("hotel", 2)]
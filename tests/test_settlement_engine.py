@@ -0,0 +1,36 @@
+import random
+from app import settlement_engine
+
+
+def random_balances(count, seed):
+    rng = random.Random(seed)
+    balances = {f"person-{index}": rng.randint(-50000, 50000) for index in range(count - 1)}
+    balances[f"person-{count - 1}"] = -sum(balances.values())
+    return balances
+
+
+def test_fallback_depends_only_on_group_size():
+    balances = random_balances(17, seed=3)
+    transfers, mode = settlement_engine.settle_optimal(balances)
+    assert mode == "greedy"
+    assert transfers == settlement_engine.settle(balances)
+    assert settlement_engine.settle_optimal(balances, max_people=17)[1] == "optimal"
+
+
+def test_optimal_result_is_repeatable():
+    balances = random_balances(12, seed=5)
+    balances.update({"paired-debtor": 700, "paired-creditor": -700})
+    results = {
+        tuple(settlement_engine.settle_optimal(balances, max_people=12)[0])
+        for _ in range(3)
+    }
+    assert len(results) == 1
+    transfers, mode = settlement_engine.settle_optimal(balances, max_people=12)
+    assert mode == "optimal"
+    assert ("paired-debtor", "paired-creditor", 700) in transfers
+    settled = dict(balances)
+    for payer, receiver, cents in transfers:
+        settled[payer] -= cents
+        settled[receiver] += cents
+    assert not any(settled.values())
+    assert len(transfers) <= len(settlement_engine.settle(balances))
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+from app import models
+from app.database import Base, SessionLocal, engine
+from app.routes import analytics, expenses
+
+
+def make_client():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    app.include_router(analytics.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def expense(amount, category, paid_by):
+    return {
+        "amount": amount,
+        "description": "expense",
+        "category": category,
+        "paid_by": paid_by,
+        "shares": [
+            {"person": "A", "type": "percentage", "value": 33.33},
+            {"person": "B", "type": "percentage", "value": 33.33},
+            {"person": "C", "type": "percentage", "value": 33.34}
+        ]
+    }
+
+
+def rollup_totals(client, group_by):
+    # name -> (amount, expenses) summed over every bucket
+    totals = {}
+    for row in client.get(f"/api/v1/analytics/spend?group_by={group_by}&bucket=day").json():
+        amount, count = totals.get(row["name"], (Decimal(0), 0))
+        totals[row["name"]] = (amount + Decimal(row["amount"]), count + row["expenses"])
+    return {name: totals for name, totals in totals.items() if totals != (0, 0)}
+
+
+def expense_totals(name_column, join_on):
+    db = SessionLocal()
+    try:
+        rows = db.query(name_column, func.sum(models.Expense.amount), func.count(models.Expense.id)).join(
+            name_column.class_, join_on
+        ).group_by(name_column).all()
+        return {name: (Decimal(str(amount)).quantize(Decimal("0.01")), count) for name, amount, count in rows}
+    finally:
+        db.close()
+
+
+def assert_rollups_match_expenses(client):
+    assert rollup_totals(client, "category") == expense_totals(
+        models.Category.name, models.Category.id == models.Expense.category_id
+    )
+    assert rollup_totals(client, "payer") == expense_totals(
+        models.Person.name, models.Person.id == models.Expense.paid_by
+    )
+    total = sum((amount for amount, _ in expense_totals(
+        models.Category.name, models.Category.id == models.Expense.category_id
+    ).values()), Decimal(0))
+    assert sum((amount for amount, _ in rollup_totals(client, "person").values()), Decimal(0)) == total
+
+
+def test_spend_matches_expenses_after_every_write():
+    client = make_client()
+    client.post("/expenses/", json=expense("10.00", "food", "A"))
+    client.post("/expenses/", json=expense("25.50", "travel", "B"))
+    client.post("/expenses/", json=expense("7.25", "food", "B"))
+    assert_rollups_match_expenses(client)
+
+    # Moves the amount to another category and payer
+    client.put("/expenses/2", json=expense("40.00", "food", "C"))
+    assert_rollups_match_expenses(client)
+
+    client.delete("/expenses/1")
+    assert_rollups_match_expenses(client)
+    assert rollup_totals(client, "category") == {"food": (Decimal("47.25"), 2)}
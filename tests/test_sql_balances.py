@@ -0,0 +1,74 @@
+from decimal import Decimal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import ledger, models
+from app.database import Base, SessionLocal, engine
+from app.routes import expenses, settlements
+from app.statement_counter import statement_stats
+
+
+def make_client():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    app.include_router(settlements.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_balances_match_ledger_in_one_query():
+    client = make_client()
+    client.post("/expenses/", json={
+        "amount": 10,
+        "description": "dinner",
+        "category": "food",
+        "paid_by": "C",
+        "shares": [
+            {"person": "A", "type": "percentage", "value": 33.33},
+            {"person": "B", "type": "percentage", "value": 33.33},
+            {"person": "C", "type": "percentage", "value": 33.34}
+        ]
+    })
+    db = SessionLocal()
+    try:
+        stored = ledger.read_sql_balances(db)
+        assert ledger.check_sql(db)["consistent"]
+    finally:
+        db.close()
+
+    response = client.get("/settlements/balances")
+    assert response.status_code == 200
+    balances = {row["person"]: row for row in response.json()}
+    assert {name: int(Decimal(row["balance"]) * 100) for name, row in balances.items()} == stored
+    assert sum(stored.values()) == 0
+    assert Decimal(balances["C"]["paid"]) == 10
+    assert sum(Decimal(row["owed"]) for row in balances.values()) == 10
+    assert Decimal(balances["A"]["owed"]) == Decimal("3.33")
+
+    # A single balance query, however many people; the version is in-process
+    assert statement_stats.stats()["GET /settlements/balances"]["last_per_request"] == 1
+
+
+def test_create_and_update_store_percentages():
+    client = make_client()
+    shares = [
+        {"person": "A", "type": "percentage", "value": 25},
+        {"person": "B", "type": "percentage", "value": 75}
+    ]
+    body = {"amount": 40, "description": "taxi", "category": "travel", "paid_by": "A", "shares": shares}
+    client.post("/expenses/", json=body)
+    db = SessionLocal()
+    try:
+        expense_id = db.query(models.Expense.id).scalar()
+        assert sorted(value for (value,) in db.query(models.ExpenseShare.value)) == [25, 75]
+    finally:
+        db.close()
+
+    client.put(f"/expenses/{expense_id}", json={**body, "amount": 80})
+    db = SessionLocal()
+    try:
+        assert sorted(value for (value,) in db.query(models.ExpenseShare.value)) == [25, 75]
+        assert ledger.read_sql_balances(db) == {"A": -6000, "B": 6000}
+        assert ledger.check_sql(db)["consistent"]
+    finally:
+        db.close()
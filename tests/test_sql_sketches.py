@@ -0,0 +1,115 @@
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import DBAPIError
+from app import models, sketches
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+from app.routes import analytics, expenses
+
+
+def make_client():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    app = FastAPI()
+    app.include_router(expenses.router)
+    app.include_router(analytics.router)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def expense(amount, category, paid_by):
+    return {
+        "amount": amount,
+        "description": "expense",
+        "category": category,
+        "paid_by": paid_by,
+        "shares": [{"person": "A", "type": "percentage", "value": 100}]
+    }
+
+
+def counts():
+    db = SessionLocal()
+    try:
+        return db.query(models.CategorySketch).count(), db.query(models.SketchSample).count()
+    finally:
+        db.close()
+
+
+def compact():
+    db = SessionLocal()
+    try:
+        return sketches.compact_sql_sketches(db)
+    finally:
+        db.close()
+
+
+def test_reads_merge_pending_samples_without_writing():
+    client = make_client()
+    for index in range(10):
+        client.post("/expenses/", json=expense(10 + index, "food" if index % 2 else "travel", "AB"[index % 2]))
+    quantiles = "/api/v1/analytics/amount-quantiles?q=0.5&q=1"
+
+    pending = client.get(quantiles).json()
+    assert pending["count"] == 10
+    assert counts() == (0, 10)
+
+    assert compact() == {"compacted": 2, "rebuilt": 0, "skipped": 0}
+    assert counts() == (2, 0)
+    assert client.get(quantiles).json() == pending
+
+
+def test_deletes_rebuild_in_memory_until_compacted():
+    client = make_client()
+    for amount in (10, 20, 30):
+        client.post("/expenses/", json=expense(amount, "food", "A"))
+    compact()
+    client.delete("/expenses/3")
+
+    assert client.get("/api/v1/analytics/amount-quantiles?q=1").json()["max"] == "20.00"
+    assert counts() == (1, 1)
+    assert compact() == {"compacted": 1, "rebuilt": 1, "skipped": 0}
+    assert counts() == (1, 0)
+    assert client.get("/api/v1/analytics/top-payers").json() == [
+        {"name": "A", "amount": "30.00", "max_overcount": "0.00"}
+    ]
+
+
+def test_writes_compact_in_the_background_past_the_threshold(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_SKETCH_COMPACT_THRESHOLD", 3)
+    monkeypatch.setattr(sketches, "_appended", {})
+    # Entered, so the event loop outlives each request and runs the compaction
+    with make_client() as client:
+        for amount in (10, 20):
+            client.post("/expenses/", json=expense(amount, "food", "A"))
+        assert counts() == (0, 2)
+        client.post("/expenses/", json=expense(30, "food", "A"))
+        deadline = time.monotonic() + 5
+        while counts() != (1, 0) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert counts() == (1, 0)
+        assert client.get("/api/v1/analytics/amount-quantiles?q=1").json()["max"] == "30.00"
+
+
+def test_serialization_failures_skip_only_their_category_month(monkeypatch):
+    client = make_client()
+    client.post("/expenses/", json=expense(10, "food", "A"))
+    client.post("/expenses/", json=expense(20, "travel", "B"))
+    db = SessionLocal()
+    try:
+        food = db.query(models.Category.id).filter(models.Category.name == "food").scalar()
+    finally:
+        db.close()
+
+    class Conflict(Exception):
+        pgcode = sketches.SERIALIZATION_FAILURE
+
+    compact_one = sketches._compact_one
+
+    def losing_food(db, key):
+        if key[1] == food:
+            raise DBAPIError("compact", {}, Conflict())
+        return compact_one(db, key)
+
+    monkeypatch.setattr(sketches, "_compact_one", losing_food)
+    assert compact() == {"compacted": 1, "rebuilt": 0, "skipped": 1}
+    assert counts() == (1, 1)
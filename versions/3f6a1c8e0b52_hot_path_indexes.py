@@ -0,0 +1,39 @@
+"""hot_path_indexes
+
+Revision ID: 3f6a1c8e0b52
+Revises: 94d2d3d90533
+Create Date: 2026-10-18 10:30:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a1c8e0b52'
+down_revision: Union[str, None] = '94d2d3d90533'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination on (created_at, id)
+    op.create_index('ix_expenses_created_at_id', 'expenses', ['created_at', 'id'], unique=False)
+    # Per-payer totals and lookups
+    op.create_index('ix_expenses_paid_by', 'expenses', ['paid_by'], unique=False)
+    # Shares of an expense (loading, replacing, joining to expenses)
+    op.create_index('ix_expense_shares_expense_id_person_id', 'expense_shares', ['expense_id', 'person_id'], unique=False)
+    # Shares owed by a person
+    op.create_index('ix_expense_shares_person_id', 'expense_shares', ['person_id'], unique=False)
+    # Due recurring expenses, scanned in next_occurrence order
+    op.create_index(op.f('ix_recurring_expenses_next_occurrence'), 'recurring_expenses', ['next_occurrence'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_recurring_expenses_next_occurrence'), table_name='recurring_expenses')
+    op.drop_index('ix_expense_shares_person_id', table_name='expense_shares')
+    op.drop_index('ix_expense_shares_expense_id_person_id', table_name='expense_shares')
+    op.drop_index('ix_expenses_paid_by', table_name='expenses')
+    op.drop_index('ix_expenses_created_at_id', table_name='expenses')
@@ -0,0 +1,34 @@
+"""category_sketches
+
+Revision ID: 5e8a2c61d0f4
+Revises: d41b7e9c2f63
+Create Date: 2026-10-18 16:05:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a2c61d0f4'
+down_revision: Union[str, None] = 'd41b7e9c2f63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Quantile and top-payer sketches per category and month (app.sketches);
+    # fill existing data with ``python -m app.sketches rebuild``
+    op.create_table('category_sketches',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('sketch', sa.JSON(), nullable=True),
+    sa.Column('stale', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('month', 'category_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('category_sketches')
@@ -0,0 +1,47 @@
+"""ledger_and_scheduler_tables
+
+Revision ID: 8c2e5d7b4a19
+Revises: 3f6a1c8e0b52
+Create Date: 2026-10-18 10:31:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e5d7b4a19'
+down_revision: Union[str, None] = '3f6a1c8e0b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Running per-person balances (app.ledger)
+    op.create_table('person_balances',
+    sa.Column('person_id', sa.Integer(), nullable=False),
+    sa.Column('balance_cents', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['person_id'], ['people.id'], ),
+    sa.PrimaryKeyConstraint('person_id')
+    )
+    # Version stamp for cached balance and settlement results
+    op.create_table('ledger_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Background job leases (app.recurring_scheduler)
+    op.create_table('scheduler_leases',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('owner', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('scheduler_leases')
+    op.drop_table('ledger_version')
+    op.drop_table('person_balances')
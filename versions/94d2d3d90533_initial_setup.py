@@ -20,12 +20,69 @@ depends_on: Union[str, Sequence[str], None] = None
 
 
 def upgrade() -> None:
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.create_table('people',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_people_id'), 'people', ['id'], unique=False)
+    op.create_index(op.f('ix_people_name'), 'people', ['name'], unique=True)
+    op.create_table('categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_categories_id'), 'categories', ['id'], unique=False)
+    op.create_index(op.f('ix_categories_name'), 'categories', ['name'], unique=True)
+    op.create_table('expenses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('paid_by', sa.Integer(), nullable=True),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('is_recurring', sa.Boolean(), nullable=True),
+    sa.Column('next_occurrence', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.ForeignKeyConstraint(['paid_by'], ['people.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_expenses_id'), 'expenses', ['id'], unique=False)
+    op.create_table('expense_shares',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('expense_id', sa.Integer(), nullable=True),
+    sa.Column('person_id', sa.Integer(), nullable=True),
+    sa.Column('share_type', sa.String(), nullable=False),
+    sa.Column('value', sa.Numeric(precision=12, scale=4), nullable=False),
+    sa.ForeignKeyConstraint(['expense_id'], ['expenses.id'], ),
+    sa.ForeignKeyConstraint(['person_id'], ['people.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_expense_shares_id'), 'expense_shares', ['id'], unique=False)
+    op.create_table('recurring_expenses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('expense_id', sa.Integer(), nullable=True),
+    sa.Column('frequency', sa.String(), nullable=False),
+    sa.Column('start_date', sa.DateTime(), nullable=False),
+    sa.Column('end_date', sa.DateTime(), nullable=True),
+    sa.Column('next_occurrence', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['expense_id'], ['expenses.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('expense_id')
+    )
+    op.create_index(op.f('ix_recurring_expenses_id'), 'recurring_expenses', ['id'], unique=False)
 
 
 def downgrade() -> None:
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_index(op.f('ix_recurring_expenses_id'), table_name='recurring_expenses')
+    op.drop_table('recurring_expenses')
+    op.drop_index(op.f('ix_expense_shares_id'), table_name='expense_shares')
+    op.drop_table('expense_shares')
+    op.drop_index(op.f('ix_expenses_id'), table_name='expenses')
+    op.drop_table('expenses')
+    op.drop_index(op.f('ix_categories_name'), table_name='categories')
+    op.drop_index(op.f('ix_categories_id'), table_name='categories')
+    op.drop_table('categories')
+    op.drop_index(op.f('ix_people_name'), table_name='people')
+    op.drop_index(op.f('ix_people_id'), table_name='people')
+    op.drop_table('people')
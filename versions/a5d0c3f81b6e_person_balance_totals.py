@@ -0,0 +1,40 @@
+"""person_balance_totals
+
+Revision ID: a5d0c3f81b6e
+Revises: e2c94f1a7d36
+Create Date: 2026-10-19 09:40:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5d0c3f81b6e'
+down_revision: Union[str, None] = 'e2c94f1a7d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Paid and owed totals next to the running balance (app.ledger), so
+    # /settlements/balances reads the ledger alone
+    with op.batch_alter_table('person_balances') as batch_op:
+        batch_op.add_column(sa.Column('paid_cents', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('owed_cents', sa.BigInteger(), nullable=False, server_default='0'))
+    # Amounts have two decimals, so the summed cents are exact; owed follows
+    # from the stored balance
+    op.execute(
+        "UPDATE person_balances SET paid_cents = COALESCE(("
+        "SELECT CAST(ROUND(SUM(expenses.amount) * 100) AS BIGINT) FROM expenses "
+        "WHERE expenses.paid_by = person_balances.person_id), 0)"
+    )
+    op.execute("UPDATE person_balances SET owed_cents = balance_cents + paid_cents")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('person_balances') as batch_op:
+        batch_op.drop_column('owed_cents')
+        batch_op.drop_column('paid_cents')
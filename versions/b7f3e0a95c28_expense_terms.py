@@ -0,0 +1,35 @@
+"""expense_terms
+
+Revision ID: b7f3e0a95c28
+Revises: 5e8a2c61d0f4
+Create Date: 2026-10-18 18:20:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f3e0a95c28'
+down_revision: Union[str, None] = '5e8a2c61d0f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Inverted index over expense descriptions (app.search_index); fill
+    # existing data with ``python -m app.search_index rebuild``
+    op.create_table('expense_terms',
+    sa.Column('term', sa.String(), nullable=False),
+    sa.Column('expense_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['expense_id'], ['expenses.id'], ),
+    sa.PrimaryKeyConstraint('term', 'expense_id')
+    )
+    op.create_index('ix_expense_terms_expense_id', 'expense_terms', ['expense_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_expense_terms_expense_id', table_name='expense_terms')
+    op.drop_table('expense_terms')
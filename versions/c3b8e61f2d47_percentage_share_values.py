@@ -0,0 +1,82 @@
+"""percentage_share_values
+
+Revision ID: c3b8e61f2d47
+Revises: a5d0c3f81b6e
+Create Date: 2026-10-19 11:05:00.000000+00:00
+
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3b8e61f2d47'
+down_revision: Union[str, None] = 'a5d0c3f81b6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+expenses = sa.table('expenses', sa.column('id', sa.Integer), sa.column('amount', sa.Numeric(12, 2)))
+expense_shares = sa.table(
+    'expense_shares',
+    sa.column('id', sa.Integer),
+    sa.column('expense_id', sa.Integer),
+    sa.column('share_type', sa.String),
+    sa.column('value', sa.Numeric(12, 4))
+)
+
+PLACES = Decimal("0.0001")
+BATCH_SIZE = 1000
+
+
+def _shares_by_expense(bind, after: int):
+    # The next batch of expenses with percentage shares, with all their shares
+    ids = sa.select(expense_shares.c.expense_id).where(
+        expense_shares.c.share_type == 'percentage', expense_shares.c.expense_id > after
+    ).distinct().order_by(expense_shares.c.expense_id).limit(BATCH_SIZE).subquery()
+    rows = bind.execute(
+        sa.select(expenses.c.id, expenses.c.amount, expense_shares.c.id, expense_shares.c.share_type, expense_shares.c.value)
+        .join(expense_shares, expense_shares.c.expense_id == expenses.c.id)
+        .where(expenses.c.id.in_(sa.select(ids.c.expense_id)))
+        .order_by(expenses.c.id, expense_shares.c.id)
+    ).all()
+    grouped = {}
+    for expense_id, amount, share_id, share_type, value in rows:
+        grouped.setdefault((expense_id, Decimal(str(amount))), []).append((share_id, share_type, Decimal(str(value))))
+    return grouped
+
+
+def upgrade() -> None:
+    # Expenses created before percentage shares were stored as percentages
+    # hold the money each share came to instead. Rows whose percentages
+    # already add up to 100 (written by an update) are left alone; the rest
+    # become percentages of what the exact shares leave, so
+    # settlement_engine.share_cents reproduces the stored amounts.
+    bind = op.get_bind()
+    after = 0
+    while True:
+        grouped = _shares_by_expense(bind, after)
+        if not grouped:
+            break
+        for (expense_id, amount), shares in grouped.items():
+            after = max(after, expense_id)
+            percentages = [(share_id, value) for share_id, share_type, value in shares if share_type == 'percentage']
+            remaining = amount - sum((value for _, share_type, value in shares if share_type == 'exact'), Decimal(0))
+            if sum(value for _, value in percentages) == 100 or remaining <= 0:
+                continue
+            converted = {
+                share_id: (value / remaining * 100).quantize(PLACES, rounding=ROUND_HALF_UP)
+                for share_id, value in percentages
+            }
+            largest = max(converted, key=converted.get)
+            converted[largest] += 100 - sum(converted.values())
+            for share_id, value in converted.items():
+                bind.execute(expense_shares.update().where(expense_shares.c.id == share_id).values(value=value))
+
+
+def downgrade() -> None:
+    # Percentages written since the upgrade cannot be told apart from
+    # converted ones, so the conversion is not reversed
+    pass
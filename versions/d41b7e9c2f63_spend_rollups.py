@@ -0,0 +1,36 @@
+"""spend_rollups
+
+Revision ID: d41b7e9c2f63
+Revises: 8c2e5d7b4a19
+Create Date: 2026-10-18 14:12:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b7e9c2f63'
+down_revision: Union[str, None] = '8c2e5d7b4a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Pre-aggregated spend buckets (app.rollups); fill existing data with
+    # ``python -m app.rollups rebuild``
+    op.create_table('spend_rollups',
+    sa.Column('dimension', sa.String(), nullable=False),
+    sa.Column('bucket', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.Date(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=False),
+    sa.Column('expense_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dimension', 'bucket', 'bucket_start', 'entity_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('spend_rollups')
@@ -0,0 +1,58 @@
+"""sketch_samples
+
+Revision ID: e2c94f1a7d36
+Revises: b7f3e0a95c28
+Create Date: 2026-10-18 21:10:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2c94f1a7d36'
+down_revision: Union[str, None] = 'b7f3e0a95c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Append-only sketch updates (app.sketches); stale sketches become
+    # rebuild markers for the compaction job
+    op.create_table('sketch_samples',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('paid_by', sa.Integer(), nullable=True),
+    sa.Column('amount_cents', sa.BigInteger(), nullable=True),
+    sa.Column('rebuild', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sketch_samples_month_category', 'sketch_samples', ['month', 'category_id'], unique=False)
+    op.execute(
+        "INSERT INTO sketch_samples (month, category_id, rebuild) "
+        "SELECT month, category_id, true FROM category_sketches WHERE stale"
+    )
+    with op.batch_alter_table('category_sketches') as batch_op:
+        batch_op.drop_column('stale')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('category_sketches') as batch_op:
+        batch_op.add_column(sa.Column('stale', sa.Boolean(), nullable=False, server_default=sa.false()))
+    # Pending samples are not in the sketches; rebuild those on next read
+    op.execute(
+        "UPDATE category_sketches SET stale = true WHERE EXISTS ("
+        "SELECT 1 FROM sketch_samples WHERE sketch_samples.month = category_sketches.month "
+        "AND sketch_samples.category_id = category_sketches.category_id)"
+    )
+    op.execute(
+        "INSERT INTO category_sketches (month, category_id, stale) "
+        "SELECT DISTINCT month, category_id, true FROM sketch_samples WHERE NOT EXISTS ("
+        "SELECT 1 FROM category_sketches WHERE category_sketches.month = sketch_samples.month "
+        "AND category_sketches.category_id = sketch_samples.category_id)"
+    )
+    op.drop_index('ix_sketch_samples_month_category', table_name='sketch_samples')
+    op.drop_table('sketch_samples')